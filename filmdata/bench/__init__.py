@@ -0,0 +1,38 @@
+"""
+Micro-benchmarks for the hot spots in the sources.  Run a benchmark module
+from the directory holding your config.ini, e.g.
+
+    python -m filmdata.bench.imdb_parse
+"""
+
+import os
+import time
+
+test_data_dir = os.path.join(os.path.dirname(__file__), '..', '..',
+                             'test_data', 'sources')
+
+def per_call(func, args, repeat=3):
+    """
+    Time a function over a list of arguments.
+    Arguments:
+        func - the function to time, called as func(*arg) for each arg
+        args - a list of argument tuples
+        repeat - number of passes over the args, the fastest pass is used
+    Returns the cost of one call in microseconds.
+    """
+    best = None
+    for _ in xrange(repeat):
+        start = time.time()
+        for arg in args:
+            func(*arg)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best * 1e6 / max(1, len(args))
+
+def report(rows):
+    """ Print (name, value...) rows as a table. """
+    width = max(len(r[0]) for r in rows)
+    for row in rows:
+        print '  '.join([row[0].ljust(width)] +
+                        [ str(v).rjust(12) for v in row[1:] ])
@@ -0,0 +1,303 @@
+"""
+Write synthetic imdb lists in the format of the real ones, at any scale, for
+benchmarking the producers.  At scale 1 there are 100 titles and 50 persons
+in each role list, 10000 is about the size of the real lists.
+
+    python -m filmdata.bench.fixtures --scale 100 --dir /tmp/imdb
+
+With --gzip the lists are written as .gz archives, like they're downloaded.
+Along with the lists it writes title.ids and person.ids indexes (see
+filmdata.lib.idindex) so the producers can be run without a sink.
+"""
+
+import os
+import gzip
+import random
+from optparse import OptionParser
+
+from filmdata.lib.idindex import IdIndex
+
+_titles_per_scale = 100
+_persons_per_scale = 50
+_words = ('Night', 'Dark', 'Return', 'Last', 'Gran', 'Torino', 'Baby', 'Bird',
+          'Million', 'Dollar', 'Harry', 'Dirty', 'Man', 'Woman', 'House',
+          'River', 'Mystic', 'Sudden', 'Impact', 'Unforgiven', 'Letters',
+          'Iwo', 'Jima', 'Flags', 'Fathers', 'Space', 'Cowboys', 'Changeling')
+_first_names = ('Clint', 'Sondra', 'Gene', 'Morgan', 'Hilary', 'Kyle', 'Alison',
+                'Scott', 'Bee', 'Ivan', 'Lena', 'Paul', 'Sean', 'Tim', 'Laura')
+_last_names = ('Eastwood', 'Locke', 'Hackman', 'Freeman', 'Swank', 'Vahn',
+               'Reeves', 'Smith', 'Haggis', 'Penn', 'Robbins', 'Linney')
+_genres = ('Drama', 'Action', 'Comedy', 'Western', 'Thriller', 'Crime',
+           'Music', 'Sport', 'War', 'Romance')
+_regions = ('USA', 'UK', 'Germany', 'France', 'Finland', 'Japan', 'Italy')
+_writer_kinds = ('screenplay', 'written by', 'story', 'original screenplay',
+                 'novel')
+_mpaas = ('G', 'PG', 'PG-13', 'R', 'NC-17')
+_languages = ('English', 'German', 'French', 'Finnish', 'Japanese', 'Italian',
+              'Sign Language')
+_copyright = ('CRC: 0x%08X  File: %s  Date: Thu Feb 17 16:00:00 2011\n\n'
+              'Copyright 1990-2011 The Internet Movie Database, Inc.  All '
+              'rights reserved.\n\n')
+_footer = ('\n-----------------------------------------------------------------'
+           '------------\n\nSUBMITTING UPDATES\n==================\n\n'
+           'For details of how to submit updates, see the help files.\n')
+
+class Fixtures(object):
+    """
+    Generate a consistent set of imdb lists, every list refers to the same
+    titles and the role lists share persons between them.
+    Attributes:
+        scale - multiple of the base size (100 titles, 50 persons a list)
+        dir - where to write the lists
+        seed - seed for the random choices, the same seed and scale always
+            produce the same files
+        compress - write the lists as gzip archives (<list>.gz)
+
+    Example:
+        Fixtures(1000, '/tmp/imdb').write()
+    """
+
+    lists = {
+        'rating' : 'ratings.list',
+        'aka' : 'aka-titles.list',
+        'genre' : 'genres.list',
+        'runtime' : 'running-times.list',
+        'mpaa' : 'mpaa-ratings-reasons.list',
+        'actor' : 'actors.list',
+        'actress' : 'actresses.list',
+        'director' : 'directors.list',
+        'writer' : 'writers.list',
+        'country' : 'countries.list',
+        'language' : 'language.list',
+        'certificate' : 'certificates.list',
+    }
+
+    def __init__(self, scale, dir, seed=1, compress=False):
+        self.scale = scale
+        self.dir = dir
+        self.seed = seed
+        self.compress = compress
+        self._random = random.Random(seed)
+        self._titles = None
+
+    def paths(self):
+        """ Get the { name : path } of every list (e.g. for config.imdb). """
+        ext = '.gz' if self.compress else ''
+        return dict([ (name, os.path.join(self.dir, file_name + ext)) for
+                      name, file_name in self.lists.items() ])
+
+    def write(self):
+        """ Write all of the lists and the id indexes. """
+        if not os.path.isdir(self.dir):
+            os.makedirs(self.dir)
+        titles = self.titles()
+        self._write_list('rating', self._ratings(titles))
+        self._write_list('aka', self._akas(titles))
+        self._write_list('genre', self._genres(titles))
+        self._write_list('runtime', self._runtimes(titles))
+        self._write_list('mpaa', self._mpaas(titles))
+        persons = set()
+        for role_type in ('actor', 'actress', 'director', 'writer'):
+            self._write_list(role_type, self._roles(role_type, titles,
+                                                    persons))
+        self._write_list('country', self._countries(titles))
+        self._write_list('language', self._languages(titles))
+        self._write_list('certificate', self._certificates(titles))
+        IdIndex.build(lambda: ( (t, i) for i, t in enumerate(titles) )).save(
+            os.path.join(self.dir, 'title.ids'))
+        IdIndex.build(lambda: ( (p, i) for i, p in
+                                enumerate(sorted(persons)) )).save(
+            os.path.join(self.dir, 'person.ids'))
+
+    def titles(self):
+        """ Get the title idents, e.g. u'Dark River (1987) (V)'. """
+        if self._titles is None:
+            rand = self._random
+            titles, seen = [], set()
+            while len(titles) < self.scale * _titles_per_scale:
+                name = ' '.join(rand.sample(_words, rand.randint(1, 3)))
+                year = rand.randint(1920, 2011)
+                kind = rand.random()
+                if kind < 0.15:
+                    ident = u'"%s" (%d)' % (name, year)
+                elif kind < 0.2:
+                    ident = u'%s (%d) (V)' % (name, year)
+                elif kind < 0.25:
+                    ident = u'%s (%d) (TV)' % (name, year)
+                else:
+                    ident = u'%s (%d)' % (name, year)
+                if ident in seen:
+                    # same name and year, imdb tells them apart by number
+                    ident = ident.replace(u'(%d)' % year,
+                                          u'(%d/%s)' % (year, 'I' * rand.
+                                                        randint(2, 3)), 1)
+                    if ident in seen:
+                        continue
+                seen.add(ident)
+                titles.append(ident)
+            self._titles = titles
+        return self._titles
+
+    def _write_list(self, name, lines):
+        path = self.paths()[name]
+        f = gzip.open(path, 'wb') if self.compress else open(path, 'w')
+        f.write(_copyright % (self._random.getrandbits(32), self.lists[name]))
+        for line in lines:
+            f.write(line.encode('latin_1'))
+        f.write(_footer)
+        f.close()
+
+    def _ratings(self, titles):
+        rand = self._random
+        yield u'MOVIE RATINGS REPORT\n\nNew  Distribution  Votes  Rank  Title\n'
+        for title in titles:
+            distribution = ''.join(rand.choice('0123456789.*') for
+                                   _ in xrange(10))
+            yield u'      %s  %7d   %.1f  %s\n' % (
+                distribution, rand.randint(5, 500000),
+                rand.randint(10, 99) / 10.0, title)
+
+    def _akas(self, titles):
+        rand = self._random
+        yield u'AKA TITLES LIST\n===============\n\n'
+        for title in titles:
+            if rand.random() > 0.3:
+                continue
+            yield title + u'\n'
+            year = title.partition(u'(')[2][:4]
+            for _ in xrange(rand.randint(1, 3)):
+                line = u'   (aka %s (%s))\t(%s)' % (
+                    ' '.join(rand.sample(_words, 2)), year,
+                    rand.choice(_regions))
+                if rand.random() < 0.3:
+                    line += u'\t(working title)'
+                yield line + u'\n'
+            yield u'\n'
+
+    def _genres(self, titles):
+        rand = self._random
+        yield u'8: THE GENRES LIST\n==================\n\n'
+        for title in titles:
+            for genre in rand.sample(_genres, rand.randint(1, 3)):
+                yield u'%s\t\t\t\t%s\n' % (title, genre)
+
+    def _runtimes(self, titles):
+        rand = self._random
+        yield u'RUNNING TIMES LIST\n==================\n\n'
+        for title in titles:
+            if rand.random() < 0.5:
+                yield u'%s\t\t\t%d\n' % (title, rand.randint(20, 200))
+            else:
+                yield u'%s\t\t\t%s:%d\t(DVD)\n' % (
+                    title, rand.choice(_regions), rand.randint(20, 200))
+
+    def _mpaas(self, titles):
+        rand = self._random
+        yield u'MPAA RATINGS REASONS LIST\n=========================\n\n'
+        for title in titles:
+            if title.startswith(u'"') or rand.random() > 0.4:
+                continue
+            yield u'-' * 79 + u'\n'
+            yield u'MV: %s\n' % title
+            yield u'RE: Rated %s for %s violence and some language,\n' % (
+                rand.choice(_mpaas), rand.choice(('strong', 'brief')))
+            if rand.random() < 0.5:
+                yield u'RE: and for thematic material.\n'
+            yield u'\n'
+
+    def _countries(self, titles):
+        rand = self._random
+        yield u'COUNTRIES LIST\n==============\n\n'
+        for title in titles:
+            for region in rand.sample(_regions, rand.randint(1, 2)):
+                yield u'%s\t\t\t%s\n' % (title, region)
+
+    def _languages(self, titles):
+        rand = self._random
+        yield u'LANGUAGE LIST\n=============\n\n'
+        for title in titles:
+            for language in rand.sample(_languages, rand.randint(1, 2)):
+                line = u'%s\t\t\t%s' % (title, language)
+                if rand.random() < 0.2:
+                    line += u'\t(a few lines)'
+                yield line + u'\n'
+
+    def _certificates(self, titles):
+        rand = self._random
+        yield u'CERTIFICATES LIST\n=================\n\n'
+        for title in titles:
+            if rand.random() > 0.6:
+                continue
+            for region in rand.sample(_regions, rand.randint(1, 3)):
+                line = u'%s\t\t\t%s:%s' % (title, region, rand.choice(_mpaas))
+                if rand.random() < 0.3:
+                    line += u'\t(certificate #%d)' % rand.randint(1, 50000)
+                yield line + u'\n'
+
+    def _roles(self, role_type, titles, persons):
+        rand = self._random
+        yield u'THE %sS LIST\n%s\n\nName\t\t\tTitles\n----\t\t\t------\n' % (
+            role_type.upper(), u'=' * (len(role_type) + 10))
+        count = self.scale * _persons_per_scale
+        for i in xrange(count):
+            person = u'%s, %s' % (rand.choice(_last_names),
+                                  rand.choice(_first_names))
+            # make each person unique, the way imdb numbers the clashes
+            person += u' (%s)' % _roman(i + 1)
+            persons.add(person)
+            lines = []
+            for title in rand.sample(titles, min(len(titles),
+                                                 rand.randint(1, 8))):
+                if role_type == 'writer':
+                    line = u'%s  (%s)' % (title, rand.choice(_writer_kinds))
+                    if rand.random() < 0.7:
+                        line += u'  <%d,%d,%d>' % (rand.randint(1, 5),
+                                                   rand.randint(1, 3),
+                                                   rand.randint(1, 3))
+                elif role_type == 'director':
+                    line = title
+                    if rand.random() < 0.1:
+                        line += u'  (uncredited)'
+                else:
+                    line = u'%s  [%s %s]' % (title, rand.choice(_first_names),
+                                             rand.choice(_last_names))
+                    if rand.random() < 0.1:
+                        line = line.replace(u'  [', u'  (uncredited)  [', 1)
+                    if rand.random() < 0.8:
+                        line += u'  <%d>' % rand.randint(1, 60)
+                lines.append(line)
+            yield u'%s\t\t%s\n' % (person, lines[0])
+            for line in lines[1:]:
+                yield u'\t\t\t%s\n' % line
+            yield u'\n'
+
+def _roman(n):
+    numerals = ((1000, 'M'), (900, 'CM'), (500, 'D'), (400, 'CD'), (100, 'C'),
+                (90, 'XC'), (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'),
+                (5, 'V'), (4, 'IV'), (1, 'I'))
+    out = []
+    for value, numeral in numerals:
+        while n >= value:
+            out.append(numeral)
+            n -= value
+    return ''.join(out)
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-s', '--scale', dest='scale', type='int', default=10,
+                      help='multiple of 100 titles / 50 persons (default 10)')
+    parser.add_option('-d', '--dir', dest='dir', default='imdb_fixtures',
+                      help='where to write the lists')
+    parser.add_option('--seed', dest='seed', type='int', default=1)
+    parser.add_option('-z', '--gzip', dest='gzip', action='store_true',
+                      default=False, help='write the lists gzipped')
+    (options, args) = parser.parse_args()
+    fixtures = Fixtures(options.scale, options.dir, options.seed,
+                        compress=options.gzip)
+    fixtures.write()
+    for name, path in sorted(fixtures.paths().items()):
+        print '%s_path = %s (%.1f MB)' % (name, path,
+                                          os.path.getsize(path) / 1048576.0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Cost of finding a person's id on saved imdb name search pages, the single
+pass candidate extractor against the old per line regex search it replaced.
+"""
+
+import os
+import re
+import json
+from itertools import imap
+from HTMLParser import HTMLParser
+from optparse import OptionParser
+
+from filmdata.bench import per_call, report, test_data_dir
+from filmdata.lib.util import rname, clean_name, extract_name_suffix
+from filmdata.source.imdb import Fetch
+
+_person_id_string = '<a href="/name/nm([0-9]+)/" onclick="[^"]+">%s</a>\s*%s<small>'
+
+def legacy_extract(html, ident):
+    """ The old extractor: a fresh parser and regex per page. """
+    h = HTMLParser()
+    suffix = extract_name_suffix(ident)
+    if suffix:
+        suffix = suffix.replace('(', '\(', 1).replace(')', '\)', 1)
+        suffix = '(:?%s)?\s*' % suffix
+    re_person_id = re.compile(_person_id_string % (rname(clean_name(ident)),
+                                                   suffix), re.I)
+    for line in imap(h.unescape, html.split('\n')):
+        id_match = re_person_id.search(line)
+        if id_match:
+            return int(id_match.group(1))
+    return None
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-d', '--dir', dest='dir',
+                      default=os.path.join(test_data_dir, 'imdb', 'search'),
+                      help='directory holding the pages and idents.json')
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=50,
+                      help='passes over the pages (default 50)')
+    (options, args) = parser.parse_args()
+
+    idents = json.load(open(os.path.join(options.dir, 'idents.json')))
+    rows = [ ('page (us/page)', 'legacy', 'single pass', 'speedup', 'id') ]
+    for name in sorted(idents):
+        ident, id = idents[name]
+        html = open(os.path.join(options.dir, name)).read()
+        args = [ (html, ident) ]
+        found = Fetch._extract_id_from_html(html, ident)
+        if found != id:
+            print 'Warning: %s gave %s, expected %s' % (name, found, id)
+        legacy_cost = per_call(legacy_extract, args, options.repeat)
+        fast_cost = per_call(Fetch._extract_id_from_html, args,
+                             options.repeat)
+        rows.append(('%s (%dkB)' % (name, len(html) / 1024),
+                     '%.0f' % legacy_cost, '%.0f' % fast_cost,
+                     '%.1fx' % (legacy_cost / fast_cost), found))
+    report(rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Per-call cost of the imdb ident parsers, the hand rolled splitters against
+the regexes they replace, over the idents in the test_data lists.
+"""
+
+import os
+from optparse import OptionParser
+
+from filmdata.bench import per_call, report, test_data_dir
+from filmdata.source import imdb
+from filmdata.source.imdb import Produce
+
+def load_idents(path):
+    """ Get the title idents and the role idents from one of the lists. """
+    titles, roles = [], []
+    started = False
+    for line in open(path):
+        if line.startswith('----\t\t\t------'):
+            started = True
+            continue
+        line = line.strip().decode('latin_1')
+        if not started or not line:
+            continue
+        role = line.rpartition('\t')[2]
+        roles.append(role)
+        title = imdb._split_character_role(role)
+        titles.append(title[0] if title else role)
+    return titles, roles
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-d', '--dir', dest='dir',
+                      default=os.path.join(test_data_dir, 'imdb'),
+                      help='directory holding the role lists')
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=20,
+                      help='passes over the idents (default 20)')
+    (options, args) = parser.parse_args()
+
+    titles, roles, writers = [], [], []
+    for name in ('actors', 'actresses', 'directors', 'writers'):
+        path = os.path.join(options.dir, '%s.list' % name)
+        if os.path.exists(path):
+            list_titles, list_roles = load_idents(path)
+            titles.extend(list_titles)
+            if name == 'writers':
+                writers.extend(list_roles)
+            else:
+                roles.extend(list_roles)
+
+    benches = (
+        ('title info', titles, Produce._re_title_info.match,
+         imdb._re_title_ident.match),
+        ('character role', roles, Produce._re_character_role.match,
+         imdb._split_character_role),
+        ('writer role', writers, Produce._re_writer_role.match,
+         imdb._split_writer_role),
+    )
+    rows = [ ('parser (us/call)', 'regex', 'fast', 'speedup', 'calls') ]
+    for name, idents, regex, fast in benches:
+        if not idents:
+            continue
+        args = [ (i,) for i in idents ]
+        regex_cost = per_call(regex, args, options.repeat)
+        fast_cost = per_call(fast, args, options.repeat)
+        rows.append((name, '%.3f' % regex_cost, '%.3f' % fast_cost,
+                     '%.1fx' % (regex_cost / fast_cost), len(idents)))
+
+    args = [ (i, 'actor') for i in roles ]
+    rows.append(('_parse_role_ident', '',
+                 '%.3f' % per_call(Produce._parse_role_ident, args,
+                                   options.repeat), '', len(roles)))
+    args = [ (i,) for i in titles ]
+    rows.append(('_parse_title_info', '',
+                 '%.3f' % per_call(Produce._parse_title_info, args,
+                                   options.repeat), '', len(titles)))
+    report(rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Records/sec and peak memory of each imdb produce_* generator, over a set of
+lists written by filmdata.bench.fixtures.  Every generator runs in a process
+of its own so the peaks don't hide each other.
+
+    python -m filmdata.bench.fixtures --scale 100 --dir /tmp/imdb
+    python -m filmdata.bench.imdb_produce --dir /tmp/imdb
+
+Pass --gzip to both to measure the producers reading the .gz archives.
+"""
+
+import os
+import time
+import resource
+from functools import partial
+from multiprocessing import Process, Queue
+from optparse import OptionParser
+
+from filmdata import config
+from filmdata.bench import report
+from filmdata.bench.fixtures import Fixtures
+from filmdata.lib.idindex import IdIndex
+from filmdata.source.imdb import Produce
+
+def producers(types, budget):
+    """ Get the (name, callable) of every generator to measure. """
+    p = Produce
+    benches = [
+        ('produce_title_stats', partial(p.produce_title_stats, types)),
+        ('produce_title_akas', partial(p.produce_title_akas, types)),
+        ('produce_title_genres', partial(p.produce_title_genres, types)),
+        ('produce_title_runtimes', partial(p.produce_title_runtimes, types)),
+        ('produce_title_mpaas', partial(p.produce_title_mpaas, types)),
+    ]
+    for name in p._optional_lists:
+        benches.append(('produce_title_list(%s)' % name,
+                        partial(p.produce_title_list, name, types)))
+    for role_type in ('actor', 'actress', 'director', 'writer'):
+        benches.append(('produce_persons(%s)' % role_type,
+                        partial(p.produce_persons, role_type)))
+    for group in ('cast', 'director', 'writer'):
+        benches.append(('produce_title_roles(%s)' % group,
+                        partial(p.produce_title_roles, types, group=group,
+                                budget=budget)))
+    benches.append(('produce_titles', partial(p.produce_titles, types,
+                                              budget=budget)))
+    return benches
+
+def _peak_rss():
+    """ Peak resident set size of this process in bytes (linux reports kB) """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def _measure(func, results):
+    start_rss = _peak_rss()
+    start = time.time()
+    count = 0
+    for _ in func():
+        count += 1
+    results.put((count, time.time() - start, start_rss, _peak_rss()))
+
+def measure(func):
+    """
+    Run a generator to the end in a child process.
+    Returns the number of records, the seconds it took, the peak rss of the
+    child when it started and the peak rss when it was done.
+    """
+    results = Queue()
+    child = Process(target=_measure, args=(func, results))
+    child.start()
+    result = results.get()
+    child.join()
+    return result
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-d', '--dir', dest='dir', default='imdb_fixtures',
+                      help='directory written by filmdata.bench.fixtures')
+    parser.add_option('-t', '--types', dest='types', default='film tv video',
+                      help='space separated title types (default all)')
+    parser.add_option('-b', '--budget', dest='budget', type='int', default=0,
+                      help='memory budget in MB for the joins (default none)')
+    parser.add_option('-w', '--workers', dest='workers', type='int',
+                      default=1, help='processes for the person lists')
+    parser.add_option('-o', '--only', dest='only', default=None,
+                      help='only run the generators whose name contains this')
+    parser.add_option('--snapshots', dest='snapshots', action='store_true',
+                      default=False,
+                      help='use the fixture directory as the cache_path '
+                           '(for the parse snapshots)')
+    parser.add_option('-z', '--gzip', dest='gzip', action='store_true',
+                      default=False, help='read the gzipped lists')
+    (options, args) = parser.parse_args()
+
+    for name, path in Fixtures(0, options.dir,
+                               compress=options.gzip).paths().items():
+        config.imdb['%s_path' % name] = path
+    Produce._workers = options.workers
+    # there's no sink to check the id indexes against, use them as they are
+    Produce._cache_path = options.dir if options.snapshots else None
+    Produce._title_ident_to_id = IdIndex.load(
+        os.path.join(options.dir, 'title.ids'))
+    Produce._person_ident_to_id = IdIndex.load(
+        os.path.join(options.dir, 'person.ids'))
+
+    mb = lambda b: '%.1f' % (b / 1048576.0)
+    rows = [ ('generator', 'records', 'seconds', 'records/s', 'peak MB',
+              'grew MB') ]
+    types = set(options.types.split())
+    for name, func in producers(types, options.budget * 1024 * 1024):
+        if options.only and options.only not in name:
+            continue
+        count, elapsed, start_rss, peak_rss = measure(func)
+        rows.append((name, count, '%.2f' % elapsed,
+                     '%.0f' % (count / max(elapsed, 1e-6)), mb(peak_rss),
+                     mb(peak_rss - start_rss)))
+    report(rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Memory and time of the slotted imdb records against plain dicts, over the
+roles in the test_data lists scaled up to a few hundred thousand records.
+"""
+
+import os
+import gc
+import time
+import cPickle as pickle
+from optparse import OptionParser
+
+from filmdata.bench import report, test_data_dir
+from filmdata.bench.imdb_parse import load_idents
+from filmdata.source.imdb import Produce
+
+def rss():
+    """ Current resident set size of the process in bytes (linux only). """
+    return int(open('/proc/self/statm').read().split()[1]) * \
+            os.sysconf('SC_PAGE_SIZE')
+
+def measure(build):
+    """
+    Build a list of records and keep it alive while measuring.
+    Returns the records, the seconds it took and the bytes it grew by.
+    """
+    gc.collect()
+    before = rss()
+    start = time.time()
+    records = build()
+    elapsed = time.time() - start
+    return records, elapsed, rss() - before
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-d', '--dir', dest='dir',
+                      default=os.path.join(test_data_dir, 'imdb'),
+                      help='directory holding the role lists')
+    parser.add_option('-n', '--records', dest='records', type='int',
+                      default=500000,
+                      help='number of roles to build (default 500000)')
+    (options, args) = parser.parse_args()
+
+    idents = []
+    for name in ('actors', 'actresses'):
+        path = os.path.join(options.dir, '%s.list' % name)
+        if os.path.exists(path):
+            idents.extend(load_idents(path)[1])
+    # distinct strings, like a real list
+    idents = [ u'%s ' % idents[i % len(idents)] + unicode(i) for
+               i in xrange(options.records) ]
+
+    roles, record_time, record_mem = measure(lambda: [
+        Produce._parse_role_ident(i, 'actor') for i in idents ])
+    dicts, dict_time, dict_mem = measure(lambda: [
+        r.to_dict() for r in roles ])
+
+    start = time.time()
+    record_pickle = pickle.dumps(roles, pickle.HIGHEST_PROTOCOL)
+    record_dump = time.time() - start
+    start = time.time()
+    pickle.loads(record_pickle)
+    record_load = time.time() - start
+    start = time.time()
+    dict_pickle = pickle.dumps(dicts, pickle.HIGHEST_PROTOCOL)
+    dict_dump = time.time() - start
+    start = time.time()
+    pickle.loads(dict_pickle)
+    dict_load = time.time() - start
+
+    mb = lambda b: '%.1f' % (b / 1048576.0)
+    report([
+        ('%d roles' % len(roles), 'Role', 'dict'),
+        ('memory (MB)', mb(record_mem), mb(dict_mem)),
+        ('bytes / record', record_mem / len(roles), dict_mem / len(roles)),
+        ('build (s)', '%.2f' % record_time, '%.2f (to_dict)' % dict_time),
+        ('pickle (MB)', mb(len(record_pickle)), mb(len(dict_pickle))),
+        ('pickle dump (s)', '%.2f' % record_dump, '%.2f' % dict_dump),
+        ('pickle load (s)', '%.2f' % record_load, '%.2f' % dict_load),
+    ])
+
+if __name__ == '__main__':
+    main()
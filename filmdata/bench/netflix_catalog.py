@@ -0,0 +1,243 @@
+"""
+Per-title cost of pulling the titles out of the netflix catalog elements,
+the one-pass CatalogTitle against the ElementPath lookups it replaced
+(PathCatalogTitle), over a catalog written by filmdata.bench.netflix_fixtures.
+
+    python -m filmdata.bench.netflix_fixtures --scale 10 --path /tmp/titles.xml
+    python -m filmdata.bench.netflix_catalog --path /tmp/titles.xml
+"""
+
+import logging
+from decimal import Decimal
+from datetime import datetime
+from optparse import OptionParser
+import xml.etree.cElementTree as etree
+
+from filmdata.bench import per_call, report
+from filmdata.source.netflix import NetflixMixin, Produce, CatalogTitle
+
+log = logging.getLogger(__name__)
+
+class PathCatalogTitle(CatalogTitle):
+    """
+    The ElementPath lookup for every field CatalogTitle used to do, kept as
+    the reference its titles are checked against (here and in test_netflix).
+    """
+
+    def __init__(self, node, id, vote_count=None):
+        self.node = node
+        self.vote_count = vote_count
+        self.id = id
+        # no index of the links, every field looks itself up
+
+    def get_title(self):
+        release_year = self.node.find('release_year')
+        if release_year == None or release_year.text == None:
+            log.info('Year not found on %d' % self.id)
+            return None
+        link = self.node.find('./link[@rel="alternate"]')
+
+        rating_text = self.node.find('average_rating').text.strip()
+        rating = None if not rating_text else (Decimal(rating_text) *
+                                               NetflixMixin._rating_factor)
+
+        title = {
+            'id' : self.id,
+            'name' : Produce.sanitize_html(self.node.find('title').get('regular')), 
+            'year' : int(release_year.text),
+            'href' : link.get('href') if link != None else None,
+            'type' : 'film',
+            'rating' : {
+                'count' : self.vote_count,
+                'mean' : rating,
+            },
+            'synopsis' : self._get_synopsis(),
+            'availability' : self._get_availabilities(),
+            'art' : self._get_art(),
+            'genre' : self._get_genres(),
+            'director' : self._get_directors(),
+            'cast' : self._get_cast(),
+            'award' : self._get_awards(),
+        }
+        title['runtime'] = self._get_runtime(title['availability'])
+        mpaa = self._get_mpaa(title['availability'])
+        title['mpaa'] = { 'rating' : mpaa } if mpaa else None
+
+        return title
+    
+    def _get_availability(self, node):
+        format = node.find('./category[@scheme='
+                           '"http://api-nccp.netflix.com/categories/title_formats"]')
+        if not format:
+            format = node.find('./category[@scheme='
+                               '"http://api.netflix.com/categories/title_formats"]')
+            if not format:
+                log.warn('No format info found')
+                return None
+
+        avail = {
+            'from' : node.get('available_from'),
+            'until' : node.get('available_until'),
+        }
+        for k in avail.keys():
+            if avail[k] != None:
+                avail[k] = datetime.fromtimestamp(int(avail[k]))
+
+        quality = format.find('./category[@scheme='
+                              '"http://api-nccp.netflix.com/categories/title_formats/quality"]')
+        if not quality:
+            quality = format.find('./category[@scheme='
+                                  '"http://api.netflix.com/categories/title_formats/quality"]')
+        if quality != None and quality.get('label') == 'HD':
+            avail['quality'] = 2
+        else:
+            avail['quality'] = 1
+        runtime_node = node.find('runtime')
+        if runtime_node != None:
+            avail['runtime'] = int(round(float(runtime_node.text) / 60))
+        else:
+            avail['runtime'] = None
+
+        mpaa = format.find('./category[@sheme="http://api.netflix.com'
+                           '/categories/mpaa_ratings"]')
+        avail['mpaa'] = mpaa.get('label') if mpaa != None else None
+
+        label_to_key_map = {
+            'Blu-ray' : 'bluray',
+            'instant' : 'instant',
+            'DVD' : 'dvd',
+        }
+        label = format.get('label')
+        if not label in label_to_key_map:
+            log.warn('Unknown format %s' % label)
+            return None
+
+        return { label_to_key_map[label] : avail }
+
+    def _get_availabilities(self):
+        nodes = self.node.find('./link[@rel="http://schemas.'
+                               'netflix.com/catalog/titles/f'
+                               'ormat_availability"]/delivery'
+                               '_formats')
+        avails = {}
+        if nodes:
+            for avail in [ a for a in
+                           map(self._get_availability, list(nodes)) if a ]:
+                avails.update(avail)
+        return avails
+            
+    def _get_art(self):
+        box_art = self.node.find('./link[@rel="http://schemas.netflix.com'
+                            '/catalog/titles/box_art"]/box_art')
+        if box_art == None:
+            log.info('No box art found for')
+            return None
+
+        art = {
+            'small' : box_art.find('./link[@rel="http://schemas.netflix.com'
+                                   '/catalog/titles/box_art/64pix_w"]'),
+            'large' : box_art.find('./link[@rel="http://schemas.netflix.com'
+                                   '/catalog/titles/box_art/150pix_w"]'),
+        }
+        for key, node in art.items():
+            if node != None:
+                art[key] = node.get('href')
+        return art
+
+    def _get_synopsis(self):
+        synopsis = {}
+        long = self.node.find('./link[@rel="http://schemas.netflix.com'
+                         '/catalog/titles/synopsis"]/synopsis')
+        if long != None:
+            synopsis['long'] = Produce.sanitize_html(long.text)
+
+        short = self.node.find('./link[@rel="http://schemas.netflix.com'
+                          '/catalog/titles/synopsis.short"]/short_synopsis')
+        if short != None:
+            synopsis['short'] = Produce.sanitize_html(short.text)
+        return synopsis
+
+    def _get_genres(self):
+        categories = self.node.findall('./category')
+        genres = []
+        for cat in categories:
+            scheme = cat.get('scheme')
+            if 'genres' in scheme:
+                genres.append(Produce.sanitize_html(cat.get('label')))
+        return genres
+
+    def _get_people(self, node):
+        found = node.findall('./people/link[@rel="http://schemas.netflix.com'
+                             '/catalog/person"]')
+        people = []
+        for i, person in enumerate(found):
+            href = person.get('href')
+            if not href:
+                continue
+            id = int(href.rpartition('/')[2])
+            name = person.get('title')
+            if not name:
+                continue
+            people.append({ 'key' : id, 'name' : name, 'billing' : i + 1 })
+        return people
+
+    def _get_cast(self):
+        schema = self.node.find('./link[@rel="http://schemas.netflix.com'
+                           '/catalog/people.cast"]')
+        return self._get_people(schema) if schema is not None else {}
+
+    def _get_directors(self):
+        schema = self.node.find('./link[@rel="http://schemas.netflix.com'
+                           '/catalog/people.directors"]')
+        return self._get_people(schema) if schema is not None else {}
+
+    def _get_awards(self):
+        schema = self.node.find('./link[@rel="http://schemas.netflix.com'
+                           '/catalog/titles/awards"]')
+        if schema == None:
+            return None
+        awards_el = schema.find('awards')
+        if awards_el == None:
+            return None
+        winners = awards_el.findall('award_winner')
+        nominees = awards_el.findall('award_nominee')
+        return self._group_awards(winners, nominees)
+
+
+def load_titles(path):
+    """ Get the (element, id) of every film in a catalog. """
+    titles = []
+    for event, elem in etree.iterparse(path):
+        if elem.tag == 'catalog_title':
+            match = Produce._re_film_test.match(elem.find('id').text)
+            if match:
+                titles.append((elem, int(match.group(1))))
+    return titles
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-p', '--path', dest='path', default='titles.xml',
+                      help='catalog written by filmdata.bench.netflix_fixtures')
+    parser.add_option('-r', '--repeat', dest='repeat', type='int', default=5,
+                      help='passes over the titles (default 5)')
+    (options, args) = parser.parse_args()
+
+    # the catalog is full of formats the extractors warn about
+    logging.disable(logging.WARNING)
+    titles = load_titles(options.path)
+    for elem, id in titles:
+        if CatalogTitle(elem, id).get_title() != \
+                PathCatalogTitle(elem, id).get_title():
+            raise AssertionError('The extractors differ on %d' % id)
+
+    path = per_call(lambda e, i: PathCatalogTitle(e, i).get_title(), titles,
+                    options.repeat)
+    one_pass = per_call(lambda e, i: CatalogTitle(e, i).get_title(), titles,
+                        options.repeat)
+    report([ ('extractor (us/title)', 'path', 'one pass', 'speedup',
+              'titles'),
+             ('get_title', '%.1f' % path, '%.1f' % one_pass,
+              '%.2fx' % (path / one_pass), len(titles)) ])
+
+if __name__ == '__main__':
+    main()
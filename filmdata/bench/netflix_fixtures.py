@@ -0,0 +1,208 @@
+"""
+Write a synthetic netflix catalog (titles.xml) in the format of the api's
+full catalog, at any scale, for benchmarking the catalog parsers.  At scale
+1 there are 100 catalog titles, 1000 is about the size of the real one.
+
+    python -m filmdata.bench.netflix_fixtures --scale 100 --path /tmp/titles.xml
+"""
+
+import os
+import random
+from xml.sax.saxutils import escape, quoteattr
+from optparse import OptionParser
+
+_titles_per_scale = 100
+_api = 'http://api.netflix.com'
+_schemas = 'http://schemas.netflix.com/catalog'
+_words = ('Night', 'Dark', 'Return', 'Last', 'Gran', 'Torino', 'Baby', 'Bird',
+          'Million', 'Dollar', 'Harry', 'Dirty', 'Man', 'Woman', 'House',
+          'River', 'Mystic', 'Sudden', 'Impact', 'Unforgiven', 'Letters',
+          'Iwo', 'Jima', 'Flags', 'Fathers', 'Space', 'Cowboys', 'Changeling',
+          'Tom & Jerry', 'Caf\xc3\xa9')
+_names = ('Clint Eastwood', 'Sondra Locke', 'Gene Hackman', 'Morgan Freeman',
+          'Hilary Swank', 'Kyle Eastwood', 'Laura Linney', 'Sean Penn',
+          'Tim Robbins', 'Bee Vang', 'Ivan Reitman')
+_genres = ('Dramas', 'Action & Adventure', 'Comedies', 'Westerns',
+           'Thrillers', 'Crime Dramas', 'Music', 'Sports Movies')
+_mpaas = ('G', 'PG', 'PG-13', 'R', 'NC-17', 'NR')
+_awards = (('academy_awards', 'Best Picture'),
+           ('academy_awards', 'Best Actor'),
+           ('golden_globe', 'Best Director'),
+           ('afi_top_100', 'Movies'))
+
+class Catalog(object):
+    """
+    Generate a netflix catalog, mostly movies along with some series (which
+    the producer skips) and a few titles missing their release year.  Every
+    catalog_title is laid out over lines the way the api sends them.
+    Attributes:
+        scale - multiple of the base size (100 catalog titles)
+        path - where to write the catalog
+        seed - seed for the random choices, the same seed and scale always
+            produce the same file
+
+    Example:
+        Catalog(1000, '/tmp/titles.xml').write()
+    """
+
+    def __init__(self, scale, path, seed=1):
+        self.scale = scale
+        self.path = path
+        self.seed = seed
+        self._random = random.Random(seed)
+
+    def write(self):
+        """ Write the catalog. """
+        dir = os.path.dirname(self.path)
+        if dir and not os.path.isdir(dir):
+            os.makedirs(dir)
+        count = self.scale * _titles_per_scale
+        f = open(self.path, 'w')
+        f.write('<?xml version="1.0" standalone="yes"?>\n<catalog_titles>\n'
+                '<number_of_results>%d</number_of_results>\n' % count)
+        for i in xrange(count):
+            f.write(self._title(70000000 + i * 7))
+        f.write('</catalog_titles>\n')
+        f.close()
+
+    def _title(self, id):
+        rand = self._random
+        kind = 'series' if rand.random() < 0.05 else 'movies'
+        name = ' '.join(rand.sample(_words, rand.randint(1, 3)))
+        url = '%s/catalog/titles/%s/%d' % (_api, kind, id)
+        lines = [ '<catalog_title>', '<id>%s</id>' % url,
+                  '<title short=%s regular=%s/>' % (quoteattr(name),
+                                                     quoteattr(name)) ]
+        lines.append('<box_art small="http://cdn.nflximg.com/us/boxshots/tiny'
+                     '/%d.jpg"/>' % id)
+        lines.append(self._link(url + '/synopsis', 'titles/synopsis',
+                                'synopsis', '<synopsis>%s</synopsis>' %
+                                escape(self._synopsis())))
+        if rand.random() < 0.7:
+            lines.append(self._link(
+                url + '/synopsis.short', 'titles/synopsis.short',
+                'short synopsis', '<short_synopsis>%s</short_synopsis>' %
+                escape(self._synopsis(1))))
+        if rand.random() < 0.97:
+            lines.append('<release_year>%d</release_year>' %
+                         rand.randint(1920, 2011))
+        lines.append('<category scheme="%s/categories/mpaa_ratings" '
+                     'label="%s" term="%s"/>' % ((_api,) +
+                                                 (rand.choice(_mpaas),) * 2))
+        for genre in rand.sample(_genres, rand.randint(1, 3)):
+            lines.append('<category scheme="%s/categories/genres" label=%s '
+                         'term=%s/>' % (_api, quoteattr(genre),
+                                        quoteattr(genre)))
+        lines.append('<runtime>%d</runtime>' % (rand.randint(20, 200) * 60))
+        lines.append(self._link(url + '/format_availability',
+                                'titles/format_availability', 'formats',
+                                self._formats()))
+        art = [ '<link href="http://cdn.nflximg.com/us/boxshots/%s/%d.jpg" '
+                'rel="%s/titles/box_art/%s" title="%s"/>' %
+                (size, id, _schemas, size, size) for
+                size in ('64pix_w', '150pix_w') ]
+        lines.append(self._link(url + '/box_art', 'titles/box_art', 'box art',
+                                '<box_art>%s</box_art>' % ''.join(art)))
+        for rel, count in (('people.cast', rand.randint(0, 8)),
+                           ('people.directors', rand.randint(0, 2))):
+            if count:
+                lines.append(self._link(url + '/' + rel.replace('.', '/'),
+                                        rel, rel.partition('.')[2],
+                                        '<people>%s</people>' %
+                                        ''.join(self._people(count))))
+        if rand.random() < 0.2:
+            lines.append(self._link(url + '/awards', 'titles/awards',
+                                    'awards', self._awards()))
+        lines.append('<link href="http://www.netflix.com/Movie/%s/%d" '
+                     'rel="alternate" title="web page"/>' %
+                     (name.replace(' ', '_').replace('&', 'and'), id))
+        # titles nobody rated yet have a blank rating
+        rating = '%.1f' % (rand.randint(10, 50) / 10.0)
+        lines.append('<average_rating>%s</average_rating>' %
+                     (rating if rand.random() < 0.95 else ' '))
+        lines.append('</catalog_title>')
+        return '\n'.join(lines) + '\n'
+
+    def _link(self, href, rel, title, body):
+        return '<link href="%s" rel="%s/%s" title="%s">%s</link>' % (
+            href, _schemas, rel, title, body)
+
+    def _synopsis(self, sentences=None):
+        rand = self._random
+        count = sentences or rand.randint(2, 5)
+        return ' '.join([ '%s <a href="%s/catalog/people/%d">%s</a> %s.' % (
+            rand.choice(_words), _api, rand.randint(1, 99999),
+            rand.choice(_names), ' '.join(rand.sample(_words, 4)).lower()) for
+            _ in xrange(count) ])
+
+    def _formats(self):
+        rand = self._random
+        formats = []
+        for label in rand.sample(('DVD', 'Blu-ray', 'instant'),
+                                 rand.randint(1, 3)):
+            available = rand.randint(946684800, 1300000000)
+            attrs = 'available_from="%d"' % available
+            if label == 'instant' and rand.random() < 0.5:
+                attrs += ' available_until="%d"' % (available + 86400 * 365)
+            scheme = '%s/categories/title_formats' % _api
+            if rand.random() < 0.3:
+                scheme = scheme.replace('api.', 'api-nccp.')
+            quality = ''
+            if label != 'DVD':
+                hd = rand.choice(('HD', 'SD'))
+                quality = ('<category scheme="%s/quality" label="%s" '
+                           'term="%s"/>' % (scheme, hd, hd))
+            runtime = ''
+            if label == 'instant':
+                runtime = '<runtime>%d</runtime>' % (rand.randint(20, 200) * 60)
+            # now and then the format is listed under both schemes
+            extra = ''
+            if quality and rand.random() < 0.1:
+                extra = ('<category scheme="%s" label="%s" term="%s"/>' %
+                         (scheme.replace('api.', 'api-nccp.'), label, label))
+            formats.append('<availability %s>%s<category scheme="%s" '
+                           'label="%s" term="%s">%s</category>%s'
+                           '</availability>' % (attrs, extra, scheme, label,
+                                                label, quality, runtime))
+        return '<delivery_formats>%s</delivery_formats>' % ''.join(formats)
+
+    def _people(self, count):
+        rand = self._random
+        return [ '<link href="%s/catalog/people/%d" rel="%s/person" '
+                 'title=%s/>' % (_api, rand.randint(1, 99999), _schemas,
+                                 quoteattr(rand.choice(_names))) for
+                 _ in xrange(count) ]
+
+    def _awards(self):
+        rand = self._random
+        awards = []
+        for _ in xrange(rand.randint(1, 4)):
+            tag = rand.choice(('award_winner', 'award_nominee'))
+            name, category = rand.choice(_awards)
+            label = category + (' nominee' if tag == 'award_nominee' else '')
+            person = ''
+            if rand.random() < 0.5:
+                person = ('<link href="%s/catalog/people/%d" rel="%s/person" '
+                          'title=%s/>' % (_api, rand.randint(1, 99999),
+                                          _schemas,
+                                          quoteattr(rand.choice(_names))))
+            awards.append('<%s year="%d"><category scheme="%s/categories/'
+                          'award_types/%s" label="%s" term="%s"/>%s</%s>' %
+                          (tag, rand.randint(1930, 2011), _api, name, label,
+                           label, person, tag))
+        return '<awards>%s</awards>' % ''.join(awards)
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-s', '--scale', dest='scale', type='int', default=10,
+                      help='multiple of 100 catalog titles (default 10)')
+    parser.add_option('-p', '--path', dest='path', default='titles.xml',
+                      help='where to write the catalog')
+    parser.add_option('--seed', dest='seed', type='int', default=1)
+    (options, args) = parser.parse_args()
+    Catalog(options.scale, options.path, options.seed).write()
+    print '%s (%.1f MB)' % (options.path,
+                            os.path.getsize(options.path) / 1048576.0)
+
+if __name__ == '__main__':
+    main()
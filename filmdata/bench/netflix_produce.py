@@ -0,0 +1,51 @@
+"""
+Titles/sec of the netflix catalog producer, parsing serially and in shards
+with more and more worker processes, over a catalog written by
+filmdata.bench.netflix_fixtures.
+
+    python -m filmdata.bench.netflix_fixtures --scale 100 --path /tmp/titles.xml
+    python -m filmdata.bench.netflix_produce --path /tmp/titles.xml -w 1,2,4
+"""
+
+import time
+import logging
+from optparse import OptionParser
+
+from filmdata.bench import report
+from filmdata.source.netflix import Produce
+
+def main():
+    parser = OptionParser()
+    parser.add_option('-p', '--path', dest='path', default='titles.xml',
+                      help='catalog written by filmdata.bench.netflix_fixtures')
+    parser.add_option('-w', '--workers', dest='workers', default='1,2,4',
+                      help='comma separated numbers of processes to try')
+    parser.add_option('-s', '--shard-size', dest='shard_size', type='int',
+                      default=None, help='size of each shard in MB')
+    (options, args) = parser.parse_args()
+
+    # the catalog is full of formats the producer warns about
+    logging.disable(logging.WARNING)
+    Produce._titles_file_path = options.path
+    # the vote counts come from the sink, leave them out
+    Produce._load_votes = classmethod(lambda cls: {})
+    if options.shard_size:
+        Produce._shard_size = options.shard_size * 1024 * 1024
+
+    rows = [ ('workers', 'titles', 'seconds', 'titles/s', 'speedup') ]
+    serial = None
+    for workers in [ int(w) for w in options.workers.split(',') ]:
+        start = time.time()
+        count = 0
+        for _ in Produce._get_titles(workers=workers):
+            count += 1
+        elapsed = time.time() - start
+        if serial is None:
+            serial = elapsed
+        rows.append((str(workers), count, '%.2f' % elapsed,
+                     '%.0f' % (count / max(elapsed, 1e-6)),
+                     '%.2fx' % (serial / max(elapsed, 1e-6))))
+    report(rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Run a slow call (e.g. loading an index) on a thread of its own and pick up
+its result once it's needed, so it overlaps whatever comes in between.
+"""
+
+import sys
+import threading
+
+class Background(object):
+    """
+    A call running on a thread, started right away.  Its result (or the
+    exception it raised) is handed over by result().  The interpreter waits
+    for the thread before it exits, so a load which was started runs to the
+    end (and gets to save what it loaded) even when nobody waits for it.
+    Attributes:
+        name - the name of the thread
+
+    Example:
+        ids = Background(IdIndex.load, 'title.ids')
+        lines = parse_header(path)
+        print ids.result()['Gran Torino (2008)']
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        self._result = None
+        self._error = None
+        self.name = 'background-%s' % getattr(func, '__name__', 'call')
+        self._thread = threading.Thread(target=self._run, name=self.name,
+                                        args=(func, args, kwargs))
+        self._thread.start()
+
+    def _run(self, func, args, kwargs):
+        try:
+            self._result = func(*args, **kwargs)
+        except Exception:
+            self._error = sys.exc_info()
+
+    def done(self):
+        """ Whether the call has returned (or raised). """
+        return not self._thread.is_alive()
+
+    def result(self):
+        """ Wait for the call and get what it returned, or raise its error. """
+        # join in steps, a plain join() can't be interrupted on python 2
+        while self._thread.is_alive():
+            self._thread.join(0.5)
+        if self._error is not None:
+            raise self._error[0], self._error[1], self._error[2]
+        return self._result
@@ -0,0 +1,241 @@
+"""
+A catalog of the titles in a release of a source's lists, parsed once and
+stored in a compact file, so the producers look titles up rather than parse
+the same identifiers over and over.
+"""
+
+import os
+import mmap
+import struct
+import bisect
+import logging
+import cPickle as pickle
+from array import array
+
+from filmdata.lib.digest import hash64
+from filmdata.lib.idindex import MappedArray
+
+log = logging.getLogger(__name__)
+
+class TitleCatalog(object):
+    """
+    Map title identifiers to their (type, name, year, id).  The titles are
+    kept as rows in the order they were added, with the 64 bit hashes of
+    their identifiers sorted in a separate array pointing at the rows (the
+    same hashing scheme as filmdata.lib.idindex.IdIndex).  Identifiers whose
+    hashes collide are kept in full and matched exactly.
+
+    The file is a fixed header followed by the arrays and then the strings,
+    so it can be memory mapped and shared by every process which reads it.
+    Attributes:
+        types - the title types a catalog can hold
+        keys - sorted 64 bit hashes of the identifiers
+        rows - the row of each hash
+        ids - the id of each row (-1 when it has none)
+        years - the year of each row
+        type_codes - the index in types of each row's type
+        ident_offsets, name_offsets - where each row's identifier and name
+            start in the idents and names strings (plus the end of the last)
+        idents, names - the utf-8 identifiers and names one after another
+        collisions - { identifier : row } for identifiers whose hashes collide
+
+    Example:
+        catalog = TitleCatalog.build(lambda: [
+            (u'Gran Torino (2008)', 'film', u'Gran Torino', 2008, 1205489) ])
+        catalog.save('cache/title.catalog')
+        catalog = TitleCatalog.load('cache/title.catalog')
+        print catalog.get(u'Gran Torino (2008)')
+    """
+
+    types = ('film', 'tv', 'video', 'game')
+
+    _magic = 'FDCAT1\0\0'
+    _header = struct.Struct('<8sQQQQ')
+
+    def __init__(self, keys, rows, ids, years, type_codes, ident_offsets,
+                 name_offsets, idents, names, collisions=None):
+        self.keys = keys
+        self.rows = rows
+        self.ids = ids
+        self.years = years
+        self.type_codes = type_codes
+        self.ident_offsets = ident_offsets
+        self.name_offsets = name_offsets
+        self.idents = idents
+        self.names = names
+        self.collisions = collisions or {}
+        self._collided = frozenset(hash64(i) for i in self.collisions)
+        self._mm = None
+        self._last = (None, None)
+
+    @classmethod
+    def build(cls, entries):
+        """
+        Build a catalog.
+        Arguments:
+            entries - a callable which returns an iterable of (identifier,
+                type, name, year, id) tuples (id is None when the title has
+                none yet), it's called again if any of the hashes collide
+        """
+        type_code = dict([ (t, i) for i, t in enumerate(cls.types) ])
+        entry_keys, ids = array('L'), array('l')
+        years, type_codes = array('H'), array('B')
+        ident_offsets, name_offsets = array('L', [0]), array('L', [0])
+        idents, names = [], []
+        for ident, type, name, year, id in entries():
+            ident = ident.encode('utf-8')
+            name = name.encode('utf-8')
+            entry_keys.append(hash64(ident))
+            ids.append(-1 if id is None else id)
+            years.append(year)
+            type_codes.append(type_code[type])
+            idents.append(ident)
+            names.append(name)
+            ident_offsets.append(ident_offsets[-1] + len(ident))
+            name_offsets.append(name_offsets[-1] + len(name))
+
+        rows = array('L', sorted(xrange(len(entry_keys)),
+                                 key=entry_keys.__getitem__))
+        keys = array('L', [ entry_keys[r] for r in rows ])
+        collided = set(keys[i] for i in xrange(1, len(keys)) if
+                       keys[i] == keys[i - 1])
+        collisions = {}
+        if collided:
+            for row, entry in enumerate(entries()):
+                if hash64(entry[0]) in collided:
+                    collisions[entry[0]] = row
+            log.info('%d titles have colliding hashes' % len(collisions))
+        return cls(keys, rows, ids, years, type_codes, ident_offsets,
+                   name_offsets, ''.join(idents), ''.join(names), collisions)
+
+    @classmethod
+    def load(cls, path, mapped=False):
+        """
+        Load a catalog from a file.
+        Arguments:
+            path - the path to the catalog file
+            mapped - memory map the catalog instead of reading it in (loads
+                instantly and the pages are shared between processes, but
+                each lookup is slower)
+        """
+        f = open(path, 'rb')
+        try:
+            magic, count, idents_size, names_size, extra = cls._header.unpack(
+                f.read(cls._header.size))
+            if magic != cls._magic:
+                raise ValueError('%s is not a title catalog' % path)
+            # 8 byte keys, rows, ids and 2 x (count + 1) offsets, then the
+            # 2 byte years and 1 byte types
+            layout = [ ('keys', 'Q', 'L', count), ('rows', 'Q', 'L', count),
+                       ('ids', 'q', 'l', count),
+                       ('ident_offsets', 'Q', 'L', count + 1),
+                       ('name_offsets', 'Q', 'L', count + 1),
+                       ('years', 'H', 'H', count),
+                       ('type_codes', 'B', 'B', count) ]
+            offset = cls._header.size
+            mm = None
+            if mapped:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            fields = {}
+            for name, fmt, typecode, size in layout:
+                if mapped:
+                    fields[name] = MappedArray(mm, offset, size, fmt)
+                else:
+                    fields[name] = array(typecode)
+                    fields[name].fromfile(f, size)
+                offset += size * struct.calcsize(fmt)
+            if mapped:
+                fields['idents'] = _MappedString(mm, offset)
+                fields['names'] = _MappedString(mm, offset + idents_size)
+                f.seek(offset + idents_size + names_size)
+            else:
+                fields['idents'] = f.read(idents_size)
+                fields['names'] = f.read(names_size)
+            fields['collisions'] = pickle.loads(f.read(extra)) if extra else {}
+            catalog = cls(**fields)
+            catalog._mm = mm
+        finally:
+            f.close()
+        return catalog
+
+    def save(self, path):
+        catalog_dir = os.path.dirname(path)
+        if catalog_dir and not os.path.isdir(catalog_dir):
+            os.makedirs(catalog_dir)
+        extra = ''
+        if self.collisions:
+            extra = pickle.dumps(self.collisions, pickle.HIGHEST_PROTOCOL)
+        tmp_path = '%s.tmp' % path
+        f = open(tmp_path, 'wb')
+        f.write(self._header.pack(self._magic, len(self.keys),
+                                  len(self.idents), len(self.names),
+                                  len(extra)))
+        for field in (self.keys, self.rows, self.ids, self.ident_offsets,
+                      self.name_offsets, self.years, self.type_codes):
+            field.tofile(f)
+        f.write(self.idents)
+        f.write(self.names)
+        f.write(extra)
+        f.close()
+        os.rename(tmp_path, path)
+
+    def get(self, ident, default=None):
+        """
+        Get the (type, name, year, id) of a title, the id is None when the
+        title has none.
+        """
+        # the last lookup is remembered since a parser and the producer
+        # reading from it tend to look up the same title one after the other
+        last = self._last
+        if last[0] == ident:
+            entry = last[1]
+        else:
+            row = self._find(ident)
+            entry = None if row is None else self._entry(row)
+            self._last = (ident, entry)
+        return default if entry is None else entry
+
+    def __getitem__(self, ident):
+        entry = self.get(ident)
+        if entry is None:
+            raise KeyError(ident)
+        return entry
+
+    def __contains__(self, ident):
+        return self.get(ident) is not None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        """ Iterate over the (identifier, type, name, year, id) of each row """
+        for row in xrange(len(self.keys)):
+            ident = self.idents[self.ident_offsets[row]:
+                                self.ident_offsets[row + 1]]
+            yield (ident.decode('utf-8'),) + self._entry(row)
+
+    def _entry(self, row):
+        id = self.ids[row]
+        return (self.types[self.type_codes[row]],
+                self.names[self.name_offsets[row]:
+                           self.name_offsets[row + 1]].decode('utf-8'),
+                self.years[row], None if id == -1 else id)
+
+    def _find(self, ident):
+        key = hash64(ident)
+        if key in self._collided:
+            return self.collisions.get(ident)
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.rows[i]
+        return None
+
+class _MappedString(object):
+    """ Slices of the bytes in a memory mapped file from an offset on. """
+
+    def __init__(self, mm, offset):
+        self._mm = mm
+        self._offset = offset
+
+    def __getitem__(self, s):
+        return self._mm[self._offset + s.start:self._offset + s.stop]
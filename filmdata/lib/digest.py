@@ -0,0 +1,141 @@
+"""
+Persistent tables of content digests, used to work out which records of a
+source changed since the last time it was imported.
+"""
+
+import os
+import struct
+import bisect
+import hashlib
+import logging
+from array import array
+
+log = logging.getLogger(__name__)
+
+_unpack_q = struct.Struct('<Q').unpack
+_md5 = hashlib.md5
+
+def hash64(s):
+    """ 64 bit hash of a string (the first 8 bytes of its md5) """
+    if isinstance(s, unicode):
+        s = s.encode('utf-8')
+    return _unpack_q(_md5(s).digest()[:8])[0]
+
+class DigestTable(object):
+    """
+    A table of (key hash, content digest, id) entries from the last import,
+    stored as sorted parallel arrays so even millions of entries stay small.
+    Attributes:
+        path - where the table is stored
+        keys - sorted 64 bit hashes of the record keys
+        digests - the 64 bit content digest of each record
+        ids - the id of each record in the sink (-1 when it had none)
+
+    Example:
+        table = DigestTable('cache/actor.digests')
+        for op, person in table.diff(persons):
+            print op, person  # ('insert'|'update', record) or ('delete', id)
+    """
+
+    _magic = 'FDDT1'
+
+    def __init__(self, path):
+        self.path = path
+        self.keys = array('L')
+        self.digests = array('L')
+        self.ids = array('l')
+        self._sorted_ids = None
+        assert self.keys.itemsize == 8, 'needs 64 bit unsigned longs'
+        if os.path.exists(path):
+            self._load()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def find(self, key):
+        """ Get the index of a key hash or -1 when it's not in the table. """
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return i
+        return -1
+
+    def has_id(self, id):
+        """ Whether any of the records in the table has an id. """
+        if self._sorted_ids is None:
+            self._sorted_ids = array('l', sorted(self.ids))
+        i = bisect.bisect_left(self._sorted_ids, id)
+        return i < len(self._sorted_ids) and self._sorted_ids[i] == id
+
+    def diff(self, records):
+        """
+        Compare records against the table.  Once all of the records have
+        been consumed the table is replaced by one built from them.
+        Arguments:
+            records - an iterable of (key, digest, id, record) tuples, key is
+                the string identifying the record in the source and digest
+                any string covering its content
+        Returns an iterator of ('insert', record) and ('update', record)
+            tuples for new and changed records, followed by ('delete', id)
+            tuples for the records which are gone.
+        """
+        seen = array('B', [0]) * len(self.keys)
+        new_keys, new_digests, new_ids = array('L'), array('L'), array('l')
+        counts = { 'insert' : 0, 'update' : 0, 'delete' : 0, 'same' : 0 }
+        for key, digest, id, record in records:
+            key, digest = hash64(key), hash64(digest)
+            new_keys.append(key)
+            new_digests.append(digest)
+            new_ids.append(-1 if id is None else id)
+            i = self.find(key)
+            if i < 0:
+                counts['insert'] += 1
+                yield 'insert', record
+            else:
+                seen[i] = 1
+                if self.digests[i] != digest:
+                    counts['update'] += 1
+                    yield 'update', record
+                else:
+                    counts['same'] += 1
+
+        for i, found in enumerate(seen):
+            if not found and self.ids[i] >= 0:
+                counts['delete'] += 1
+                yield 'delete', self.ids[i]
+
+        log.info('Diffed against %s: %s' % (self.path, str(counts)))
+        self.keys, self.digests, self.ids = self._sorted(new_keys, new_digests,
+                                                         new_ids)
+        self._sorted_ids = None
+        self.save()
+
+    def save(self):
+        table_dir = os.path.dirname(self.path)
+        if table_dir and not os.path.isdir(table_dir):
+            os.makedirs(table_dir)
+        tmp_path = '%s.tmp' % self.path
+        f = open(tmp_path, 'wb')
+        f.write(self._magic)
+        f.write(struct.pack('<Q', len(self.keys)))
+        for a in (self.keys, self.digests, self.ids):
+            a.tofile(f)
+        f.close()
+        os.rename(tmp_path, self.path)
+
+    def _load(self):
+        f = open(self.path, 'rb')
+        try:
+            if f.read(len(self._magic)) != self._magic:
+                log.warn('Ignoring unknown digest table %s' % self.path)
+                return
+            count = struct.unpack('<Q', f.read(8))[0]
+            for a in (self.keys, self.digests, self.ids):
+                a.fromfile(f, count)
+        finally:
+            f.close()
+
+    def _sorted(self, keys, digests, ids):
+        order = sorted(xrange(len(keys)), key=keys.__getitem__)
+        return (array('L', [ keys[i] for i in order ]),
+                array('L', [ digests[i] for i in order ]),
+                array('l', [ ids[i] for i in order ]))
@@ -0,0 +1,229 @@
+"""
+Streaming downloads over http(s) or ftp which decompress on the fly, pick up
+interrupted transfers where they stopped and report their throughput.
+"""
+
+import os
+import time
+import zlib
+import socket
+import ftplib
+import urllib2
+import logging
+from urlparse import urlparse
+
+log = logging.getLogger(__name__)
+
+class DownloadError(Exception): pass
+class UnzipError(DownloadError): pass
+
+class Download(object):
+    """
+    Download a url into a file in a single pass, decompressing gzip data as
+    it arrives (so the archive never touches the disk).  The data goes to
+    a .part file which is renamed once the transfer is complete.
+
+    When the connection drops the transfer is resumed from the last byte
+    received (http Range / ftp REST), up to a number of retries.  The
+    decompressor state only lives in memory, so a new process can only
+    pick up a .part file from an earlier run when not decompressing.
+    Attributes:
+        url - the http, https or ftp url to fetch
+        dest - the path to write the (decompressed) data to
+        decompress - gunzip the data as it arrives, None leaves it up to the
+            Content-Encoding of the http response
+        headers - extra http request headers
+        chunk_size - bytes to read at a time
+        retries - how many times to reconnect after an error
+        timeout - socket timeout in seconds
+        report_every - seconds between throughput log messages
+        received - bytes received so far (compressed)
+        written - bytes written so far (decompressed)
+        size - the size of the remote file, if the server says
+
+    Example:
+        Download('ftp://ftp.fu-berlin.de/pub/misc/movies/database/'
+                 'ratings.list.gz', 'ratings.list', decompress=True).run()
+    """
+
+    def __init__(self, url, dest, decompress=False, headers=None,
+                 chunk_size=64 * 1024, retries=5, timeout=60,
+                 report_every=10):
+        self.url = url
+        self.dest = dest
+        self.decompress = decompress
+        self.headers = headers or {}
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout = timeout
+        self.report_every = report_every
+        self.received = 0
+        self.written = 0
+        self.size = None
+        self._part_path = '%s.part' % dest
+        self._unzip = None
+
+    def run(self):
+        """
+        Run the download.
+        Returns the number of bytes written to dest.
+        """
+        dest_dir = os.path.dirname(self.dest)
+        if dest_dir and not os.path.isdir(dest_dir):
+            os.makedirs(dest_dir)
+
+        stored_raw = self.decompress is not None and not self.decompress
+        if stored_raw and os.path.exists(self._part_path):
+            self.received = self.written = os.path.getsize(self._part_path)
+            log.info('Resuming %s from byte %d' % (self.url, self.received))
+        else:
+            open(self._part_path, 'wb').close()
+        if self.decompress:
+            self._unzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        self._started = self._reported = time.time()
+        self._reported_bytes = self.received
+        out = open(self._part_path, 'ab')
+        try:
+            attempt = 0
+            while True:
+                try:
+                    self._transfer(out)
+                    break
+                except urllib2.HTTPError, e:
+                    if e.code < 500:
+                        raise DownloadError('Error downloading %s: %s' %
+                                            (self.url, str(e)))
+                    error = e
+                except (IOError, socket.error, ftplib.error_temp,
+                        ftplib.error_reply, EOFError), e:
+                    error = e
+                attempt += 1
+                if attempt > self.retries:
+                    raise DownloadError('Error downloading %s: %s' %
+                                        (self.url, str(error)))
+                log.warn('Transfer of %s broke at byte %d (%s), '
+                         'resuming (%d/%d)' % (self.url, self.received,
+                                               str(error), attempt,
+                                               self.retries))
+                time.sleep(min(attempt, 5))
+            if self._unzip:
+                self._write(out, self._unzip.flush())
+        finally:
+            out.close()
+
+        if self.size is not None and self.received != self.size:
+            raise DownloadError('Only got %d of %d bytes from %s' %
+                                (self.received, self.size, self.url))
+        os.rename(self._part_path, self.dest)
+        elapsed = max(time.time() - self._started, 0.001)
+        log.info('Downloaded %s to %s: %d bytes in %.1fs (%.2f MB/s)' %
+                 (self.url, self.dest, self.received, elapsed,
+                  self.received / elapsed / 1024 / 1024))
+        return self.written
+
+    def _transfer(self, out):
+        scheme = urlparse(self.url).scheme
+        if scheme == 'ftp':
+            chunks = self._ftp_chunks()
+        elif scheme in ('http', 'https'):
+            chunks = self._http_chunks()
+        else:
+            raise DownloadError('Unsupported url %s' % self.url)
+        for chunk in chunks:
+            self.received += len(chunk)
+            if self._unzip:
+                try:
+                    chunk = self._unzip.decompress(chunk)
+                except zlib.error, e:
+                    raise UnzipError('Error gunzipping %s: %s' %
+                                     (self.url, str(e)))
+            self._write(out, chunk)
+            self._report()
+        if self.size is not None and self.received < self.size:
+            raise IOError('connection closed after %d of %d bytes' %
+                          (self.received, self.size))
+
+    def _write(self, out, data):
+        if data:
+            out.write(data)
+            self.written += len(data)
+
+    def _request_url(self):
+        """ The url to request, which may differ on every (re)connect """
+        return self.url
+
+    def _http_chunks(self):
+        request = urllib2.Request(self._request_url(), headers=self.headers)
+        if self.received:
+            request.add_header('Range', 'bytes=%d-' % self.received)
+        try:
+            resp = urllib2.urlopen(request, timeout=self.timeout)
+        except urllib2.HTTPError, e:
+            if e.code == 416 and self.received and self._is_complete(e):
+                return
+            raise
+        if self.received and resp.getcode() != 206:
+            raise DownloadError('Server ignored the range request for %s, '
+                                'unable to resume' % self.url)
+        if self.decompress is None:
+            encoding = resp.info().get('content-encoding', '')
+            self.decompress = encoding.lower() == 'gzip'
+            if self.decompress:
+                self._unzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        length = resp.info().get('content-length')
+        if length is not None:
+            self.size = self.received + int(length)
+        try:
+            for chunk in iter(lambda: resp.read(self.chunk_size), ''):
+                yield chunk
+        finally:
+            resp.close()
+
+    def _is_complete(self, e):
+        """
+        Whether a 416 to a range request means everything was received,
+        as when resuming a .part file from a run which got every byte.
+        """
+        total = e.info().get('content-range', '').rpartition('/')[2]
+        if total.isdigit():
+            self.size = int(total)
+        elif self.size is None:
+            self.size = self.received
+        return self.received == self.size
+
+    def _ftp_chunks(self):
+        if self.decompress is None:
+            self.decompress = False
+        url = urlparse(self._request_url())
+        ftp = ftplib.FTP(timeout=self.timeout)
+        ftp.connect(url.hostname, url.port or 21)
+        try:
+            ftp.login(url.username or 'anonymous', url.password or '')
+            ftp.voidcmd('TYPE I')
+            if self.size is None:
+                try:
+                    self.size = ftp.size(url.path)
+                except ftplib.error_perm:
+                    pass
+            conn = ftp.transfercmd('RETR %s' % url.path,
+                                   rest=self.received or None)
+            try:
+                for chunk in iter(lambda: conn.recv(self.chunk_size), ''):
+                    yield chunk
+            finally:
+                conn.close()
+            ftp.voidresp()
+        finally:
+            ftp.close()
+
+    def _report(self):
+        now = time.time()
+        if now - self._reported < self.report_every:
+            return
+        rate = (self.received - self._reported_bytes) / (now - self._reported)
+        total = '%.1f' % (self.size / 1048576.0) if self.size else '?'
+        log.info('%s: %.1f of %s MB (%.2f MB/s)' %
+                 (self.url, self.received / 1048576.0, total,
+                  rate / 1048576.0))
+        self._reported, self._reported_bytes = now, self.received
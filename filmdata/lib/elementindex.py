@@ -0,0 +1,230 @@
+"""
+A sidecar index of where the repeated elements of a big xml file (e.g. the
+catalog_title elements of netflix's catalog) sit in it, so a single element
+can be read by seeking straight to it instead of parsing the whole file.
+"""
+
+import os
+import re
+import mmap
+import struct
+import bisect
+import logging
+from array import array
+
+log = logging.getLogger(__name__)
+
+class ElementIndex(object):
+    """
+    Map the numeric ids of the elements of an xml file to their (byte
+    offset, length, text), the text being something pulled out of the
+    element along with its id (e.g. a link).  The rows are kept in the order
+    of the file, with the ids sorted in a separate array pointing at them.
+
+    The file is a fixed header followed by the arrays and then the texts,
+    along the lines of filmdata.lib.catalog.TitleCatalog.
+    Attributes:
+        keys - the sorted ids
+        rows - the row of each key
+        ids - the id of each row
+        offsets - the byte offset of each row's element
+        lengths - the length in bytes of each row's element
+        text_offsets - where each row's text starts in texts (plus the end
+            of the last)
+        texts - the texts one after another
+        source_size - the size of the xml file when it was indexed
+        source_mtime - the mtime of the xml file when it was indexed
+
+    Example:
+        index = ElementIndex.build('titles.xml', 'catalog_title',
+                                   re.compile('<id>[^<]*/([0-9]+)</id>'),
+                                   re.compile('<link href="([^"]*)" '
+                                              'rel="alternate"'))
+        index.save('titles.idx')
+        offset, length, link = index.get(70000000)
+        print index.read('titles.xml', 70000000)
+    """
+
+    _magic = 'FDELX2\0\0'
+    _header = struct.Struct('<8sQQQd')
+
+    def __init__(self, keys, rows, ids, offsets, lengths, text_offsets,
+                 texts, source_size=None, source_mtime=None):
+        self.keys = keys
+        self.rows = rows
+        self.ids = ids
+        self.offsets = offsets
+        self.lengths = lengths
+        self.text_offsets = text_offsets
+        self.texts = texts
+        self.source_size = source_size
+        self.source_mtime = source_mtime
+
+    @classmethod
+    def build(cls, path, tag, id_pattern, text_pattern=None):
+        """
+        Index the elements of an xml file in one pass over its bytes.  The
+        elements are found by their start and end tags, so they mustn't be
+        nested in each other.
+        Arguments:
+            path - the path to the xml file
+            tag - the tag of the elements to index
+            id_pattern - a compiled regex whose first group is the id of an
+                element, searched for in the element's bytes (elements
+                without an id are left out)
+            text_pattern - a compiled regex whose first group is the text to
+                keep with an element (an empty string when it doesn't match)
+        """
+        ids, offsets, lengths = array('l'), array('L'), array('L')
+        text_offsets, texts = array('L', [0]), []
+        re_start = re.compile('<%s[\\s>]' % re.escape(tag))
+        end_tag = '</%s>' % tag
+
+        f = open(path, 'rb')
+        stat = os.fstat(f.fileno())
+        source_size, source_mtime = stat.st_size, stat.st_mtime
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) \
+                if source_size else ''
+        try:
+            match = re_start.search(mm)
+            while match:
+                start = match.start()
+                end = mm.find(end_tag, start)
+                if end < 0:
+                    log.warn('Unclosed %s at byte %d of %s' %
+                             (tag, start, path))
+                    break
+                end += len(end_tag)
+                element = mm[start:end]
+                id_match = id_pattern.search(element)
+                if id_match:
+                    text = ''
+                    if text_pattern is not None:
+                        text_match = text_pattern.search(element)
+                        if text_match:
+                            text = text_match.group(1)
+                    ids.append(int(id_match.group(1)))
+                    offsets.append(start)
+                    lengths.append(end - start)
+                    texts.append(text)
+                    text_offsets.append(text_offsets[-1] + len(text))
+                match = re_start.search(mm, end)
+        finally:
+            if mm:
+                mm.close()
+            f.close()
+
+        rows = array('L', sorted(xrange(len(ids)), key=ids.__getitem__))
+        keys = array('l', [ ids[r] for r in rows ])
+        log.info('Indexed %d %s elements of %s' % (len(ids), tag, path))
+        return cls(keys, rows, ids, offsets, lengths, text_offsets,
+                   ''.join(texts), source_size, source_mtime)
+
+    @classmethod
+    def load(cls, path):
+        """ Load an index from a file. """
+        f = open(path, 'rb')
+        try:
+            magic, count, texts_size, source_size, source_mtime = \
+                    cls._header.unpack(f.read(cls._header.size))
+            if magic != cls._magic:
+                raise ValueError('%s is not an element index' % path)
+            fields = {}
+            for name, typecode, size in (('keys', 'l', count),
+                                         ('rows', 'L', count),
+                                         ('ids', 'l', count),
+                                         ('offsets', 'L', count),
+                                         ('lengths', 'L', count),
+                                         ('text_offsets', 'L', count + 1)):
+                fields[name] = array(typecode)
+                fields[name].fromfile(f, size)
+            fields['texts'] = f.read(texts_size)
+        finally:
+            f.close()
+        return cls(source_size=source_size, source_mtime=source_mtime,
+                   **fields)
+
+    def save(self, path):
+        index_dir = os.path.dirname(path)
+        if index_dir and not os.path.isdir(index_dir):
+            os.makedirs(index_dir)
+        tmp_path = '%s.tmp' % path
+        f = open(tmp_path, 'wb')
+        f.write(self._header.pack(self._magic, len(self.ids), len(self.texts),
+                                  self.source_size or 0,
+                                  self.source_mtime or 0))
+        for field in (self.keys, self.rows, self.ids, self.offsets,
+                      self.lengths, self.text_offsets):
+            field.tofile(f)
+        f.write(self.texts)
+        f.close()
+        os.rename(tmp_path, path)
+
+    def is_fresh(self, path):
+        """
+        Whether the xml file still has the size and mtime it was indexed
+        with, so the offsets still point at its elements.
+        """
+        stat = os.stat(path)
+        return (self.source_size == stat.st_size and
+                self.source_mtime == stat.st_mtime)
+
+    def get(self, id, default=None):
+        """ Get the (offset, length, text) of the element with an id. """
+        i = bisect.bisect_left(self.keys, id)
+        if i < len(self.keys) and self.keys[i] == id:
+            return self._entry(self.rows[i])
+        return default
+
+    def __getitem__(self, id):
+        entry = self.get(id)
+        if entry is None:
+            raise KeyError(id)
+        return entry
+
+    def __contains__(self, id):
+        return self.get(id) is not None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        """ Iterate over the (id, offset, length, text) in the file's order """
+        for row in xrange(len(self.ids)):
+            yield (self.ids[row],) + self._entry(row)
+
+    def read(self, path, id):
+        """
+        Read the bytes of the element with an id out of the xml file, or
+        None when it isn't in the index.
+        """
+        entry = self.get(id)
+        if entry is None:
+            return None
+        f = open(path, 'rb')
+        try:
+            f.seek(entry[0])
+            return f.read(entry[1])
+        finally:
+            f.close()
+
+    def elements(self, path):
+        """
+        Iterate over the (id, bytes) of every element in the order of the
+        xml file, read through a memory map.
+        """
+        if not len(self.ids):
+            return
+        f = open(path, 'rb')
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for row in xrange(len(self.ids)):
+                offset = self.offsets[row]
+                yield self.ids[row], mm[offset:offset + self.lengths[row]]
+        finally:
+            mm.close()
+            f.close()
+
+    def _entry(self, row):
+        return (self.offsets[row], self.lengths[row],
+                self.texts[self.text_offsets[row]:self.text_offsets[row + 1]])
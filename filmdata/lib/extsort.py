@@ -0,0 +1,173 @@
+"""
+Sorting (and grouping) record streams which don't fit in memory, by
+spilling sorted runs to disk and merging them back together.
+"""
+
+import os
+import sys
+import heapq
+import logging
+import tempfile
+import cPickle as pickle
+from itertools import groupby, imap, islice
+from operator import itemgetter
+
+log = logging.getLogger(__name__)
+
+class ExternalSort(object):
+    """
+    Sort records by a key within a memory budget.  Records are buffered
+    until the budget is used up, then the buffer is sorted and spilled to
+    a temporary file as a run.  Iterating merges the runs (and whatever is
+    still buffered) back together, at most fan_in runs at a time so that
+    the batches being read stay within the budget too.  The sort is stable.
+    Attributes:
+        key - function which returns the sort key of a record
+        budget - the approximate number of bytes the buffer may use
+        tmp_dir - where to spill the runs (defaults to the system tmp dir)
+        runs - the paths of the spilled runs
+
+    Example:
+        sorter = ExternalSort(itemgetter('id'), budget=64 * 1024 * 1024)
+        for title in titles:
+            sorter.add(title)
+        for title in sorter:
+            print title['id']
+    """
+
+    _sample_size = 100
+    _fan_in = 16
+
+    def __init__(self, key, budget=64 * 1024 * 1024, tmp_dir=None):
+        self.key = key
+        self.budget = budget
+        self.tmp_dir = tmp_dir
+        self.runs = []
+        self._buffer = []
+        self._max_records = None
+        self._batch_size = 1000
+        self._count = 0
+
+    def add(self, record):
+        """ Add a record, spilling the buffer to disk if it's full. """
+        self._buffer.append((self.key(record), self._count, record))
+        self._count += 1
+        if self._max_records is None:
+            if len(self._buffer) == self._sample_size:
+                self._max_records = self._estimate_max_records()
+                # a merge reads a batch from each of fan_in runs at once
+                self._batch_size = max(1, self._max_records /
+                                          self._fan_in / 2)
+        elif len(self._buffer) >= self._max_records:
+            self._spill()
+
+    def extend(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+    def __iter__(self):
+        if self.runs and self._buffer:
+            self._spill()
+        while len(self.runs) > self._fan_in:
+            self._merge_runs()
+        self._buffer.sort()
+        streams = [ self._read_run(path) for path in self.runs ]
+        streams.append(iter(self._buffer))
+        self._buffer = []
+        try:
+            for item in heapq.merge(*streams):
+                yield item[2]
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        """ Remove the spilled runs. """
+        for path in self.runs:
+            if os.path.exists(path):
+                os.remove(path)
+        self.runs = []
+
+    def _estimate_max_records(self):
+        size = sum(_deep_size(item) for item in self._buffer)
+        per_record = max(1, size / len(self._buffer))
+        return max(self._sample_size, self.budget / per_record)
+
+    def _spill(self):
+        self._buffer.sort()
+        path = self._write_run(self._buffer)
+        log.debug('Spilled run of %d records to %s' % (len(self._buffer),
+                                                        path))
+        self.runs.append(path)
+        self._buffer = []
+
+    def _merge_runs(self):
+        """ Merge the fan_in smallest runs into one. """
+        self.runs.sort(key=os.path.getsize)
+        merging, self.runs = self.runs[:self._fan_in], self.runs[self._fan_in:]
+        path = self._write_run(heapq.merge(*[ self._read_run(p) for
+                                              p in merging ]))
+        for p in merging:
+            os.remove(p)
+        log.debug('Merged %d runs into %s' % (len(merging), path))
+        self.runs.append(path)
+
+    def _write_run(self, items):
+        fd, path = tempfile.mkstemp(prefix='filmdata-run-', dir=self.tmp_dir)
+        f = os.fdopen(fd, 'wb')
+        items = iter(items)
+        while True:
+            batch = list(islice(items, self._batch_size))
+            if not batch:
+                break
+            pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+        f.close()
+        return path
+
+    def _read_run(self, path):
+        f = open(path, 'rb')
+        try:
+            while True:
+                try:
+                    batch = pickle.load(f)
+                except EOFError:
+                    break
+                for item in batch:
+                    yield item
+        finally:
+            f.close()
+
+def _deep_size(obj):
+    """ Rough in memory size of an object and the containers inside it. """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_size(k) + _deep_size(v) for k, v in obj.iteritems())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_size(v) for v in obj)
+    elif hasattr(obj, 'itervalues'):
+        size += sum(_deep_size(v) for v in obj.itervalues())
+    return size
+
+def external_sort(records, key, budget=64 * 1024 * 1024, tmp_dir=None):
+    """
+    Sort an iterable of records within a memory budget (see ExternalSort).
+    Returns an iterator of the sorted records.
+    """
+    return iter(ExternalSort(key, budget, tmp_dir).extend(records))
+
+def merge_join(streams, key):
+    """
+    Merge several streams which are already sorted by key and group the
+    records which share a key.  Records with the same key come out in the
+    order of the streams they came from.
+    Arguments:
+        streams - a sequence of iterators, each one sorted by key
+        key - function which returns the key of a record
+    Returns an iterator of (key, [records]) tuples in key order.
+    """
+    decorated = [ imap(lambda (n, r), i=i: (key(r), i, n, r),
+                       enumerate(stream)) for
+                  i, stream in enumerate(streams) ]
+    merged = heapq.merge(*decorated)
+    for k, group in groupby(merged, key=itemgetter(0)):
+        yield k, [ r for _, _, _, r in group ]
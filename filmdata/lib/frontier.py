@@ -0,0 +1,106 @@
+"""
+Persistent work lists for long running scrapes, so a scrape which stopped
+half way picks up where it left off instead of working out all over again
+what it still has to fetch.
+"""
+
+import os
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+class Frontier(object):
+    """
+    A file of pending entries plus a cursor into it.  The entries are
+    written once, one json list per line, and iterated from the cursor on.
+    commit() moves the cursor up to the last entry handed out, call it
+    once everything handed out so far has been dealt with.
+    Attributes:
+        path - where the entries are stored (the cursor goes in a .cursor
+            sidecar file)
+        offset - byte offset of the next entry to hand out
+
+    Example:
+        frontier = Frontier('cache/person.frontier')
+        if not frontier.pending():
+            frontier.build(get_person_urls())
+        for ident, url in frontier:
+            fetch(url)
+            frontier.commit()
+        frontier.clear()
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._cursor_path = '%s.cursor' % path
+        self.offset = self._read_cursor()
+
+    def pending(self):
+        """ Check whether there are entries left from an earlier run. """
+        return (os.path.exists(self.path) and
+                self.offset < os.path.getsize(self.path))
+
+    def build(self, entries):
+        """
+        Replace the frontier with new entries and reset the cursor.
+        Arguments:
+            entries - an iterable of json serializable tuples
+        Returns the number of entries written.
+        """
+        frontier_dir = os.path.dirname(self.path)
+        if frontier_dir and not os.path.isdir(frontier_dir):
+            os.makedirs(frontier_dir)
+        tmp_path = '%s.tmp' % self.path
+        f = open(tmp_path, 'w')
+        count = 0
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
+            count += 1
+        f.close()
+        os.rename(tmp_path, self.path)
+        self.offset = 0
+        self._write_cursor(0)
+        log.info('Built frontier %s with %d entries' % (self.path, count))
+        return count
+
+    def __iter__(self):
+        f = open(self.path)
+        try:
+            f.seek(self.offset)
+            if self.offset:
+                log.info('Resuming frontier %s at byte %d of %d' %
+                         (self.path, self.offset, os.path.getsize(self.path)))
+            self._handed_out = self.offset
+            for line in iter(f.readline, ''):
+                self._handed_out = f.tell()
+                yield tuple(json.loads(line))
+        finally:
+            f.close()
+
+    def commit(self):
+        """ Save the cursor just past the last entry handed out. """
+        handed_out = getattr(self, '_handed_out', self.offset)
+        if handed_out != self.offset:
+            self.offset = handed_out
+            self._write_cursor(handed_out)
+
+    def clear(self):
+        """ Remove the frontier once it's done. """
+        for path in (self.path, self._cursor_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.offset = 0
+
+    def _read_cursor(self):
+        try:
+            return int(open(self._cursor_path).read().strip() or 0)
+        except (IOError, ValueError):
+            return 0
+
+    def _write_cursor(self, offset):
+        tmp_path = '%s.tmp' % self._cursor_path
+        f = open(tmp_path, 'w')
+        f.write('%d\n' % offset)
+        f.close()
+        os.rename(tmp_path, self._cursor_path)
@@ -0,0 +1,59 @@
+"""
+Spread statistics over vote histograms, worked out for a whole catalog of
+titles at once with numpy.
+"""
+
+def spread(histograms, values=None, percentiles=(25, 50, 75)):
+    """
+    Get the mean, variance and percentiles of the ratings of every title
+    from its vote histogram, in one vectorized pass.
+    Arguments:
+        histograms - a sequence of histograms with the same number of
+            buckets, each one a byte string or an array('B') of the (relative)
+            number of votes in each bucket (e.g. imdb's rating distribution)
+        values - the rating each bucket stands for (defaults to 1 to the
+            number of buckets)
+        percentiles - the percentiles to work out
+    Returns a dict of numpy arrays with a value for each histogram, under
+        'mean', 'variance' and 'p<percentile>' (e.g. 'p50' for the median).
+        Titles whose histograms are empty get nan.
+    Example:
+        stats = spread([ t['distribution'] for t in titles ])
+        for title, variance in zip(titles, stats['variance']):
+            print title['id'], variance
+    """
+    numpy = __import__('numpy')
+    raw = ''.join([ h if isinstance(h, str) else h.tostring() for
+                    h in histograms ])
+    if not raw:
+        empty = numpy.zeros(0)
+        stats = { 'mean' : empty, 'variance' : empty }
+        stats.update([ ('p%d' % p, empty) for p in percentiles ])
+        return stats
+    counts = numpy.frombuffer(raw, dtype=numpy.uint8).astype(numpy.float64)
+    counts = counts.reshape(len(histograms), -1)
+    buckets = counts.shape[1]
+    if values is None:
+        values = numpy.arange(1, buckets + 1, dtype=numpy.float64)
+    else:
+        values = numpy.asarray(values, dtype=numpy.float64)
+
+    totals = counts.sum(axis=1)
+    empty = totals == 0
+    totals[empty] = 1
+    shares = counts / totals[:, numpy.newaxis]
+    mean = (shares * values).sum(axis=1)
+    variance = (shares * (values - mean[:, numpy.newaxis]) ** 2).sum(axis=1)
+    mean[empty] = numpy.nan
+    variance[empty] = numpy.nan
+    stats = { 'mean' : mean, 'variance' : variance }
+
+    cumulative = shares.cumsum(axis=1)
+    for p in percentiles:
+        # the first bucket the cumulative share reaches the percentile in
+        # (the small margin keeps rounding from skipping a bucket)
+        reached = cumulative >= p / 100.0 - 1e-9
+        found = values[reached.argmax(axis=1)]
+        found[empty] = numpy.nan
+        stats['p%d' % p] = found
+    return stats
@@ -0,0 +1,182 @@
+"""
+Compact indexes from source identifiers (e.g. imdb's "Eastwood, Clint") to
+numeric ids, which take a fraction of the memory of a dict of the strings.
+"""
+
+import os
+import mmap
+import struct
+import bisect
+import logging
+import cPickle as pickle
+from array import array
+
+from filmdata.lib.digest import hash64
+
+log = logging.getLogger(__name__)
+
+class MappedArray(object):
+    """
+    Read only sequence of fixed size integers in a memory mapped file.
+    Arguments:
+        mm - the mmap
+        offset - byte offset of the first item
+        count - number of items
+        fmt - struct format of an item (e.g. 'Q'), always little endian
+    """
+
+    def __init__(self, mm, offset, count, fmt):
+        self._mm = mm
+        self._offset = offset
+        self._count = count
+        self._fmt = '<%s' % fmt
+        self._size = struct.calcsize(self._fmt)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        return struct.unpack_from(self._fmt, self._mm,
+                                  self._offset + i * self._size)[0]
+
+class IdIndex(object):
+    """
+    Map identifiers to ids by the 64 bit hash of the identifier.  The hashes
+    and ids are kept in sorted parallel arrays (16 bytes an entry), the
+    handful of identifiers whose hashes collide are kept in full and
+    matched exactly.  An identifier which isn't in the index but shares a
+    hash with one which is (a 1 in 2^64 chance) would be given its id.
+
+    The file format is a fixed header followed by the two arrays, so it can
+    be memory mapped and shared by every process which reads it.
+    Attributes:
+        keys - sorted 64 bit hashes of the identifiers
+        ids - the id of each hash
+        collisions - { identifier : id } for identifiers whose hashes collide
+
+    Example:
+        index = IdIndex.build(lambda: ((t['ident'], t['id']) for t in titles))
+        index.save('cache/title.ids')
+        index = IdIndex.load('cache/title.ids', mapped=True)
+        print index.get(u'Gran Torino (2008)')
+    """
+
+    _magic = 'FDIDX1\0\0'
+    _header = struct.Struct('<8sQQ')
+
+    def __init__(self, keys=None, ids=None, collisions=None):
+        self.keys = array('L') if keys is None else keys
+        self.ids = array('l') if ids is None else ids
+        self.collisions = collisions or {}
+        self._collided = frozenset(hash64(i) for i in self.collisions)
+        self._mm = None
+        self._last = (None, None)
+
+    @classmethod
+    def build(cls, pairs):
+        """
+        Build an index.
+        Arguments:
+            pairs - a callable which returns an iterable of (identifier, id)
+                tuples, it's called again if any of the hashes collide
+        """
+        entries = array('L')
+        ids = array('l')
+        for ident, id in pairs():
+            entries.append(hash64(ident))
+            ids.append(id)
+        order = sorted(xrange(len(entries)), key=entries.__getitem__)
+        keys = array('L', [ entries[i] for i in order ])
+        ids = array('l', [ ids[i] for i in order ])
+
+        collided = set(keys[i] for i in xrange(1, len(keys)) if
+                       keys[i] == keys[i - 1])
+        collisions = {}
+        if collided:
+            for ident, id in pairs():
+                if hash64(ident) in collided:
+                    collisions[ident] = id
+            log.info('%d identifiers have colliding hashes' % len(collisions))
+        return cls(keys, ids, collisions)
+
+    @classmethod
+    def load(cls, path, mapped=False):
+        """
+        Load an index from a file.
+        Arguments:
+            path - the path to the index file
+            mapped - memory map the arrays instead of reading them in (loads
+                instantly and the pages are shared between processes, but
+                each lookup is a bit slower)
+        """
+        f = open(path, 'rb')
+        try:
+            magic, count, extra = cls._header.unpack(f.read(cls._header.size))
+            if magic != cls._magic:
+                raise ValueError('%s is not an id index' % path)
+            start = cls._header.size
+            f.seek(start + count * 16)
+            collisions = pickle.loads(f.read(extra)) if extra else {}
+            if mapped:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                index = cls(MappedArray(mm, start, count, 'Q'),
+                            MappedArray(mm, start + count * 8, count, 'q'),
+                            collisions)
+                index._mm = mm
+            else:
+                f.seek(start)
+                keys, ids = array('L'), array('l')
+                keys.fromfile(f, count)
+                ids.fromfile(f, count)
+                index = cls(keys, ids, collisions)
+        finally:
+            f.close()
+        return index
+
+    def save(self, path):
+        index_dir = os.path.dirname(path)
+        if index_dir and not os.path.isdir(index_dir):
+            os.makedirs(index_dir)
+        extra = ''
+        if self.collisions:
+            extra = pickle.dumps(self.collisions, pickle.HIGHEST_PROTOCOL)
+        tmp_path = '%s.tmp' % path
+        f = open(tmp_path, 'wb')
+        f.write(self._header.pack(self._magic, len(self.keys), len(extra)))
+        self.keys.tofile(f)
+        self.ids.tofile(f)
+        f.write(extra)
+        f.close()
+        os.rename(tmp_path, path)
+
+    def get(self, ident, default=None):
+        # the last lookup is remembered since callers tend to check for an
+        # identifier and then get its id
+        last = self._last
+        if last[0] == ident:
+            id = last[1]
+        else:
+            id = self._find(ident)
+            self._last = (ident, id)
+        return default if id is None else id
+
+    def _find(self, ident):
+        key = hash64(ident)
+        if key in self._collided:
+            return self.collisions.get(ident)
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.ids[i]
+        return None
+
+    def __getitem__(self, ident):
+        id = self.get(ident)
+        if id is None:
+            raise KeyError(ident)
+        return id
+
+    def __contains__(self, ident):
+        return self.get(ident) is not None
+
+    def __len__(self):
+        return len(self.keys)
@@ -0,0 +1,276 @@
+"""
+Raw line access to big data files through a memory map, so parsers can jump
+over headers with a byte search and only decode the fields they use.  Gzip
+archives are read front to back instead, decompressed on a thread of their
+own while the parser works on the lines.
+"""
+
+import os
+import re
+import sys
+import mmap
+import zlib
+import logging
+import threading
+from Queue import Queue, Full
+from itertools import chain, imap
+from cStringIO import StringIO
+
+log = logging.getLogger(__name__)
+
+class LineReader(object):
+    """
+    The lines of a file as raw byte strings, newlines included (like
+    iterating over the file), read through a memory map.  Offsets are
+    byte offsets into the file.
+    Attributes:
+        path - the path to the file
+        size - the size of the file in bytes
+
+    Example:
+        reader = LineReader('ratings.list')
+        start = reader.line_after('MOVIE RATINGS REPORT')
+        for line in reader.lines(start):
+            ident = line[32:].rstrip().decode('latin_1')
+        reader.close()
+    """
+
+    _strip = '[ \t\r\f\v]*'
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        # an empty file can't be mapped, an empty string acts the same
+        self._mm = ''
+        if self.size:
+            self._mm = mmap.mmap(self._file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self._mm:
+            self._mm.close()
+            self._mm = ''
+        self._file.close()
+
+    def find(self, s, start=0, end=None):
+        """ Get the offset of a byte string or None when it isn't there. """
+        i = self._mm.find(s, start, self.size if end is None else end)
+        return None if i < 0 else i
+
+    def search(self, pattern, start=0, end=None):
+        """ Get the offset of a regex match or None when nothing matched. """
+        match = pattern.search(self._mm, start,
+                               self.size if end is None else end)
+        return match.start() if match else None
+
+    def line_after(self, marker, start=0):
+        """
+        Get the offset of the line following the first line which is the
+        marker (give or take surrounding whitespace), or None when there is
+        no such line.  The marker may also be a compiled regex (with re.M)
+        which matches the whole line.
+        """
+        match = _marker_pattern(marker).search(self._mm, start)
+        if not match:
+            return None
+        return self.next_line(match.end())
+
+    def next_line(self, offset, count=1):
+        """ Get the offset count lines on from the line holding offset. """
+        for _ in xrange(count):
+            i = self._mm.find('\n', offset)
+            if i < 0:
+                return self.size
+            offset = i + 1
+        return offset
+
+    def lines(self, start=0, end=None):
+        """
+        Iterate over the lines from start to end (defaults to the end of the
+        file).  Ranges should start and end on line boundaries.
+        """
+        if end is not None and end >= self.size:
+            end = None
+        if not self._mm or (end is not None and start >= end):
+            return iter(())
+        # lines straight out of the map, readline runs in C and nothing is
+        # copied but the lines themselves
+        mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        mm.seek(start)
+        return _closing_lines(mm, start, end)
+
+class GzipChunks(object):
+    """
+    The decompressed data of a gzip archive in chunks which end on a line
+    boundary.  A thread reads and inflates the archive (zlib lets go of the
+    GIL while it works) and passes the chunks through a bounded queue, so the
+    decompression of a chunk overlaps the parsing of the ones before it
+    while only a few chunks are ever held in memory.  An error in the thread
+    is raised again in the consumer.
+    Attributes:
+        path - the path to the archive
+        read_size - bytes of compressed data to read at a time
+        queue_size - the number of chunks allowed to wait in the queue
+
+    Example:
+        for chunk in GzipChunks('ratings.list.gz'):
+            for line in StringIO(chunk):
+                print line
+    """
+
+    _done = object()
+
+    def __init__(self, path, read_size=256 * 1024, queue_size=8):
+        self.path = path
+        self.read_size = read_size
+        self.queue_size = queue_size
+
+    def __iter__(self):
+        queue = Queue(self.queue_size)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._inflate, args=(queue, stop),
+                                  name='gunzip-%s' %
+                                  os.path.basename(self.path))
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                chunk = queue.get()
+                if chunk is self._done:
+                    break
+                elif isinstance(chunk, tuple):
+                    raise chunk[0], chunk[1], chunk[2]
+                yield chunk
+        finally:
+            stop.set()
+            thread.join()
+
+    def _inflate(self, queue, stop):
+        try:
+            f = open(self.path, 'rb')
+            try:
+                self._read(f, queue, stop)
+            finally:
+                f.close()
+        except Exception:
+            self._put(queue, stop, sys.exc_info())
+        self._put(queue, stop, self._done)
+
+    def _read(self, f, queue, stop):
+        unzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        rest = ''
+        for data in iter(lambda: f.read(self.read_size), ''):
+            while data:
+                chunk = unzip.decompress(data)
+                # data past the end of a member is the next member
+                data = unzip.unused_data
+                if data:
+                    chunk += unzip.flush()
+                    unzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                cut = chunk.rfind('\n') + 1
+                if not cut:
+                    rest += chunk
+                    continue
+                if not self._put(queue, stop, rest + chunk[:cut]):
+                    return
+                rest = chunk[cut:]
+        rest += unzip.flush()
+        if rest:
+            self._put(queue, stop, rest)
+        log.debug('Decompressed %s' % self.path)
+
+    def _put(self, queue, stop, item):
+        # time out now and then to notice the consumer has gone away
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.5)
+                return True
+            except Full:
+                pass
+        return False
+
+def compressed(path):
+    """ Whether a file is a gzip archive, going by its extension. """
+    return path.endswith('.gz')
+
+def gzip_lines(path):
+    """ Iterate over the raw lines of a gzip archive (see GzipChunks). """
+    return chain.from_iterable(imap(StringIO, GzipChunks(path)))
+
+def iter_lines(path, start=0, end=None):
+    """
+    Iterate over the raw lines in a byte range of a file.  A gzip archive
+    can only be read as a whole.
+    """
+    if compressed(path):
+        if start or end is not None:
+            raise ValueError('Unable to read a byte range of %s' % path)
+        return gzip_lines(path)
+    reader = LineReader(path)
+    try:
+        return reader.lines(start, end)
+    finally:
+        reader.close()
+
+def lines_after(path, marker, skip=0, required=True):
+    """
+    Iterate over the raw lines of a file which follow the first line which
+    is the marker (see LineReader.line_after) and skip more lines (e.g. the
+    underline of a heading).  Works on gzip archives as well.
+    Arguments:
+        path - the path to the file
+        marker - the marker line or a compiled regex matching it
+        skip - the number of lines to skip after the marker
+        required - raise a ValueError when the marker isn't there (else
+            there are no lines)
+    """
+    if compressed(path):
+        lines = gzip_lines(path)
+        search = _marker_pattern(marker).match
+        # the marker is searched for up front, it heads the file
+        for line in lines:
+            if search(line):
+                break
+        else:
+            lines = None
+        if lines is not None:
+            for _ in xrange(skip):
+                next(lines, None)
+    else:
+        reader = LineReader(path)
+        try:
+            start = reader.line_after(marker)
+            lines = None if start is None else \
+                reader.lines(reader.next_line(start, skip))
+        finally:
+            reader.close()
+    if lines is None:
+        if required:
+            raise ValueError('No "%s" in %s' %
+                             (getattr(marker, 'pattern', marker), path))
+        return iter(())
+    return lines
+
+def _marker_pattern(marker):
+    if not isinstance(marker, basestring):
+        return marker
+    strip = LineReader._strip
+    return re.compile('^%s%s%s$' % (strip, re.escape(marker), strip), re.M)
+
+def _closing_lines(mm, start=0, end=None):
+    try:
+        if end is None:
+            for line in iter(mm.readline, ''):
+                yield line
+            return
+        offset = start
+        for line in iter(mm.readline, ''):
+            offset += len(line)
+            if offset >= end:
+                # a range which doesn't end on a line boundary cuts the line
+                yield line[:len(line) - (offset - end)]
+                break
+            yield line
+    finally:
+        mm.close()
@@ -0,0 +1,108 @@
+"""
+A persistent record of the keys a scrape failed to resolve, so the next
+scrape doesn't ask for the same hopeless ones again.
+"""
+
+import os
+import json
+import time
+import logging
+
+log = logging.getLogger(__name__)
+
+class MissCache(object):
+    """
+    Failed lookups by key, with the reason, the number of attempts and
+    when it was last tried.  A key is skipped until retry_after seconds
+    times the number of attempts have passed since it was last tried.
+    The cache is an append only file of json lines (the last line for a
+    key wins), which is compacted when it's loaded.
+    Attributes:
+        path - the file the misses are stored in
+        retry_after - seconds to wait before trying a key again
+        misses - { key : { 'reason', 'attempts', 'last' } }
+
+    Example:
+        misses = MissCache('cache/person.misses', retry_after=86400 * 30)
+        urls = ( u for u in urls if not misses.skip(u[0]) )
+        ...
+        misses.miss(ident, 'no match')
+    """
+
+    def __init__(self, path, retry_after=86400 * 30):
+        self.path = path
+        self.retry_after = retry_after
+        self.misses = {}
+        self._file = None
+        if os.path.exists(path):
+            self._load()
+
+    def skip(self, key, now=None):
+        """ Check whether a key failed recently enough to skip it. """
+        miss = self.misses.get(key)
+        if miss is None:
+            return False
+        now = time.time() if now is None else now
+        return now - miss['last'] < self.retry_after * miss['attempts']
+
+    def miss(self, key, reason):
+        """ Record a failed lookup of a key. """
+        miss = self.misses.get(key)
+        attempts = miss['attempts'] + 1 if miss else 1
+        miss = { 'reason' : reason, 'attempts' : attempts,
+                 'last' : int(time.time()) }
+        self.misses[key] = miss
+        self._append(key, miss)
+
+    def hit(self, key):
+        """ Forget a key once it has been resolved. """
+        if key in self.misses:
+            del self.misses[key]
+            self._append(key, None)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return len(self.misses)
+
+    def _append(self, key, miss):
+        if self._file is None:
+            miss_dir = os.path.dirname(self.path)
+            if miss_dir and not os.path.isdir(miss_dir):
+                os.makedirs(miss_dir)
+            self._file = open(self.path, 'a')
+        self._file.write(json.dumps((key, miss)) + '\n')
+        self._file.flush()
+
+    def _load(self):
+        lines = 0
+        broken = False
+        f = open(self.path)
+        for line in f:
+            try:
+                key, miss = json.loads(line)
+            except ValueError:
+                # a line cut short by a crash, rewrite the file so the
+                # next line isn't appended to it
+                broken = True
+                continue
+            lines += 1
+            if miss is None:
+                self.misses.pop(key, None)
+            else:
+                self.misses[key] = miss
+        f.close()
+        log.info('Loaded %d misses from %s' % (len(self.misses), self.path))
+        if broken or lines > 2 * len(self.misses) + 1000:
+            self._compact()
+
+    def _compact(self):
+        tmp_path = '%s.tmp' % self.path
+        f = open(tmp_path, 'w')
+        for key, miss in self.misses.iteritems():
+            f.write(json.dumps((key, miss)) + '\n')
+        f.close()
+        os.rename(tmp_path, self.path)
@@ -0,0 +1,129 @@
+"""
+Compact record types for the data the sources produce.  They behave like
+dicts but keep their values in slots, which saves the per record hash table
+when millions of them are in flight.
+"""
+
+import copy_reg
+
+class Record(object):
+    """
+    Base class for a record with a fixed set of fields.  It supports the
+    dict methods the producers and sinks use, a field which was never set
+    (or was deleted) is missing just like a missing dict key.
+    Subclasses list their fields in __slots__.
+
+    Example:
+        class Role(Record):
+            __slots__ = ('title_id', 'billing')
+        role = Role(title_id=1, billing=None)
+        role['billing'] = 3
+        print role.to_dict()
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for k, v in fields.iteritems():
+            setattr(self, k, v)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, key, value)
+        except (AttributeError, TypeError):
+            raise KeyError('%s has no field %s' % (self.__class__.__name__,
+                                                   key))
+
+    def __delitem__(self, key):
+        try:
+            delattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return isinstance(key, basestring) and hasattr(self, key)
+
+    def __iter__(self):
+        return self.iterkeys()
+
+    def __len__(self):
+        return sum(1 for _ in self.iterkeys())
+
+    def __nonzero__(self):
+        # the parsers test records for truth a lot, stop at the first field
+        for k in self.__slots__:
+            if hasattr(self, k):
+                return True
+        return False
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.to_dict())
+
+    def __reduce_ex__(self, protocol):
+        # a (None, fields) state lets cPickle set the slots itself on load
+        fields = dict([ (k, getattr(self, k)) for
+                        k in self.__slots__ if hasattr(self, k) ])
+        return copy_reg.__newobj__, (self.__class__,), (None, fields)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        delattr(self, key)
+        return value
+
+    def update(self, *args, **kwargs):
+        for other in args + (kwargs,):
+            items = other.iteritems() if hasattr(other, 'iteritems') else other
+            for k, v in items:
+                self[k] = v
+
+    def iterkeys(self):
+        return ( k for k in self.__slots__ if hasattr(self, k) )
+
+    def iteritems(self):
+        return ( (k, getattr(self, k)) for k in self.__slots__ if
+                 hasattr(self, k) )
+
+    def itervalues(self):
+        return ( v for _, v in self.iteritems() )
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def copy(self):
+        record = self.__class__.__new__(self.__class__)
+        for k, v in self.iteritems():
+            setattr(record, k, v)
+        return record
+
+    def to_dict(self):
+        """ The record as a plain dict (nested records aren't converted). """
+        return dict(self.iteritems())
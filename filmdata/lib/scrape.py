@@ -22,10 +22,11 @@ class Scrape(object):
 
     def __init__(self, urls, fetch_callback, scrape_callback=None,
                  follow_redirects=True, anon=False, max_clients=10,
-                 max_retries=10, delay=0, timeout=3.0):
+                 max_retries=10, delay=0, timeout=3.0, batch_callback=None):
         self._urls = urls
         self._fetch_callback = self._wrap_callback(fetch_callback)
         self._scrape_callback = scrape_callback
+        self._batch_callback = batch_callback
         self._follow_redirects = follow_redirects
         self._max_redirects = 5
         self._max_retries = max_retries
@@ -55,6 +56,8 @@ class Scrape(object):
 
             start_time = time.time()
             self._fetch_urls(url_set)
+            if self._batch_callback:
+                self._batch_callback()
             end_time = time.time()
             elapsed_time = end_time - start_time
 
@@ -0,0 +1,104 @@
+"""
+Helpers for splitting big line oriented data files into byte ranges which
+can be parsed independently of each other (e.g. in a process pool).
+"""
+
+import os
+import mmap
+
+def block_ranges(path, start, end=None, size=16 * 1024 * 1024, sep='\n\n'):
+    """
+    Split a region of a file into byte ranges which all end on a block
+    separator (a blank line by default), so no record straddles two ranges.
+    Arguments:
+        path - the path to the file
+        start - the offset of the first byte of the region
+        end - the offset just past the last byte of the region (defaults to
+            the end of the file)
+        size - the approximate size of each range in bytes
+        sep - the block separator, the ranges are cut right after it
+    Returns a list of (start, end) tuples covering the whole region.
+    """
+    if end is None:
+        end = os.path.getsize(path)
+    if end <= start:
+        return []
+
+    ranges = []
+    f = open(path, 'rb')
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        range_start = start
+        while range_start < end:
+            cut = mm.find(sep, min(range_start + size, end), end)
+            range_end = end if cut < 0 else cut + len(sep)
+            ranges.append((range_start, range_end))
+            range_start = range_end
+    finally:
+        mm.close()
+        f.close()
+    return ranges
+
+def block_chunks(lines, size=16 * 1024 * 1024):
+    """
+    Group a stream of lines into chunks which all end on a blank line, the
+    counterpart of block_ranges for data which can only be read front to
+    back (e.g. a gzip archive).
+    Arguments:
+        lines - an iterator of raw lines (newlines included)
+        size - the approximate size of each chunk in bytes
+    Returns an iterator of the chunks as byte strings.
+    """
+    chunk, length = [], 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size and line == '\n':
+            yield ''.join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield ''.join(chunk)
+
+def find_offset(path, pattern, start=0):
+    """
+    Find the offset of the first match of a compiled regex in a file without
+    reading it all into memory.
+    Arguments:
+        path - the path to the file
+        pattern - a compiled (byte string) regular expression
+        start - the offset from which to start searching
+    Returns the offset of the start of the match or None if nothing matched.
+    """
+    f = open(path, 'rb')
+    if os.fstat(f.fileno()).st_size == 0:
+        f.close()
+        return None
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        match = pattern.search(mm, start)
+        return match.start() if match else None
+    finally:
+        mm.close()
+        f.close()
+
+def read_lines(path, start, end):
+    """
+    Read the lines in a byte range of a file.
+    Arguments:
+        path - the path to the file
+        start - the offset of the first byte
+        end - the offset just past the last byte
+    Returns a list of the raw lines (newlines included, like file iteration).
+    """
+    f = open(path, 'rb')
+    try:
+        f.seek(start)
+        data = f.read(end - start)
+    finally:
+        f.close()
+    lines = data.split('\n')
+    tail = lines.pop()
+    lines = [ l + '\n' for l in lines ]
+    if tail:
+        lines.append(tail)
+    return lines
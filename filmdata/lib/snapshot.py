@@ -0,0 +1,150 @@
+"""
+Binary snapshots of the records parsed from a source data file, so a file
+which hasn't changed since the last run doesn't need to be parsed again.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import cPickle as pickle
+
+from filmdata.lib.util import take
+
+log = logging.getLogger(__name__)
+
+def file_digest(path, block_size=1024 * 1024):
+    """ md5 hex digest of the contents of a file """
+    md5 = hashlib.md5()
+    f = open(path, 'rb')
+    try:
+        for block in iter(lambda: f.read(block_size), ''):
+            md5.update(block)
+    finally:
+        f.close()
+    return md5.hexdigest()
+
+class Snapshot(object):
+    """
+    A snapshot of the records a parser produced from a source file.  The
+    snapshot is keyed by the size, mtime and content hash of the source
+    file (plus a version for the parser), the records themselves are stored
+    as a stream of pickled batches.
+    Attributes:
+        path - where the snapshot is stored (a .key sidecar file holds the
+            key of the source file the snapshot was built from)
+        source_path - the path to the source file
+        version - bump this when the parser output changes
+        batch_size - the number of records pickled together
+
+    Example:
+        snap = Snapshot('cache/ratings', 'ratings.list', version=2)
+        for record in snap(lambda: parse_ratings('ratings.list')):
+            print record
+    """
+
+    def __init__(self, path, source_path, version=0, batch_size=1000):
+        self.path = path
+        self.source_path = source_path
+        self.version = version
+        self.batch_size = batch_size
+        self._key_path = '%s.key' % path
+
+    def __call__(self, build):
+        """
+        Get the records from the snapshot when it's fresh, otherwise build
+        them and save a new snapshot along the way.
+        Arguments:
+            build - a callable which returns an iterable of the records
+        Returns an iterator of the records.
+        """
+        if self.is_fresh():
+            log.info('Loading records from snapshot %s' % self.path)
+            return self.load()
+        log.info('Snapshot %s is stale, parsing %s' % (self.path,
+                                                       self.source_path))
+        return self.save(build())
+
+    def is_fresh(self):
+        """
+        Check the stored key against the source file.  The content hash is
+        only computed when the size matches but the mtime doesn't (e.g. the
+        same file was downloaded again).
+        """
+        if not os.path.exists(self.path) or not os.path.exists(self._key_path):
+            return False
+        try:
+            key = json.load(open(self._key_path))
+        except ValueError:
+            return False
+        stat = os.stat(self.source_path)
+        if key.get('version') != self.version or key.get('size') != stat.st_size:
+            return False
+        if key.get('mtime') == stat.st_mtime:
+            return True
+        if key.get('digest') != file_digest(self.source_path):
+            return False
+        key['mtime'] = stat.st_mtime
+        self._write_key(key)
+        return True
+
+    def load(self):
+        """ Iterate over the records stored in the snapshot. """
+        f = open(self.path, 'rb')
+        try:
+            while True:
+                try:
+                    batch = pickle.load(f)
+                except EOFError:
+                    break
+                for record in batch:
+                    yield record
+        finally:
+            f.close()
+
+    def save(self, records):
+        """
+        Pass the records through while writing them to a new snapshot.  Each
+        batch is written before its records are passed on, so consumers are
+        free to modify them.  The snapshot only replaces the old one once all
+        of the records have been consumed.
+        Arguments:
+            records - an iterable of picklable records
+        Returns an iterator of the same records.
+        """
+        snap_dir = os.path.dirname(self.path)
+        if snap_dir and not os.path.isdir(snap_dir):
+            os.makedirs(snap_dir)
+        stat = os.stat(self.source_path)
+        tmp_path = '%s.tmp' % self.path
+        f = open(tmp_path, 'wb')
+        records = iter(records)
+        done = False
+        try:
+            while True:
+                batch = take(self.batch_size, records)
+                if not batch:
+                    break
+                pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+                for record in batch:
+                    yield record
+            done = True
+        finally:
+            f.close()
+            if not done:
+                os.remove(tmp_path)
+
+        if os.path.exists(self._key_path):
+            os.remove(self._key_path)
+        os.rename(tmp_path, self.path)
+        self._write_key({
+            'version' : self.version,
+            'size' : stat.st_size,
+            'mtime' : stat.st_mtime,
+            'digest' : file_digest(self.source_path),
+        })
+
+    def _write_key(self, key):
+        f = open(self._key_path, 'w')
+        json.dump(key, f)
+        f.close()
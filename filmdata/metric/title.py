@@ -1,6 +1,8 @@
 import logging
 
+from filmdata import config
 from filmdata.lib.data import Data
+from filmdata.lib.histogram import spread
 from filmdata.metric import Metric
 
 log = logging.getLogger(__name__)
@@ -16,6 +18,9 @@ schema = {
 
 class TitleMetric(Metric):
 
+    _percentiles = (25, 50, 75)
+    _spread_fields = ('variance',) + tuple([ 'p%d' % p for p in _percentiles ])
+
     def __init__(self):
         Metric.__init__(self)
         self._titles = None
@@ -48,8 +53,27 @@ class TitleMetric(Metric):
                                          self._min_votes[name]))
             data.add_bayes(self._mean_field, self._count_field,
                            self._min_votes[name], report_mean)
+        self._add_spread([ d for d in data.rows if d.get('distribution') ])
         return dict([ (d['id'], d) for d in data ])
 
+    def _add_spread(self, rows):
+        """
+        Add the variance and quartiles of the votes to the rows from their
+        vote histograms, all of the titles are done in one numpy pass.
+        """
+        if not rows:
+            return
+        buckets = len(rows[0]['distribution'])
+        step = float(config.core.max_rating) / buckets
+        stats = spread([ r['distribution'] for r in rows ],
+                       values=[ (i + 1) * step for i in xrange(buckets) ],
+                       percentiles=self._percentiles)
+        for i, row in enumerate(rows):
+            for field in self._spread_fields:
+                value = stats[field][i]
+                if value == value:  # not nan
+                    row[field] = float(value)
+
     def _get_average_index(self, indexes):
         averages = {}
         for id in self._titles.keys():
@@ -79,6 +103,9 @@ class TitleMetric(Metric):
                     row = {}
                     if metrics.get('bayes'):
                         row['bayes'] = metrics['bayes']
+                    for field in self._spread_fields:
+                        if field in metrics:
+                            row[field] = metrics[field]
                 if row:
                     if not id in rows:
                         rows[id] = {}
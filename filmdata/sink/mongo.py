@@ -6,13 +6,16 @@ from itertools import islice, imap
 from functools import partial
 from decimal import Decimal
 from operator import itemgetter
+from array import array
 
 import pymongo as pmongo
+from bson.binary import Binary
 import asyncmongo as amongo
 import tornado.ioloop
 
 from filmdata import config
 from filmdata.match import fuzz, match_iter
+from filmdata.lib.record import Record
 
 log = logging.getLogger(__name__)
 
@@ -138,6 +141,19 @@ class MongoSink:
             collection = '_'.join((collection, suffix))
         return imap(self._clean, self.m[collection].find())
     
+    def get_source_data_version(self, source, suffix=None):
+        """
+        Get the (count, last modified) of the source data, which changes
+        whenever any of it is stored or removed.
+        """
+        collection = '%s_data' % source
+        if suffix:
+            collection = '_'.join((collection, suffix))
+        last = self.m[collection].find_one(
+            sort=[('modified', pmongo.DESCENDING)], fields={ 'modified' : 1 })
+        return (self.m[collection].count(),
+                last.get('modified') if last else None)
+
     def remove_source_data(self, source, suffix=None):
         collection = '%s_data' % source
         if suffix:
@@ -319,7 +335,21 @@ class MongoSink:
         collection = '%s_title' % source_name
         for title_in in imap(self._jsonify, producer):
             title_new = dict([ (k, v) for k, v in title_in.items() if
-                           k not in ('id', 'noinsert') ])
+                           k not in ('id', 'noinsert', 'diff') ])
+            diff = title_in.get('diff')
+            if diff == 'delete':
+                self.m[collection].remove({ '_id' : title_in['id'] })
+                continue
+            elif diff:
+                # diffed titles skip the lookup, the producer already knows
+                # whether they're new or changed
+                status = 'new' if diff == 'insert' else 'updated'
+                title_new['_admin'] = { 'status' : status }
+                self.m[collection].update(
+                    { '_id' : title_in['id'] },
+                    { '$set' : title_new },
+                    upsert=True, multi=False)
+                continue
             title_old = self.m[collection].find_one(
                 { '_id' : title_in['id'] })
             if not title_old:
@@ -369,7 +399,21 @@ class MongoSink:
                 log.debug('No ID for person: %s' + str(person_in))
                 continue
             person = dict([ (k, v) for k, v in person_in.items() if
-                            not k == 'noinsert' ])
+                            k not in ('noinsert', 'diff') ])
+            diff = person_in.get('diff')
+            if diff == 'delete':
+                self.m[collection].remove({ '_id' : person['_id'] })
+                continue
+            elif diff:
+                # diffed persons skip the lookup, the producer already knows
+                # whether they're new or changed
+                status = 'new' if diff == 'insert' else 'updated'
+                person['_admin'] = { 'status' : status }
+                self.m[collection].update(
+                    { '_id' : person['_id'] },
+                    { '$set' : person },
+                    upsert=not person_in.get('noinsert'), multi=False)
+                continue
             has_person = self.m[collection].find_one(
                 { '_id' : person['_id'] })
             if not has_person and not person_in.get('noinsert'):
@@ -483,6 +527,8 @@ class MongoSink:
         return dot_match
 
     def _jsonify(self, doc):
+        if isinstance(doc, Record):
+            doc = doc.to_dict()
         if isinstance(doc, dict):
             for k in doc.keys():
                 if isinstance(k, int):
@@ -498,6 +544,9 @@ class MongoSink:
                 doc[i] = self._jsonify(doc[i])
         elif isinstance(doc, Decimal):
             doc = float(doc)
+        elif isinstance(doc, array):
+            # e.g. vote histograms, kept as raw bytes rather than a list
+            doc = Binary(doc.tostring())
         return doc
 
     def __get_title_id(self, title):
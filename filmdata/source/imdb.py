@@ -1,26 +1,41 @@
 import logging
 import re
 import os
+import json
 import decimal
 import hashlib
+import string
+import time
+import threading
+from array import array
+from cStringIO import StringIO
 from HTMLParser import HTMLParser
 from operator import itemgetter
 from urllib import quote_plus
 from functools import partial
-from itertools import imap, ifilter
+from itertools import imap, ifilter, groupby, chain
+from multiprocessing import Pool
 
-from filmdata.lib.util import dson, rname, clean_name
+from filmdata.lib.util import rname, clean_name
 from filmdata.lib.util import class_property, extract_name_suffix
 from filmdata import config
 from filmdata.lib.util import base_encode
-from filmdata.lib.scrape import Scrape
+from filmdata.lib.shard import block_ranges, block_chunks
+from filmdata.lib.lines import LineReader, iter_lines, lines_after, compressed
+from filmdata.lib.snapshot import Snapshot
+from filmdata.lib.extsort import external_sort, merge_join
+from filmdata.lib.digest import DigestTable
+from filmdata.lib.download import Download
+from filmdata.lib.idindex import IdIndex
+from filmdata.lib.catalog import TitleCatalog
+from filmdata.lib.frontier import Frontier
+from filmdata.lib.misses import MissCache
+from filmdata.lib.background import Background
+from filmdata.lib.record import Record
 import filmdata.sink
 
 log = logging.getLogger(__name__)
 
-class UnzipError(Exception): pass
-class DownloadError(Exception): pass
-
 schema = {
     'title_id' : 'id',
     'key' : 'varchar(32)',
@@ -28,6 +43,167 @@ schema = {
     'votes' : 'integer',
 }
 
+# Fast paths for the imdb ident grammar, they give the same groups as the
+# matching Produce._re_* regexes (or None when the regex wouldn't match).
+# The role splitters are hand rolled and only fall back to the regex for the
+# rare odd ident.  Title idents are cheap for the regex engine already, so
+# they just get a tighter pattern (no trailing .*$ to scan and no VG branch,
+# 'V' always wins that alternation anyway).
+
+_ws = ' \t\n\r\f\v'
+_digits = '0123456789'
+_re_title_ident = re.compile(r'(.+?)\s+\(([0-9]{4}|\?{4})[^)\n]*\)\s?\(?(V|TV)?')
+_writer_kinds = (u'screenplay', u'written', u'original screenplay',
+                 u'original story', u'story')
+_re_digits = re.compile('[0-9]+')
+
+def _split_character_role(ident):
+    """ same groups as Produce._re_character_role.match(ident) """
+    first = len(ident)
+    for marker in ('  (as ', '[', '<'):
+        i = ident.find(marker)
+        if i >= 0 and i < first:
+            first = i
+    if first == len(ident):
+        if ident and ident[-1] not in _ws:
+            return ident, None, None
+        return _match_groups(Produce._re_character_role, ident)
+
+    if ident.startswith('  (as ', first):
+        title_end = first
+    else:
+        title_end = len(ident[:first].rstrip(_ws))
+    if not title_end or ident[title_end - 1] in _ws:
+        return _match_groups(Produce._re_character_role, ident)
+
+    i = title_end
+    if ident.startswith('  (as ', i):
+        close = ident.find(')', i + 7)
+        if close < 0:
+            return _match_groups(Produce._re_character_role, ident)
+        i = close + 1
+    if ident.startswith('  ', i):
+        i += 2
+    character = None
+    if ident[i:i + 1] == '[':
+        close = ident.rfind(']')
+        if close <= i + 1:
+            return _match_groups(Produce._re_character_role, ident)
+        character = ident[i:close + 1]
+        i = close + 1
+    while ident[i:i + 1] and ident[i] in _ws:
+        i += 1
+    billing = None
+    if i < len(ident):
+        billing = ident[i:]
+        if (billing[0] != '<' or billing[-1] != '>' or len(billing) < 3 or
+            billing[1:-1].strip(_digits)):
+            return _match_groups(Produce._re_character_role, ident)
+    return ident[:title_end], character, billing
+
+def _split_writer_role(ident):
+    """ same groups as Produce._re_writer_role.match(ident) """
+    close = ident.rfind(')')
+    if close < 0:
+        return None
+    tail = ident[close + 1:].lstrip(_ws)
+    if tail and (tail[0] != '<' or tail[-1] != '>' or len(tail) < 3 or
+                 tail[1:-1].strip(_digits + ',')):
+        return None
+    start = ident.find('  (', 1)
+    while 0 < start < close:
+        for kind in _writer_kinds:
+            if (ident.startswith(kind, start + 3) and
+                start + 3 + len(kind) <= close):
+                return ident[:start], kind, tail or None
+        start = ident.find('  (', start + 1)
+    return None
+
+def _split_producer_role(ident):
+    """ (title ident, kind) of e.g. 'Bird (1988)  (executive producer)' """
+    start = ident.find('  (')
+    if start < 1:
+        return None
+    close = ident.find(')', start)
+    if close < 0:
+        return None
+    return ident[:start], ident[start + 3:close]
+
+def _match_groups(regex, s):
+    match = regex.match(s)
+    return match.groups() if match else None
+
+class Title(Record):
+    __slots__ = ('id', 'ident', 'type', 'name', 'year', 'href', 'rating',
+                 'runtime', 'genre', 'mpaa', 'aka', 'cast', 'director',
+                 'writer', 'country', 'language', 'certificate')
+
+    def __init__(self, ident=None, type=None, **fields):
+        # titles are parsed by the million, keep the common case cheap
+        if ident is not None:
+            self.ident = ident
+        if type is not None:
+            self.type = type
+        if fields:
+            Record.__init__(self, **fields)
+
+class Person(Record):
+    __slots__ = ('id', 'name', 'href', 'roles', 'diff')
+
+class Role(Record):
+    __slots__ = ('title_ident', 'title_id', 'person_id', 'name', 'role',
+                 'character', 'billing')
+
+    def __init__(self, title_ident=None, billing=None):
+        self.title_ident = title_ident
+        self.billing = billing
+
+class ListFormat(object):
+    """
+    How to read one of the imdb lists of title/value lines, like genres.list
+    or countries.list.  Every line holds a title ident, a value and maybe a
+    (note), separated by tabs, and the lines of a title follow each other:
+
+        Gran Torino (2008)                                      Crime
+        Gran Torino (2008)                                      Drama
+
+    Attributes:
+        field - the title field the values go in
+        marker - the heading line the title lines follow
+        skip - lines to skip after the marker (e.g. its underline)
+        convert - called with the raw value and note (None when there's no
+            note) of each line, returns what to store or None to drop the
+            line (None stores the decoded value)
+        multi - gather the values of a title into a list, else each line is
+            a title of its own
+
+    Example:
+        ListFormat('country', 'COUNTRIES LIST', skip=1)
+    """
+
+    def __init__(self, field, marker, skip=0, convert=None, multi=True):
+        self.field = field
+        self.marker = marker
+        self.skip = skip
+        self.convert = convert
+        self.multi = multi
+
+def _runtime_minutes(value, note):
+    """ 'USA:142' or '142' to 142 """
+    match = _re_digits.search(value)
+    return int(match.group()) if match else None
+
+def _certificate(value, note):
+    """ 'USA:PG-13' to { 'country' : u'USA', 'rating' : u'PG-13' } """
+    country, _, rating = value.decode('latin_1').partition(':')
+    if not rating:
+        return None
+    return {
+        'country' : country,
+        'rating' : rating,
+        'note' : note.decode('latin_1') if note else None,
+    }
+
 class ImdbMixin:
 
     name = 'imdb'
@@ -40,11 +216,65 @@ class ImdbMixin:
     }
     _billing_groups = frozenset(('writer', 'cast'))
     _title_types = frozenset(config.core.active_title_types.split())
+    # title/value lists which are only fetched and parsed with a path set
+    _optional_lists = ('country', 'language', 'certificate')
+    _cache_path = config.imdb.cache_path
+    # the id indexes may load on background threads, one at a time
+    _sink_lock = threading.Lock()
 
     @classmethod
     def _get_known_ids(cls, type='title'):
-        return dict([ (x['ident'], x['id']) for x in
-                      filmdata.sink.get_source_data('imdb', type) ])
+        return IdIndex.build(lambda: ((x['ident'], x['id']) for x in
+                             filmdata.sink.get_source_data('imdb', type)))
+
+    @classmethod
+    def _id_index_path(cls, type='title'):
+        if cls._cache_path:
+            return os.path.join(cls._cache_path, '%s.ids' % type)
+        return None
+
+    @classmethod
+    def _load_known_ids(cls, type='title'):
+        """
+        Get the index of known ids, from its file in the cache while the ids
+        in the sink haven't changed since it was written, otherwise it's
+        built from the sink (and written to the cache).
+        """
+        path = cls._id_index_path(type)
+        with cls._sink_lock:
+            if path:
+                key = cls._known_ids_key(type)
+                try:
+                    fresh = json.load(open('%s.key' % path)) == key
+                except (IOError, ValueError):
+                    fresh = False
+                if fresh and os.path.exists(path):
+                    return IdIndex.load(path)
+            index = cls._get_known_ids(type)
+            if path:
+                cls._save_known_ids(index, type, key)
+        return index
+
+    @classmethod
+    def _known_ids_key(cls, type='title'):
+        """ what the ids in the sink looked like, to key the index on """
+        count, modified = filmdata.sink.get_source_data_version('imdb', type)
+        return [ count, modified and modified.isoformat() ]
+
+    @classmethod
+    def _save_known_ids(cls, index, type='title', key=None):
+        """
+        Write an index of known ids to the cache, the key should be taken
+        before the index was built from the sink.
+        """
+        path = cls._id_index_path(type)
+        key_path = '%s.key' % path
+        if os.path.exists(key_path):
+            os.remove(key_path)
+        index.save(path)
+        f = open(key_path, 'w')
+        json.dump(key, f)
+        f.close()
 
 class Fetch(ImdbMixin):
 
@@ -54,8 +284,12 @@ class Fetch(ImdbMixin):
                                    '<a href="/title/tt([0-9]+)/"')
     #_popular_id_string = '^\s*<p><b>Popular Names</b>.*?<br><a href="/name/nm([0-9]+)/" onclick="[^"]">%s</a>\s*<small>'
     #_partial_id_string = '<a href="/name/nm([0-9]+)/" onclick="[^"]+">%s</a>\s*(:?%s)?\s*<small>'
-    _person_id_string = '<a href="/name/nm([0-9]+)/" onclick="[^"]+">%s</a>\s*%s<small>'
+    _re_person_candidate = re.compile('<a href="/name/nm([0-9]+)/" '
+                                      'onclick="[^"\n]+">([^<\n]*)</a>'
+                                      '[^\S\n]*(\([IVXLC]+\))?[^\S\n]*<small>')
     _re_uri_id = re.compile('^http://www.imdb.com/(title|name)/(nm|tt)([0-9]+)/?')
+    _retry_after = float(config.imdb.retry_after or 30) * 86400
+    _misses = None
 
     @classmethod
     def fetch_data(cls):
@@ -64,6 +298,9 @@ class Fetch(ImdbMixin):
         cls._fetch('runtime')
         cls._fetch('genre')
         cls._fetch('mpaa')
+        for name in cls._optional_lists:
+            if config.imdb.get('%s_path' % name):
+                cls._fetch(name)
         for role in cls._role_types:
             cls._fetch(role)
         for thing_type in ('title', 'person'):
@@ -71,21 +308,60 @@ class Fetch(ImdbMixin):
 
     @classmethod
     def fetch_ids(cls, title_types, type='title'):
+        # imported here since the scraper monkey patches the stdlib for
+        # gevent, which doesn't play well with the producers' process pools
+        from filmdata.lib.scrape import Scrape
         cls._type = type
+        cls._misses = cls._get_misses(type)
         if type == 'title':
             url_source = cls._get_title_urls
         else:
             url_source = cls._get_person_urls
         #url_source = lambda t: iter([('Prowse, David', Produce._person_href(None, ident='Prowse, David'))])
-        scraper = Scrape(url_source(title_types), cls._fetch_id_response,
+        frontier = cls._get_frontier(type)
+        if frontier is None:
+            urls, batch_callback = url_source(title_types), None
+        else:
+            if not frontier.pending():
+                frontier.build(url_source(title_types))
+            urls = imap(lambda (i, u): (i, str(u)), frontier)
+            batch_callback = frontier.commit
+        scraper = Scrape(urls, cls._fetch_id_response,
                          follow_redirects=False, max_clients=8,
-                         delay=1, anon=True)
+                         delay=1, anon=True, batch_callback=batch_callback)
         scraper.run()
-        #cls._scrape_response(type=type)
+        if frontier is not None:
+            frontier.clear()
+        if cls._misses is not None:
+            cls._misses.close()
+        cls._scrape_response(type=type)
+
+    @classmethod
+    def _get_frontier(cls, type='title'):
+        """
+        Get the frontier of idents still to fetch for a type of thing.  It
+        survives a crash, so the next fetch_ids picks up where this one
+        stopped rather than working out the pending idents again.
+        """
+        if not cls._cache_path:
+            return None
+        return Frontier(os.path.join(cls._cache_path, '%s.frontier' % type))
+
+    @classmethod
+    def _get_misses(cls, type='title'):
+        """
+        Get the cache of idents which couldn't be resolved to an id, they're
+        left out of the scrape until retry_after days have passed.
+        """
+        if not cls._cache_path:
+            return None
+        return MissCache(os.path.join(cls._cache_path, '%s.misses' % type),
+                         retry_after=cls._retry_after)
     
     @classmethod
     def _fetch_id_response(cls, resp, resp_url=None):
         id = None
+        reason = None
         ident = resp_url[0]
         if resp_url[1] != resp.effective_url:
             log.warning('Fetched url and effective url do not match')
@@ -101,51 +377,88 @@ class Fetch(ImdbMixin):
                           (cls._type, ident, str(id)))
             else:
                 log.debug('redirect with no uri id match: %s' % uri)
+                reason = 'redirect'
         elif resp.status >= 400:
-            log.error("Scraper error:" % str(resp))
+            # a failed request says nothing about the ident, it's tried
+            # again on the next run rather than recorded as a miss
+            log.error("Scraper error: %s" % str(resp.status))
+            return None
         elif cls._type == 'person':
-            id = cls._extract_id_from_html(resp.buffer.split("\n"), ident)
+            id = cls._extract_id_from_html(resp.buffer, ident)
             if id:
                 log.debug('html matched %s %s to %s' %
                           (cls._type, ident, str(id)))
             else:
                 log.debug('no match for %s %s' % (cls._type, ident))
+                reason = 'no match'
+        else:
+            reason = 'no redirect'
         if id:
             id_data = { 'ident' : ident }
             filmdata.sink.store_source_data('imdb', data=id_data,
                                             id=id, suffix=cls._type)
+            if cls._misses is not None:
+                cls._misses.hit(ident)
+        elif cls._misses is not None:
+            cls._misses.miss(ident, reason)
     
     @classmethod
-    def _extract_id_from_html(cls, lines, ident):
-        h = HTMLParser()
-        suffix = extract_name_suffix(ident)
-        if suffix:
-            suffix = suffix.replace('(', '\(', 1).replace(')', '\)', 1)
-            suffix = '(:?%s)?\s*' % suffix
-        person_id_string = cls._person_id_string % (rname(clean_name(ident)),
-                                                    suffix) 
-        re_person_id = re.compile(person_id_string, re.I)
-        for line in imap(h.unescape, lines):
-            id_match = re_person_id.search(line)
-            if id_match:
-                return int(id_match.group(1))
+    def _extract_id_from_html(cls, html, ident):
+        """
+        Find the id of a person on an imdb name search page.  The first
+        result whose name matches the ident wins, when the ident has a
+        suffix (e.g. "Smith, John (IV)") the result needs the same suffix
+        or none at all.
+        """
+        name = rname(clean_name(ident)).lower()
+        suffix = extract_name_suffix(ident).upper()
+        for id, candidate, candidate_suffix in cls._person_candidates(html):
+            if (candidate.lower() == name and
+                (candidate_suffix is None or candidate_suffix == suffix)):
+                return id
         return None
 
+    @classmethod
+    def _person_candidates(cls, html):
+        """
+        Parse the results on a name search page in one pass.
+        Returns an iterator of (id, name, suffix) tuples in page order,
+        suffix is None for the results without one.
+        """
+        h = None
+        for match in cls._re_person_candidate.finditer(html):
+            id, name, suffix = match.groups()
+            if isinstance(name, str):
+                try:
+                    name = name.decode('utf-8')
+                except UnicodeDecodeError:
+                    name = name.decode('latin_1')
+            if '&' in name:
+                h = h or HTMLParser()
+                name = h.unescape(name)
+            yield int(id), name.strip(), suffix.upper() if suffix else None
+
     @classmethod
     def _scrape_response(cls, type='title'):
-        log.info('Done scraping! Dumping now...')
-        dson.dump(cls._get_known_ids(type), config.imdb['%s_ids_path' % type])
+        path = cls._id_index_path(type)
+        if path:
+            log.info('Done scraping! Writing the id index to %s' % path)
+            key = cls._known_ids_key(type)
+            cls._save_known_ids(cls._get_known_ids(type), type, key)
 
     @classmethod
     def _get_title_urls(cls, title_types, only_new=True):
+        catalog = Produce.title_catalog
+        if catalog is None:
+            idents = Produce.produce_title_stats(title_types, idents_only=True)
+        else:
+            idents = ( t[0] for t in catalog if t[1] in title_types )
         iterator = imap(lambda i: (i, Produce._title_href(None, ident=i)),
-                                  Produce.produce_title_stats(title_types,
-                                                      idents_only=True))
+                        idents)
         if only_new:
             known_ids = cls._get_known_ids('title')
-            return ifilter(lambda u: u[0] not in known_ids,
-                                     iterator)
-        return iterator
+            iterator = ifilter(lambda u: u[0] not in known_ids, iterator)
+        return cls._skip_misses(iterator)
 
     @classmethod
     def _get_person_urls(cls, title_types, only_new=True):
@@ -161,32 +474,24 @@ class Fetch(ImdbMixin):
 
         if only_new:
             known_ids = cls._get_known_ids('person')
-            return ifilter(lambda u: u[0] not in known_ids, gen())
+            return cls._skip_misses(ifilter(lambda u: u[0] not in known_ids,
+                                            gen()))
 
-        return gen()
+        return cls._skip_misses(gen())
+
+    @classmethod
+    def _skip_misses(cls, urls):
+        if cls._misses is None:
+            return urls
+        return ifilter(lambda u: not cls._misses.skip(u[0]), urls)
 
     @staticmethod
     def _fetch(name):
-        dest = config.imdb['%s_path' % name]
-        dest_dir = os.path.dirname(dest)
-        if not os.path.exists(dest_dir):
-            os.makedirs(dest_dir)
-
         url = config.imdb['%s_url' % name]
-        dest_gz = os.path.join(dest_dir, os.path.basename(url))
-        cmd = 'wget -O %s %s' % (dest_gz, url)
-        ret = os.system(cmd)
-        if ret > 0 or not os.access(dest_gz, os.R_OK):
-            raise DownloadError('Error downloading file: %s' % cmd)
-
-        cmd = 'gunzip -c %s > %s' % (dest_gz, dest)
-        ret = os.system(cmd)
-        if ret > 0 or not os.access(dest, os.R_OK):
-            raise UnzipError('Error gunzipping file: %s' % cmd)
-
-        ret = os.system('rm %s' % dest_gz)
-        if ret > 0 or os.access(dest_gz, os.R_OK):
-            raise UnzipError('Unable to remove the archive')
+        dest = config.imdb['%s_path' % name]
+        # the producers read the archive itself when it's kept as a .gz
+        Download(url, dest, decompress=url.endswith('.gz') and
+                 not compressed(dest)).run()
 
 class Produce(ImdbMixin):
 
@@ -198,6 +503,33 @@ class Produce(ImdbMixin):
     _re_aka_title = re.compile('^\s*\(aka (.+?) \(([0-9]{4})\)\)\s+\((.+?)\)\s*\(?([^)]+)?\)?')
     _re_character_role = re.compile('^(.+?)(?:  \(as .+?\))?(?:  )?(\[.+\])?\s*?(<[0-9]+>)?$')
     _re_writer_role = re.compile('^(.+?)  \((screenplay|written|original screenplay|original story|story).*?\)\s*?(<[0-9,]+>)?$')
+    _re_person_start = re.compile('^----\t\t\t------$', re.M)
+    _re_person_name = re.compile('^(.*?)\t+(.*)$')
+    _re_list_end = re.compile('\n[ \t]*---------')
+    # greedy with no end anchor, lazy groups backtrack on every character
+    _re_list_line = re.compile('([^\t]*)\t+([^\t\n]*[^\s])\s*'
+                               '(?:\(([^\t\n]*)\))?')
+    _list_formats = {
+        'genre' : ListFormat('genre', '8: THE GENRES LIST', skip=2),
+        'runtime' : ListFormat('runtime', '==================',
+                               convert=_runtime_minutes, multi=False),
+        'country' : ListFormat('country', 'COUNTRIES LIST', skip=1),
+        'language' : ListFormat('language', 'LANGUAGE LIST', skip=1),
+        'certificate' : ListFormat('certificate', 'CERTIFICATES LIST', skip=1,
+                                   convert=_certificate),
+    }
+    _workers = int(config.imdb.workers or 1)
+    _shard_size = int(config.imdb.shard_size or 16) * 1024 * 1024
+    _parser_version = 6
+    # imdb's vote distribution has a character for each rating from 1 to 10:
+    # '.' no votes, '0' to '9' 0-9% to 90-99% of the votes, '*' all of them,
+    # which are stored as the percentage in the middle of each range
+    _distribution_table = string.maketrans('.0123456789*', ''.join(
+        [ chr(0) ] + [ chr(p * 10 + 5) for p in xrange(10) ] + [ chr(100) ]))
+    _memory_budget = int(config.imdb.memory_budget or 0) * 1024 * 1024
+    _tmp_path = config.imdb.tmp_path or None
+    _warming = {}
+    _warm_lock = threading.Lock()
 
     @class_property
     @classmethod
@@ -210,6 +542,10 @@ class Produce(ImdbMixin):
                 'aka' : cls.produce_title_akas,
                 'mpaa' : cls.produce_title_mpaas,
             }
+            for name in cls._optional_lists:
+                if config.imdb.get('%s_path' % name):
+                    cls._title_producers[name] = partial(
+                        cls.produce_title_list, name)
         return cls._title_producers
 
     @class_property
@@ -228,34 +564,205 @@ class Produce(ImdbMixin):
     @classmethod
     def title_ident_to_id(cls):
         if not hasattr(cls, '_title_ident_to_id'):
-            cls._title_ident_to_id = cls._get_known_ids('title')
+            return cls._warmed('title')
         return cls._title_ident_to_id
 
     @class_property
     @classmethod
     def person_ident_to_id(cls):
         if not hasattr(cls, '_person_ident_to_id'):
-            cls._person_ident_to_id = cls._get_known_ids('person')
+            return cls._warmed('person')
         return cls._person_ident_to_id
 
+    @class_property
+    @classmethod
+    def title_catalog(cls):
+        if not hasattr(cls, '_title_catalog'):
+            return cls._warmed('catalog')
+        return cls._title_catalog
+
+    @classmethod
+    def warm_up(cls, *names):
+        """
+        Start loading indexes on background threads, so they load while
+        the lists are being parsed.  The properties above only wait for a
+        load when they're used before it's done.
+        Arguments:
+            names - 'title' and 'person' for the id indexes, 'catalog' for
+                the title catalog
+        """
+        with cls._warm_lock:
+            for name in names:
+                attr, load, args = cls._loader(name)
+                if name not in cls._warming and not hasattr(cls, attr):
+                    cls._warming[name] = Background(load, *args)
+
     @classmethod
-    def produce_titles(cls, types, roles_only=False):
+    def _loader(cls, name):
+        """ (class attribute, load function, its args) of a warm_up name """
+        if name == 'catalog':
+            return '_title_catalog', cls._load_title_catalog, ()
+        return '_%s_ident_to_id' % name, cls._load_known_ids, (name, )
+
+    @classmethod
+    def _warmed(cls, name, wait=True):
+        """
+        Get an index from its background load (starting the load when it
+        hasn't been), or None when not waiting for a load which isn't done.
+        """
+        attr = cls._loader(name)[0]
+        if hasattr(cls, attr):
+            return getattr(cls, attr)
+        cls.warm_up(name)
+        with cls._warm_lock:
+            load = cls._warming.get(name)
+        if load is None:
+            # another thread picked up the result just now
+            return getattr(cls, attr)
+        if not load.done():
+            if not wait:
+                return None
+            started = time.time()
+            load.result()
+            log.info('Waited %.2fs for the imdb %s index' %
+                     (time.time() - started, name))
+        try:
+            setattr(cls, attr, load.result())
+        finally:
+            with cls._warm_lock:
+                if cls._warming.get(name) is load:
+                    del cls._warming[name]
+        return getattr(cls, attr)
+
+    @classmethod
+    def _load_title_catalog(cls):
+        """
+        Get the catalog of the titles in the ratings list with their ids.
+        It's built once for each release of the list (and again whenever
+        the id index changes), without a cache_path there's none.
+        """
+        if not cls._cache_path:
+            return None
+        path = os.path.join(cls._cache_path, 'title.catalog')
+        key_path = '%s.key' % path
+        # the ids come from the id index file, load it before keying on it
+        ids = cls.title_ident_to_id
+        key = cls._title_catalog_key()
+        try:
+            fresh = json.load(open(key_path)) == key
+        except (IOError, ValueError):
+            fresh = False
+        if fresh and os.path.exists(path):
+            return TitleCatalog.load(path)
+
+        rating_path = config.imdb.rating_path
+        log.info('Building the title catalog from %s' % rating_path)
+        def entries():
+            for match in cls._rating_matches(rating_path):
+                ident = match.group(4).decode('latin_1')
+                info = cls._split_title_info(ident)
+                if info:
+                    yield (ident,) + info + (ids.get(ident),)
+        catalog = TitleCatalog.build(entries)
+        catalog.save(path)
+        f = open(key_path, 'w')
+        json.dump(key, f)
+        f.close()
+        return catalog
+
+    @classmethod
+    def _title_catalog_key(cls):
+        key = { 'version' : cls._parser_version }
+        for name, path in (('rating', config.imdb.rating_path),
+                           ('ids', cls._id_index_path('title'))):
+            if os.path.exists(path):
+                stat = os.stat(path)
+                key[name] = [ stat.st_size, stat.st_mtime ]
+        return key
+
+    @classmethod
+    def produce_titles(cls, types, roles_only=False, budget=None):
+        cls.warm_up('title', 'person')
         producers = cls.role_producers.copy()
         if not roles_only:
             producers.update(cls.title_producers)
 
+        if budget is None:
+            budget = cls._memory_budget
+        if budget:
+            return cls._join_titles(producers, types, budget)
+
         titles = {}
-        for name, func in producers.items():
-            for title in func(types):
-                id = title['id']
-                if not id in titles:
-                    titles[id] = title
-                else:
-                    titles[id].update(title)
+        records = ( t for f in cls.role_producers.values() for t in f(types) )
+        if not roles_only:
+            records = chain(cls._scan_titles(types), records)
+        for title in records:
+            id = title['id']
+            if not id in titles:
+                titles[id] = title
+            else:
+                titles[id].update(title)
         return titles.itervalues()
-    
+
     @classmethod
-    def produce_title_roles(cls, title_types, group=None):
+    def _scan_titles(cls, types, workers=None):
+        """
+        Run the title producers, each in a process of its own when there
+        are workers to spare.
+        Returns an iterator of their titles.
+        """
+        if workers is None:
+            workers = cls._workers
+        names = cls.title_producers.keys()
+        workers = min(workers, len(names))
+        if workers <= 1:
+            for name in names:
+                for title in cls.title_producers[name](types):
+                    yield title
+            return
+
+        # the workers inherit the id index rather than each loading it
+        cls.title_ident_to_id
+        log.info('Parsing the title lists with %d workers' % workers)
+        pool = Pool(workers)
+        try:
+            jobs = [ (name, types) for name in names ]
+            for titles in pool.imap(_produce_title_list, jobs):
+                for title in titles:
+                    yield title
+        finally:
+            pool.terminate()
+
+    @classmethod
+    def _join_titles(cls, producers, types, budget):
+        """
+        Join the output of the title producers with a k-way merge, each
+        producer's titles are sorted by id first (spilling to disk once its
+        share of the memory budget is used up).
+        """
+        key = itemgetter('id')
+        share = budget / len(producers)
+        streams = []
+        for name, func in producers.items():
+            if name in cls.role_producers:
+                # these come out of their own external sort in id order
+                streams.append(func(types, budget=share))
+            else:
+                streams.append(external_sort(func(types), key, share,
+                                             cls._tmp_path))
+        for id, parts in merge_join(streams, key):
+            title = parts[0]
+            for part in parts[1:]:
+                title.update(part)
+            yield title
+
+    @classmethod
+    def produce_title_roles(cls, title_types, group=None, budget=None):
+        if budget is None:
+            budget = cls._memory_budget
+        if budget:
+            return cls._group_title_roles(group, budget)
+
         titles = {}
         for role_type in cls._group_role_types[group]:
             for person in cls.produce_persons(role_type):
@@ -265,7 +772,7 @@ class Produce(ImdbMixin):
                     role['person_id'] = person['id']
                     role['name'] = person['name']
                     if not title_id in titles:
-                        titles[title_id] = { 'id' : title_id } 
+                        titles[title_id] = Title(id=title_id)
                         titles[title_id][group] = []
                     titles[title_id][group].append(role)
 
@@ -276,121 +783,322 @@ class Produce(ImdbMixin):
         return titles.values()
 
     @classmethod
-    def produce_persons(cls, role_type, idents_only=False, sans_roles=False):
-        re_person_start = re.compile('^----\t\t\t------$')
-        re_person_name = re.compile('^(.*?)\t+(.*)$')
+    def _group_title_roles(cls, group, budget):
+        """
+        Turn the persons' roles into titles with an external sort on
+        (title id, billing), so the titles come out in id order with their
+        roles already sorted, without holding all of them in memory.
+        """
+        if group in cls._billing_groups:
+            key = itemgetter(0, 1)
+        else:
+            key = itemgetter(0)
+
+        def roles():
+            for role_type in cls._group_role_types[group]:
+                for person in cls.produce_persons(role_type):
+                    for role in person['roles']:
+                        title_id = role.pop('title_id')
+                        role['person_id'] = person['id']
+                        role['name'] = person['name']
+                        yield title_id, role.get('billing'), role
 
+        sorted_roles = external_sort(roles(), key, budget, cls._tmp_path)
+        for title_id, title_roles in groupby(sorted_roles, key=itemgetter(0)):
+            title = Title(id=title_id)
+            title[group] = [ r for _, _, r in title_roles ]
+            yield title
+
+    @classmethod
+    def produce_persons(cls, role_type, idents_only=False, sans_roles=False,
+                        workers=None, diff=False):
+        """
+        Produce the persons (with their roles) from one of the role lists.
+        Arguments:
+            role_type - actor, actress, director, etc.
+            idents_only - only produce the person idents
+            sans_roles - leave the roles off of the persons
+            workers - number of processes to parse the list with
+            diff - only produce the persons which changed since the last
+                diff, marked with a 'diff' key of 'insert' or 'update',
+                followed by { 'id' : id, 'diff' : 'delete' } for the persons
+                which are gone from every role list (without a cache_path
+                all of the persons are produced)
+        """
         type_path = config.imdb['%s_path' % role_type]
         log.info('Loading roles for "%s" from %s' % (role_type, type_path))
-        f = open(type_path, 'r')
+        if idents_only:
+            cls.warm_up('title')
+        else:
+            cls.warm_up('title', 'person')
+
+        if diff and not cls._cache_path:
+            log.info('No imdb cache_path to diff against, producing all of '
+                     'the %s persons' % role_type)
+            diff = False
+        if workers is None:
+            workers = cls._workers
+        if workers > 1:
+            blocks = cls._parsed(role_type, cls._parse_persons_sharded,
+                                 role_type, workers)
+        else:
+            blocks = cls._parsed(role_type, cls._parse_persons, role_type)
+
+        if idents_only:
+            for person_ident, name, roles, digest in blocks:
+                if [ r for r in roles if
+                     r['title_ident'] in cls.title_ident_to_id ]:
+                    yield person_ident
+        elif diff:
+            for person in cls._diff_persons(role_type, blocks, sans_roles):
+                yield person
+        else:
+            for _, _, person in cls._resolve_persons(blocks, sans_roles):
+                yield person
+        log.info('End of File, done importing %s' % role_type)
 
-        while not re_person_start.match(f.readline()):
-            pass
+    @classmethod
+    def _resolve_persons(cls, blocks, sans_roles=False):
+        """
+        Turn parsed person blocks into persons with ids, yields (ident,
+        digest, person) tuples. The digest covers the block and the ids it
+        resolved to.
+        """
+        for person_ident, name, roles, block_digest in blocks:
+            roles = [ r for r in roles if
+                      r['title_ident'] in cls.title_ident_to_id ]
+            if not roles:
+                continue
+            for role in roles:
+                role['title_id'] = cls.title_ident_to_id[role['title_ident']]
+                del role['title_ident']
+            person = Person(name=name, roles=roles)
+            person['id'] = cls.person_ident_to_id.get(person_ident)
+            person['href'] = cls._person_href(person['id'],
+                                              ident=person_ident)
+            digest = ':'.join([ block_digest, str(person['id']) ] +
+                              [ str(r['title_id']) for r in roles ])
+            if sans_roles:
+                del person['roles']
+            yield person_ident, digest, person
 
-        person_new = lambda: { 'name' : None, 'id' : None, 'roles' : [] }
-        person_ident, person = None, person_new()
-        for line in imap(lambda l: l.strip().decode('latin_1'), f):
+    @classmethod
+    def _diff_persons(cls, role_type, blocks, sans_roles=False):
+        """
+        Diff the persons of a role list against its digest table.  All of
+        the role lists share the person documents, so a person who is gone
+        from this list is only deleted when no other list has them either.
+        """
+        if not cls._cache_path:
+            raise ValueError('Diffing persons needs the imdb cache_path')
+        table = DigestTable(cls._digest_path(role_type))
+        people = ( (ident, digest, person['id'], person) for
+                   ident, digest, person in
+                   cls._resolve_persons(blocks, sans_roles) )
+        others = None
+        for op, person in table.diff(people):
+            if op == 'delete':
+                if others is None:
+                    others = [ DigestTable(cls._digest_path(t)) for t in
+                               cls._role_types if t != role_type ]
+                if not [ t for t in others if t.has_id(person) ]:
+                    yield Person(id=person, diff=op)
+            else:
+                person['diff'] = op
+                yield person
+
+    @classmethod
+    def _digest_path(cls, role_type):
+        return os.path.join(cls._cache_path, '%s.digests' % role_type)
+
+    @classmethod
+    def _parse_persons(cls, path, role_type):
+        if compressed(path):
+            # the block parser stops at the footer by itself
+            lines = lines_after(path, cls._re_person_start)
+        else:
+            start, end = cls._persons_range(path)
+            lines = iter_lines(path, start, end)
+        return cls._parse_person_blocks(lines, role_type)
+
+    @classmethod
+    def _parse_persons_sharded(cls, path, role_type, workers):
+        pool = Pool(workers)
+        try:
+            if compressed(path):
+                # an archive can't be cut into byte ranges, so the shards
+                # are cut out of the decompressed lines and handed over
+                log.info('Parsing %s in shards with %d workers' %
+                         (path, workers))
+                lines = lines_after(path, cls._re_person_start)
+                jobs = ( (chunk, role_type) for chunk in
+                         block_chunks(lines, size=cls._shard_size) )
+                results = pool.imap(_parse_person_chunk, jobs)
+            else:
+                start, end = cls._persons_range(path)
+                ranges = block_ranges(path, start, end, size=cls._shard_size)
+                log.info('Parsing %s in %d shards with %d workers' %
+                         (path, len(ranges), workers))
+                jobs = [ (path, s, e, role_type) for s, e in ranges ]
+                results = pool.imap(_parse_person_shard, jobs)
+            for blocks in results:
+                for block in blocks:
+                    yield block
+        finally:
+            pool.terminate()
+
+    @classmethod
+    def _persons_range(cls, path):
+        """
+        (start, end) offsets of the person blocks, from just past the list
+        header to the blank line before the footer (end is None when the
+        list has no footer).
+        """
+        reader = LineReader(path)
+        try:
+            start = reader.search(cls._re_person_start)
+            if start is None:
+                raise ValueError('No person list found in %s' % path)
+            start = reader.next_line(start)
+            end = reader.search(cls._re_list_end, start)
+            return start, None if end is None else end + 1
+        finally:
+            reader.close()
+
+    @classmethod
+    def _parse_person_blocks(cls, lines, role_type):
+        """
+        Parse the raw lines of a person list into (ident, name, roles,
+        digest) tuples, the digest is the md5 of the block's lines. A person
+        block is only complete once a blank line follows it.
+        """
+        person_ident, name, roles, md5 = None, None, [], None
+        for raw in lines:
+            line = raw.strip()
             if line[:9] == '---------':
-                log.info('End of File, done importing %s' % role_type)
                 break
 
             if not person_ident:
-                name_match = re_person_name.match(line)
-                if name_match:
-                    person_ident = name_match.group(1)
-                    person['name'] = rname(clean_name(person_ident))
-                    role_ident = name_match.group(2)
+                name_match = cls._re_person_name.match(line)
+                if not name_match:
+                    continue
+                person_ident = name_match.group(1).decode('latin_1')
+                name = rname(clean_name(person_ident))
+                role_ident = name_match.group(2)
+                md5 = hashlib.md5(raw)
             elif not line:
-                if person_ident and person['roles']:
-                    if idents_only:
-                        yield person_ident
-                    else:
-                        person['id'] = cls.person_ident_to_id.get(person_ident)
-                        person['href'] = cls._person_href(person['id'],
-                                                          ident=person_ident)
-                        if sans_roles:
-                            del person['roles']
-                        yield person
-                person_ident, person = None, person_new()
+                if roles:
+                    yield (person_ident, name, roles, md5.hexdigest())
+                person_ident, name, roles = None, None, []
                 continue
             else:
                 role_ident = line
+                md5.update(raw)
 
-            role = cls._parse_role_ident(role_ident, role_type)
-            if role['title_ident'] in cls.title_ident_to_id:
-                role['title_id'] = cls.title_ident_to_id[role['title_ident']]
-                del role['title_ident']
-                person['roles'].append(role)
-        f.close()
+            roles.append(cls._parse_role_ident(role_ident.decode('latin_1'),
+                                               role_type))
 
     @classmethod
     def _parse_role_ident(cls, ident, role_type):
-        role = {
-            'title_ident' : ident,
-            'billing' : None,
-        }
+        role = Role(ident)
         if role_type == 'writer':
-            role_matcher = cls._re_writer_role
+            groups = _split_writer_role(ident)
+        elif role_type == 'producer':
+            groups = _split_producer_role(ident)
+            if groups:
+                role.title_ident, role.role = groups
+            return role
         else:
-            role_matcher = cls._re_character_role
-
-        role_match = role_matcher.match(ident)
-        if not role_match:
+            groups = _split_character_role(ident)
+        if not groups:
             return role
 
-        title_ident, character, billing = role_match.groups()
+        title_ident, character, billing = groups
         character = character.strip('[]') if character else None
         billing = billing.strip('<>') if billing else None
         if role_type == 'writer':
             if billing:
-                role['billing'] = int(billing.partition(',')[0])
-            role['role'] = character
+                role.billing = int(billing.partition(',')[0])
+            role.role = character
         elif role_type in cls._group_role_types['cast']:
-            role['character'] = character
-            role['role'] = role_type
+            role.character = character
+            role.role = role_type
             if billing:
-                role['billing'] = min(int(billing), 32767)
-        role['title_ident'] = title_ident
+                role.billing = min(int(billing), 32767)
+        role.title_ident = title_ident
         return role
 
     @classmethod
     def produce_title_stats(cls, types, idents_only=False):
-        started = 0
-        for line in open(config.imdb.rating_path):
-            if not started:
-                started = 1 if line.strip() == 'MOVIE RATINGS REPORT' else 0
-            else:
-                match = cls._re_title.match(line.decode('latin_1'))
-                if match:
-                    ident = match.group(4)
-                    title = cls._parse_title_info(ident)
-                    if title and title['type'] in types:
-                        if idents_only:
-                            yield ident
-                        else:
-                            if ident in cls.title_ident_to_id:
-                                rating = (decimal.Decimal(match.group(3)) *
-                                          cls._rating_factor)
-                                title.update({
-                                    'rating'  : {
-                                        'mean' : rating,
-                                        'count' : int(match.group(2)),
-                                        'distribution' : match.group(1),
-                                    },
-                                    'id' : cls.title_ident_to_id[ident]
-                                })
-                                title['href'] = cls._title_href(title['id'])
-                                yield title
+        if not idents_only:
+            cls.warm_up('title')
+        for ident, title, distribution, votes, mean in cls._parsed(
+                'rating', cls._parse_title_stats):
+            if title['type'] not in types:
+                continue
+            if idents_only:
+                yield ident
+                continue
+            id = cls.title_ident_to_id.get(ident)
+            if id is not None:
+                rating = decimal.Decimal(mean) * cls._rating_factor
+                title.update({
+                    'rating'  : {
+                        'mean' : rating,
+                        'count' : votes,
+                        'distribution' : distribution,
+                    },
+                    'id' : id
+                })
+                title['href'] = cls._title_href(title['id'])
+                yield title
+
+    @classmethod
+    def _parse_title_stats(cls, path):
+        for match in cls._rating_matches(path):
+            ident = match.group(4).decode('latin_1')
+            title = cls._parse_title_info(ident)
+            if title:
+                yield (ident, title,
+                       cls._decode_distribution(match.group(1)),
+                       int(match.group(2)), match.group(3))
+
+    @classmethod
+    def _decode_distribution(cls, distribution):
+        """
+        Turn a 10 character vote distribution (e.g. '0000012211') into an
+        array('B') of the percentage of the votes for each rating.
+        """
+        return array('B', distribution.translate(cls._distribution_table))
+
+    @classmethod
+    def _rating_matches(cls, path):
+        """ matches of _re_title against the raw lines of the ratings """
+        match_title = cls._re_title.match
+        for line in lines_after(path, 'MOVIE RATINGS REPORT',
+                                required=False):
+            match = match_title(line)
+            if match:
+                yield match
 
     @classmethod
     def produce_title_mpaas(cls, types):
+        cls.warm_up('title')
+        for title in cls._parsed('mpaa', cls._parse_title_mpaas):
+            if title['type'] in types:
+                title.id = cls.title_ident_to_id.get(title.ident)
+                if title.id is not None:
+                    yield title
+
+    @classmethod
+    def _parse_title_mpaas(cls, path):
         re_mpaa = re.compile('^RE: Rated\s+(.*?)\s+(.*?)$')
         read_next = False
-        for line in open(config.imdb.mpaa_path):
+        for line in iter_lines(path):
             if line[:4] == 'MV: ':
                 ident = line[4:].strip().decode('latin_1')
                 title = cls._parse_title_info(ident, add_info=False)
-                if title and title['type'] in types:
+                if title:
                     read_next = True
             elif line[:4] == 'RE: ' and read_next:
                 line_clean = line.strip().decode('latin_1')
@@ -402,101 +1110,135 @@ class Produce(ImdbMixin):
                     }
                 elif 'mpaa' in title:
                     title['mpaa']['reason'] += ' ' + line_clean[4:]
-            elif not line.strip() and read_next:
+            elif read_next and line.isspace():
                 read_next = False
-                if 'mpaa' in title and ident in cls.title_ident_to_id:
-                    title['id'] = cls.title_ident_to_id[ident]
+                if 'mpaa' in title:
                     yield title
 
     @classmethod
     def produce_title_runtimes(cls, types):
-        re_runtime = re.compile('^(.*?)\t+.*?([0-9]+)')
-        f = open(config.imdb.runtime_path, 'r')
-        while not f.readline().strip() == '==================':
-            pass
-        for line in f:
-            line_clean = line.strip().decode('latin_1')
-            match = re_runtime.match(line_clean)
-            if match and match.group(1) and match.group(2):
-                ident = match.group(1)
-                title = cls._parse_title_info(ident, add_info=False)
-                if (title is not None and title['type'] in types and
-                    (ident in cls.title_ident_to_id)):
-                    title['runtime'] = int(match.group(2))
-                    title['id'] = cls.title_ident_to_id[ident]
-                    yield title
-        f.close()
+        return cls.produce_title_list('runtime', types)
 
     @classmethod
     def produce_title_genres(cls, types):
-        re_genre = re.compile('^(.*?)\t+(.*?)$')
-        f = open(config.imdb.genre_path, 'r')
-        while not f.readline().strip() == '8: THE GENRES LIST':
-            pass
-        if f.readline().strip() == '==================':
-            pass
-        if f.readline().strip() == '':
-            pass
-        title = None
-        for line in f:
-            line_clean = line.strip().decode('latin_1')
-            match = re_genre.match(line_clean)
-            if match and match.group(1) and match.group(2):
-                ident_new = match.group(1)
-                if title is None or ident_new != title['ident']:
-                    if (title is not None and
-                        title['type'] in types and
-                        title['ident'] in cls.title_ident_to_id):
-                        title['id'] = cls.title_ident_to_id[title['ident']]
-                        yield title
-                    title = cls._parse_title_info(ident_new, add_info=False)
-                    if title:
-                        title['genre'] = []
-                if title is not None:
-                    title['genre'].append(match.group(2))
-        f.close()
+        return cls.produce_title_list('genre', types)
+
+    @classmethod
+    def produce_title_list(cls, name, types):
+        """
+        Produce the titles of one of the title/value lists.
+        Arguments:
+            name - the name of the list in _list_formats (e.g. 'country'
+                for country_path)
+            types - the title types to produce
+        """
+        format = cls._list_formats[name]
+        cls.warm_up('title')
+        for title in cls._parsed(name, cls._parse_title_list, format):
+            if title['type'] in types:
+                title.id = cls.title_ident_to_id.get(title.ident)
+                if title.id is not None:
+                    yield title
+
+    @classmethod
+    def _parse_title_list(cls, path, format):
+        """ Parse a title/value list into titles (see ListFormat). """
+        match_line = cls._re_list_line.match
+        field, convert, multi = format.field, format.convert, format.multi
+        title, ident, values = None, None, []
+        for line in lines_after(path, format.marker, skip=format.skip):
+            match = match_line(line)
+            if match is None:
+                continue
+            line_ident, value, note = match.groups()
+            if not line_ident or not value:
+                continue
+            # the idents are only decoded when a new title starts
+            if line_ident != ident:
+                if values:
+                    title[field] = values
+                    yield title
+                    values = []
+                ident = line_ident
+                title = cls._parse_title_info(ident.decode('latin_1'),
+                                              add_info=False)
+            if title is None:
+                continue
+            if convert is None:
+                value = value.decode('latin_1')
+            else:
+                value = convert(value, note)
+                if value is None:
+                    continue
+            if multi:
+                values.append(value)
+            else:
+                title[field] = value
+                yield title
+                # a title out of the next line, even with the same ident
+                ident = None
+        if values:
+            title[field] = values
+            yield title
 
     @classmethod
     def produce_title_akas(cls, types):
-        aka_path = config.imdb.aka_path
-        log.info('Loading aka-titles from "%s"' % aka_path)
-        f = open(aka_path, 'r')
-        while not f.readline().strip() == 'AKA TITLES LIST':
-            pass
-        if f.readline().strip() == '===============':
-            pass
+        log.info('Loading aka-titles from "%s"' % config.imdb.aka_path)
+        cls.warm_up('title')
+        for title in cls._parsed('aka', cls._parse_title_akas):
+            if title['type'] in types:
+                title.id = cls.title_ident_to_id.get(title.ident)
+                if title.id is not None:
+                    yield title
 
+    @classmethod
+    def _parse_title_akas(cls, path):
         title = None
 
-        for line in f:
+        # skip the underline of the heading
+        for line in lines_after(path, 'AKA TITLES LIST', skip=1):
             if line[:9] == '---------':
                 log.info('End of File, done importing aka-titles')
                 break
 
-            stripped = line.strip().decode('latin_1')
+            stripped = line.strip()
             if not stripped:
-                if title and (title['ident'] in cls.title_ident_to_id):
-                    title['id'] = cls.title_ident_to_id[title['ident']]
+                if title:
                     yield title
                 title = None
             elif not title:
                 if not stripped[:4] == '(aka':
-                    title = cls._parse_title_info(stripped, add_info=False)
-                    if title and title['type'] not in types:
-                        title = None
-                    elif title:
-                        title['aka'] = []
+                    title = cls._parse_title_info(stripped.decode('latin_1'),
+                                                  add_info=False)
+                    if title:
+                        title.aka = []
             else:
                 match_aka = cls._re_aka_title.match(stripped)
                 if match_aka:
-                    note = match_aka.group(4) if match_aka.group(4) else None
-                    title['aka'].append({
-                        'name' : match_aka.group(1),
-                        'year' : int(match_aka.group(2)),
-                        'region' : match_aka.group(3),
-                        'note' : note,
+                    name, year, region, note = match_aka.groups()
+                    title.aka.append({
+                        'name' : name.decode('latin_1'),
+                        'year' : int(year),
+                        'region' : region.decode('latin_1'),
+                        'note' : note.decode('latin_1') if note else None,
                     })
-        f.close()
+
+    @classmethod
+    def _parsed(cls, name, parser, *args):
+        """
+        Get the records parsed from one of the imdb lists, from a snapshot
+        of the last parse when the list hasn't changed since then.
+        Arguments:
+            name - the name of the list (e.g. 'rating' for rating_path)
+            parser - the parse method, called with the path and args
+        Returns an iterator of the parsed records.
+        """
+        path = config.imdb['%s_path' % name]
+        if not cls._cache_path:
+            return parser(path, *args)
+        snap = Snapshot(os.path.join(cls._cache_path, '%s.snap' % name),
+                        path, version=cls._parser_version)
+        return snap(lambda: parser(path, *args))
 
     @classmethod
     def _title_href(cls, id, ident=None):
@@ -528,32 +1270,51 @@ class Produce(ImdbMixin):
 
     @classmethod
     def _parse_title_info(cls, ident, add_info=True):
-        match = cls._re_title_info.match(ident.strip())
+        info = cls._split_title_info(ident)
+        if info is None:
+            return None
+        type, name, year = info
+        title = Title(ident, type)
+        if add_info:
+            title.name = name
+            title.year = year
+        return title
+
+    @classmethod
+    def _split_title_info(cls, ident):
+        match = _re_title_ident.match(ident.strip())
         if match and match.group(2) != '????':
-            name = match.group(1)
-            year = match.group(2)
-            if (name[0] == '"' and name[-1] == '"') or match.group(3) == 'TV':
+            name, year, kind = match.groups()
+            if (name[0] == '"' and name[-1] == '"') or kind == 'TV':
                 name = name.strip('"')
                 type = 'tv'
-            elif match.group(3) == 'V':
+            elif kind == 'V':
                 type = 'video'
-            elif match.group(3) == 'VG':
-                type = 'game'
             else:
                 type = 'film'
-            title = {
-                'ident' : ident,
-                'type' : type,
-            }
-            if add_info:
-                title['name'] = name
-                title['year'] = int(year)
-            return title
+            return type, name, int(year)
         elif match:
             log.debug("Title has unknown date, ignoring: %s" % ident)
         else:
             log.warn("Unable to parse title string %s" % ident)
         return None
 
+def _parse_person_shard(job):
+    """ process pool worker, parses the person blocks in one byte range """
+    path, start, end, role_type = job
+    return list(Produce._parse_person_blocks(iter_lines(path, start, end),
+                                             role_type))
+
+def _parse_person_chunk(job):
+    """ process pool worker, parses the person blocks in a chunk of lines """
+    chunk, role_type = job
+    return list(Produce._parse_person_blocks(iter(StringIO(chunk)),
+                                             role_type))
+
+def _produce_title_list(job):
+    """ process pool worker, produces the titles of one title list """
+    name, types = job
+    return list(Produce.title_producers[name](types))
+
 if __name__ == '__main__':
     Fetch.fetch_data()
@@ -1,13 +1,18 @@
-import logging, re, HTMLParser, os, string
+import logging, re, HTMLParser, os, string, hashlib
 from datetime import datetime
 from decimal import Decimal
 import oauth2 as oauth
 from cookielib import MozillaCookieJar
 import xml.etree.cElementTree as etree
+from multiprocessing import Pool
+from cStringIO import StringIO
 
 from filmdata.lib.util import dson
+from filmdata.lib.shard import block_ranges, find_offset
+from filmdata.lib.download import Download, DownloadError
+from filmdata.lib.elementindex import ElementIndex
 import filmdata.sink
-from filmdata.lib.scrape import Scrape
+from filmdata.lib.digest import DigestTable
 from filmdata import config
 
 log = logging.getLogger(__name__)
@@ -45,6 +50,31 @@ class NetflixClient(oauth.Client):
         else:
             return oauth.Client.request(self, *args, **kwargs)
 
+class CatalogDownload(Download):
+    """
+    A Download (see filmdata.lib.download) of a netflix api url.  Every
+    request is signed with oauth afresh, so a transfer which gets resumed
+    doesn't reuse a spent nonce (or an old timestamp).
+    Attributes:
+        consumer - the oauth consumer holding the api key and secret
+
+    Example:
+        consumer = oauth.Consumer(key='key', secret='secret')
+        CatalogDownload('http://api.netflix.com/catalog/titles/index',
+                        'titles.xml', consumer).run()
+    """
+
+    def __init__(self, url, dest, consumer, **kwargs):
+        Download.__init__(self, url, dest, **kwargs)
+        self.consumer = consumer
+
+    def _request_url(self):
+        request = oauth.Request.from_consumer_and_token(self.consumer,
+                                                        http_url=self.url)
+        request.sign_request(oauth.SignatureMethod_HMAC_SHA1(),
+                             self.consumer, None)
+        return request.to_url()
+
 class NetflixMixin:
     """
     Mixin which holds some common netflix functions/variables.
@@ -56,6 +86,10 @@ class NetflixMixin:
             titles index
         _titles_dir_path - the path to the directory holding all of the
             xml files for each individual netflix title
+        _titles_index_path - the path to the sidecar index of where each
+            title sits in the titles index (see filmdata.lib.elementindex)
+        _cache_path - the directory holding the digests of the titles from
+            the last import
     """
 
     name = 'netflix'
@@ -63,6 +97,14 @@ class NetflixMixin:
 
     _titles_file_path = config.netflix.titles_xml_path
     _titles_dir_path = config.netflix.titles_dir_path
+    _titles_index_path = config.netflix.titles_index_path or \
+            '%s.idx' % config.netflix.titles_xml_path
+    _title_index = (None, None)
+    _cache_path = config.netflix.cache_path
+    _re_title_id = re.compile('<id>[^<]*/([0-9]+)</id>')
+    _re_web_link = re.compile('^[ \t]*<link href="(http://www.netflix.com/'
+                              'Movie/[^/\n]+/[0-9]+)" rel="alternate" '
+                              'title="web page"/>[ \t\r]*$', re.M)
 
     @classmethod
     def _get_title_path(cls, id):
@@ -76,6 +118,37 @@ class NetflixMixin:
         bucket = id[:2]
         return os.path.join(cls._titles_dir_path, bucket, basename)
 
+    @classmethod
+    def _load_title_index(cls):
+        """
+        Get the sidecar index of the catalog, it's built (again) when it's
+        missing or was made for another download of the catalog.
+        Returns an ElementIndex of the netflix ids to the (offset, length,
+            web link) of their catalog_title elements.
+        """
+        path, index = cls._title_index
+        if path != cls._titles_index_path:
+            index = None
+            if os.path.exists(cls._titles_index_path):
+                try:
+                    index = ElementIndex.load(cls._titles_index_path)
+                except ValueError:
+                    # an index in an older format
+                    index = None
+        if index is None or not index.is_fresh(cls._titles_file_path):
+            return cls._index_titles()
+        NetflixMixin._title_index = (cls._titles_index_path, index)
+        return index
+
+    @classmethod
+    def _index_titles(cls):
+        """ Build and save the sidecar index of the catalog. """
+        index = ElementIndex.build(cls._titles_file_path, 'catalog_title',
+                                   cls._re_title_id, cls._re_web_link)
+        index.save(cls._titles_index_path)
+        NetflixMixin._title_index = (cls._titles_index_path, index)
+        return index
+
     @classmethod
     def _load_votes(cls):
         votes = {}
@@ -100,6 +173,9 @@ class Fetch(NetflixMixin):
 
     @classmethod
     def fetch_votes(cls, fetch_existing=False):
+        # imported here since the scraper monkey patches the stdlib for
+        # gevent, which doesn't play well with the producers' process pools
+        from filmdata.lib.scrape import Scrape
         scraper = Scrape(cls._get_title_urls(fetch_existing),
                          cls._fetch_vote_response,
                          max_clients=50)
@@ -125,17 +201,12 @@ class Fetch(NetflixMixin):
             votes = cls._load_votes()
             log.info("Done loading old items: found %d" % len(votes))
 
-        re_link = re.compile('^<link href="(http://www.netflix.com/Movie/'
-                             '[^/]+/[0-9]+)" rel="alternate" '
-                             'title="web page"/>$')
-        re_key = re.compile('^http://www.netflix.com/Movie/[^/]+/([0-9]+)')
-        for line in open(cls._titles_file_path):
-            link_match = re_link.match(line.strip())
-            if link_match and link_match.group(1):
-                key = int(re_key.match(link_match.group(1)).group(1))
+        # the web links come straight out of the sidecar index
+        for id, offset, length, link in cls._load_title_index():
+            if link:
+                key = int(link.rpartition('/')[2])
                 if not key in votes:
-                    yield (key, link_match.group(1).replace('//www.',
-                                                            '//movies.'))
+                    yield (key, link.replace('//www.', '//movies.'))
 
     @classmethod
     def _fetch_vote_response(cls, resp, resp_url=None):
@@ -162,12 +233,17 @@ class Fetch(NetflixMixin):
 
     @classmethod
     def _download_title_catalog(cls):
-        if not os.path.isdir(os.path.dirname(cls._titles_file_path)):
-            os.makedirs(os.path.dirname(cls._titles_file_path))
-        xml = cls._fetch(cls._titles_url)
-        f = open(cls._titles_file_path, 'w')
-        f.write(xml)
-        f.close()
+        consumer = oauth.Consumer(key=cls._consumer_key,
+                                  secret=cls._consumer_secret)
+        # the catalog is streamed to disk, gunzipped on the way when the api
+        # sends it gzip encoded
+        written = CatalogDownload(cls._titles_url, cls._titles_file_path,
+                                  consumer, decompress=None,
+                                  headers={ 'Accept-Encoding' : 'gzip' }).run()
+        if not written:
+            raise DownloadError('Got an empty catalog from %s' %
+                                cls._titles_url)
+        cls._index_titles()
 
     @classmethod
     def _fetch(cls, url):
@@ -186,19 +262,78 @@ class Fetch(NetflixMixin):
         return content
 
 class CatalogTitle:
+    """
+    Pulls a title out of a catalog_title element.  The links under the
+    element (and the categories under its formats) are indexed by their rel
+    (or scheme) in a single pass, after which every field is a dict lookup
+    instead of an ElementPath scan.  Plain tags are still found with find(),
+    which runs in C.  The titles are the same as the ElementPath lookups
+    used to give, down to their quirks (see filmdata.bench.netflix_catalog).
+    Attributes:
+        node - the catalog_title element
+        id - the netflix id of the title
+        vote_count - the number of votes on the title
+
+    Example:
+        title = CatalogTitle(elem, 70000000, 12).get_title()
+    """
+
+    _catalog = 'http://schemas.netflix.com/catalog'
+    _rel_synopsis = _catalog + '/titles/synopsis'
+    _rel_short_synopsis = _catalog + '/titles/synopsis.short'
+    _rel_formats = _catalog + '/titles/format_availability'
+    _rel_box_art = _catalog + '/titles/box_art'
+    _rel_art_small = _catalog + '/titles/box_art/64pix_w'
+    _rel_art_large = _catalog + '/titles/box_art/150pix_w'
+    _rel_cast = _catalog + '/people.cast'
+    _rel_directors = _catalog + '/people.directors'
+    _rel_awards = _catalog + '/titles/awards'
+    _rel_person = _catalog + '/person'
+    # the format schemes, the nccp one is tried first
+    _schemes_format = tuple([ 'http://%s.netflix.com/categories/title_formats'
+                              % host for host in ('api-nccp', 'api') ])
+    _schemes_quality = tuple([ s + '/quality' for s in _schemes_format ])
+    _scheme_mpaa = 'http://api.netflix.com/categories/mpaa_ratings'
     _re_award_cat = re.compile(' nominee$')
 
     def __init__(self, node, id, vote_count=None):
         self.node = node
         self.vote_count = vote_count
         self.id = id
+        self._links = self._index(node.findall('link'), 'rel')
+
+    @staticmethod
+    def _index(nodes, attr):
+        """ Map the values of an attribute to the nodes which have them """
+        index = {}
+        for node in nodes:
+            key = node.get(attr)
+            if key in index:
+                index[key].append(node)
+            else:
+                index[key] = [node]
+        return index
+
+    @staticmethod
+    def _first(index, key):
+        found = index.get(key)
+        return found[0] if found else None
+
+    @staticmethod
+    def _first_below(index, key, tag):
+        """ The first child with the tag under any of the keyed nodes """
+        for parent in index.get(key, ()):
+            child = parent.find(tag)
+            if child is not None:
+                return child
+        return None
 
     def get_title(self):
         release_year = self.node.find('release_year')
         if release_year == None or release_year.text == None:
             log.info('Year not found on %d' % self.id)
             return None
-        link = self.node.find('./link[@rel="alternate"]')
+        link = self._first(self._links, 'alternate')
 
         rating_text = self.node.find('average_rating').text.strip()
         rating = None if not rating_text else (Decimal(rating_text) *
@@ -206,7 +341,8 @@ class CatalogTitle:
 
         title = {
             'id' : self.id,
-            'name' : Produce.sanitize_html(self.node.find('title').get('regular')), 
+            'name' : Produce.sanitize_html(
+                self.node.find('title').get('regular')),
             'year' : int(release_year.text),
             'href' : link.get('href') if link != None else None,
             'type' : 'film',
@@ -227,7 +363,7 @@ class CatalogTitle:
         title['mpaa'] = { 'rating' : mpaa } if mpaa else None
 
         return title
-    
+
     def _get_runtime(self, availability):
         for medium in ('dvd', 'bluray', 'instant'):
             if availability.get(medium) and availability[medium].get('runtime'):
@@ -241,14 +377,17 @@ class CatalogTitle:
         return None
 
     def _get_availability(self, node):
-        format = node.find('./category[@scheme='
-                           '"http://api-nccp.netflix.com/categories/title_formats"]')
-        if not format:
-            format = node.find('./category[@scheme='
-                               '"http://api.netflix.com/categories/title_formats"]')
-            if not format:
-                log.warn('No format info found')
-                return None
+        categories = self._index(node.findall('category'), 'scheme')
+        # a format category without children is false, so it falls through
+        # to the next scheme, as it always has
+        format = None
+        for scheme in self._schemes_format:
+            format = self._first(categories, scheme)
+            if format:
+                break
+        else:
+            log.warn('No format info found')
+            return None
 
         avail = {
             'from' : node.get('available_from'),
@@ -258,11 +397,12 @@ class CatalogTitle:
             if avail[k] != None:
                 avail[k] = datetime.fromtimestamp(int(avail[k]))
 
-        quality = format.find('./category[@scheme='
-                              '"http://api-nccp.netflix.com/categories/title_formats/quality"]')
+        format_categories = format.findall('category')
+        qualities = self._index(format_categories, 'scheme')
+        nccp, api = self._schemes_quality
+        quality = self._first(qualities, nccp)
         if not quality:
-            quality = format.find('./category[@scheme='
-                                  '"http://api.netflix.com/categories/title_formats/quality"]')
+            quality = self._first(qualities, api)
         if quality != None and quality.get('label') == 'HD':
             avail['quality'] = 2
         else:
@@ -273,9 +413,13 @@ class CatalogTitle:
         else:
             avail['runtime'] = None
 
-        mpaa = format.find('./category[@sheme="http://api.netflix.com'
-                           '/categories/mpaa_ratings"]')
-        avail['mpaa'] = mpaa.get('label') if mpaa != None else None
+        # the rating has always been looked for under a misspelt 'sheme'
+        # attribute, which keeps the mpaa rating of the formats empty
+        avail['mpaa'] = None
+        for category in format_categories:
+            if category.get('sheme') == self._scheme_mpaa:
+                avail['mpaa'] = category.get('label')
+                break
 
         label_to_key_map = {
             'Blu-ray' : 'bluray',
@@ -290,29 +434,25 @@ class CatalogTitle:
         return { label_to_key_map[label] : avail }
 
     def _get_availabilities(self):
-        nodes = self.node.find('./link[@rel="http://schemas.'
-                               'netflix.com/catalog/titles/f'
-                               'ormat_availability"]/delivery'
-                               '_formats')
+        nodes = self._first_below(self._links, self._rel_formats,
+                                  'delivery_formats')
         avails = {}
         if nodes:
             for avail in [ a for a in
                            map(self._get_availability, list(nodes)) if a ]:
                 avails.update(avail)
         return avails
-            
+
     def _get_art(self):
-        box_art = self.node.find('./link[@rel="http://schemas.netflix.com'
-                            '/catalog/titles/box_art"]/box_art')
+        box_art = self._first_below(self._links, self._rel_box_art, 'box_art')
         if box_art == None:
             log.info('No box art found for')
             return None
 
+        links = self._index(box_art.findall('link'), 'rel')
         art = {
-            'small' : box_art.find('./link[@rel="http://schemas.netflix.com'
-                                   '/catalog/titles/box_art/64pix_w"]'),
-            'large' : box_art.find('./link[@rel="http://schemas.netflix.com'
-                                   '/catalog/titles/box_art/150pix_w"]'),
+            'small' : self._first(links, self._rel_art_small),
+            'large' : self._first(links, self._rel_art_large),
         }
         for key, node in art.items():
             if node != None:
@@ -321,30 +461,29 @@ class CatalogTitle:
 
     def _get_synopsis(self):
         synopsis = {}
-        long = self.node.find('./link[@rel="http://schemas.netflix.com'
-                         '/catalog/titles/synopsis"]/synopsis')
+        long = self._first_below(self._links, self._rel_synopsis, 'synopsis')
         if long != None:
             synopsis['long'] = Produce.sanitize_html(long.text)
 
-        short = self.node.find('./link[@rel="http://schemas.netflix.com'
-                          '/catalog/titles/synopsis.short"]/short_synopsis')
+        short = self._first_below(self._links, self._rel_short_synopsis,
+                                  'short_synopsis')
         if short != None:
             synopsis['short'] = Produce.sanitize_html(short.text)
         return synopsis
 
     def _get_genres(self):
-        categories = self.node.findall('./category')
         genres = []
-        for cat in categories:
+        for cat in self.node.findall('category'):
             scheme = cat.get('scheme')
             if 'genres' in scheme:
                 genres.append(Produce.sanitize_html(cat.get('label')))
         return genres
 
     def _get_people(self, node):
-        found = node.findall('./people/link[@rel="http://schemas.netflix.com'
-                             '/catalog/person"]')
         people = []
+        found = [ link for group in node.findall('people') for
+                  link in group.findall('link') if
+                  link.get('rel') == self._rel_person ]
         for i, person in enumerate(found):
             href = person.get('href')
             if not href:
@@ -357,15 +496,23 @@ class CatalogTitle:
         return people
 
     def _get_cast(self):
-        schema = self.node.find('./link[@rel="http://schemas.netflix.com'
-                           '/catalog/people.cast"]')
+        schema = self._first(self._links, self._rel_cast)
         return self._get_people(schema) if schema is not None else {}
 
     def _get_directors(self):
-        schema = self.node.find('./link[@rel="http://schemas.netflix.com'
-                           '/catalog/people.directors"]')
+        schema = self._first(self._links, self._rel_directors)
         return self._get_people(schema) if schema is not None else {}
 
+    def _get_awards(self):
+        schema = self._first(self._links, self._rel_awards)
+        if schema == None:
+            return None
+        awards_el = schema.find('awards')
+        if awards_el == None:
+            return None
+        return self._group_awards(awards_el.findall('award_winner'),
+                                  awards_el.findall('award_nominee'))
+
     def _get_award_info(self, node):
         category = node.find('category')
         if category == None:
@@ -380,20 +527,11 @@ class CatalogTitle:
                 'name' : person.get('title'),
             }
         award['name'] = category.get('scheme').rpartition('/')[2]
-        award['category'] = CatalogTitle._re_award_cat.sub('', category.get('label'))
+        award['category'] = self._re_award_cat.sub('', category.get('label'))
         award['year'] = node.get('year')
         return award
 
-    def _get_awards(self):
-        schema = self.node.find('./link[@rel="http://schemas.netflix.com'
-                           '/catalog/titles/awards"]')
-        if schema == None:
-            return None
-        awards_el = schema.find('awards')
-        if awards_el == None:
-            return None
-        winners = awards_el.findall('award_winner')
-        nominees = awards_el.findall('award_nominee')
+    def _group_awards(self, winners, nominees):
         awards = {}
         for result, cats in (('won', winners), ('nominated', nominees)): 
             if cats != None:
@@ -416,23 +554,115 @@ class CatalogTitle:
 class Produce(NetflixMixin):
 
     _re_film_test = re.compile('http://api.netflix.com/catalog/titles/movies/([0-9]+)')
+    _re_catalog_start = re.compile('<catalog_title[\s>]')
+    _re_catalog_end = re.compile('</catalog_titles\s*>')
     _h = HTMLParser.HTMLParser()
+    _workers = int(config.netflix.workers or 1)
+    _shard_size = int(config.netflix.shard_size or 16) * 1024 * 1024
 
     @classmethod
     def sanitize_html(cls, x):
         return unicode(cls._h.unescape(x))
 
     @classmethod
-    def produce_titles(cls, types):
-        for title in cls._get_titles(types):
+    def produce_titles(cls, types, workers=None, diff=False):
+        """
+        Produce the film titles of the catalog.
+        Arguments:
+            types - the title types to produce (the catalog only has films)
+            workers - number of processes to parse the catalog with
+            diff - only produce the titles which changed since the last
+                diff, marked with a 'diff' key of 'insert' or 'update',
+                followed by { 'id' : id, 'diff' : 'delete' } for the titles
+                which are gone (without a cache_path all of the titles are
+                produced)
+        """
+        if diff and not cls._cache_path:
+            log.info('No netflix cache_path to diff against, producing all '
+                     'of the titles')
+            diff = False
+        if diff:
+            titles = cls._diff_titles()
+        else:
+            titles = cls._get_titles(types, workers)
+        for title in titles:
             yield title
 
     @classmethod
-    def _get_titles(cls, types=None):
+    def get_title(cls, id, vote_count=None):
+        """
+        Parse a single title out of the catalog, reading only its
+        catalog_title element (found through the sidecar index).
+        Arguments:
+            id - the netflix id of the title
+            vote_count - the number of votes to put on the title
+        Returns the title or None when it's not a film in the catalog (or
+            it's missing its year).
+        """
+        data = cls._load_title_index().read(cls._titles_file_path, id)
+        if data is None:
+            return None
+        return cls._parse_title(data, id, vote_count)
+
+    @classmethod
+    def _parse_title(cls, data, id, vote_count=None):
+        """ Parse the bytes of one catalog_title, None if it's no film """
+        elem = etree.fromstring(data)
+        if not cls._re_film_test.match(elem.find('id').text):
+            return None
+        return CatalogTitle(elem, id, vote_count).get_title()
+
+    @classmethod
+    def _diff_titles(cls):
+        """
+        Hash the raw bytes of every catalog_title (found through the
+        sidecar index) along with its vote count and compare them with the
+        digests from the last diff.  Only the new and changed elements get
+        parsed into titles, a changed one which is no film anymore (or lost
+        its year) is deleted.
+        """
+        if not cls._cache_path:
+            raise ValueError('Diffing titles needs the netflix cache_path')
+        votes = cls._load_votes()
+        table = DigestTable(os.path.join(cls._cache_path, 'title.digests'))
+        elements = cls._load_title_index().elements(cls._titles_file_path)
+        digests = ( (str(id), '%s:%s' % (hashlib.md5(data).digest(),
+                                          votes.get(id)), id, (id, data)) for
+                    id, data in elements )
+        for op, element in table.diff(digests):
+            if op == 'delete':
+                yield { 'id' : element, 'diff' : op }
+                continue
+            id, data = element
+            title = cls._parse_title(data, id, votes.get(id))
+            if title is not None:
+                title['diff'] = op
+                yield title
+            elif op == 'update':
+                yield { 'id' : id, 'diff' : 'delete' }
+
+    @classmethod
+    def _get_titles(cls, types=None, workers=None):
         votes = cls._load_votes()
 
-        context = etree.iterparse(cls._titles_file_path,
-                                  events=('start', 'end'))
+        if workers is None:
+            workers = cls._workers
+        if workers > 1:
+            titles = cls._parse_titles_sharded(cls._titles_file_path, workers)
+        else:
+            titles = cls._parse_titles(cls._titles_file_path)
+        for title in titles:
+            title['rating']['count'] = votes.get(title['id'])
+            yield title
+
+    @classmethod
+    def _parse_titles(cls, source):
+        """
+        Parse the film titles (without their vote counts) out of a catalog.
+        Arguments:
+            source - a path or file object holding the catalog xml
+        """
+        context = etree.iterparse(source, events=('start', 'end'))
         context = iter(context)
         event, root = context.next()
         for event, elem in context:
@@ -440,13 +670,58 @@ class Produce(NetflixMixin):
                 film_match = cls._re_film_test.match(elem.find('id').text)
                 if film_match:
                     id = int(film_match.group(1))
-                    vote = votes.get(id)
-                    title = CatalogTitle(elem, id, vote).get_title()
+                    title = CatalogTitle(elem, id).get_title()
                     #is_tv = title['genre'] and 'Television' in title['genre']
                     if title != None:
                         yield title
                 elem.clear()
                 root.clear()
 
+    @classmethod
+    def _parse_titles_sharded(cls, path, workers):
+        """
+        Parse the catalog in byte ranges which are cut between catalog_title
+        elements, each in a worker process.  Every range gets the bytes before
+        the first title and after the last one wrapped around it, which makes
+        it a catalog of its own.  The titles come out in the catalog's order.
+        """
+        start = find_offset(path, cls._re_catalog_start)
+        if start is None:
+            return
+        end = find_offset(path, cls._re_catalog_end, start)
+        if end is None:
+            end = os.path.getsize(path)
+        f = open(path, 'rb')
+        try:
+            head = f.read(start)
+            f.seek(end)
+            tail = f.read()
+        finally:
+            f.close()
+
+        ranges = block_ranges(path, start, end, size=cls._shard_size,
+                              sep='</catalog_title>')
+        log.info('Parsing %s in %d shards with %d workers' %
+                 (path, len(ranges), workers))
+        pool = Pool(workers)
+        try:
+            jobs = [ (path, s, e, head, tail) for s, e in ranges ]
+            for titles in pool.imap(_parse_title_shard, jobs):
+                for title in titles:
+                    yield title
+        finally:
+            pool.terminate()
+
+def _parse_title_shard(job):
+    """ process pool worker, parses the catalog titles in one byte range """
+    path, start, end, head, tail = job
+    f = open(path, 'rb')
+    try:
+        f.seek(start)
+        data = f.read(end - start)
+    finally:
+        f.close()
+    return list(Produce._parse_titles(StringIO(''.join((head, data, tail)))))
+
 if __name__ == '__main__':
     Fetch.fetch_data()
@@ -0,0 +1,28 @@
+import threading
+import unittest
+
+from filmdata.lib.background import Background
+
+class TestBackground(unittest.TestCase):
+
+    def test_result(self):
+        go = threading.Event()
+        def load(x, y=1):
+            go.wait()
+            return x + y
+        call = Background(load, 2, y=3)
+        self.assertFalse(call.done())
+        go.set()
+        self.assertEqual(call.result(), 5)
+        self.assertTrue(call.done())
+        self.assertEqual(call.result(), 5)
+
+    def test_error(self):
+        def load():
+            raise KeyError('nope')
+        call = Background(load)
+        self.assertRaises(KeyError, call.result)
+        self.assertRaises(KeyError, call.result)
+
+if __name__ == '__main__':
+    unittest.main()
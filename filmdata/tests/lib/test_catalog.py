@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import filmdata.lib.catalog as catalog
+from filmdata.lib.catalog import TitleCatalog
+
+class TestTitleCatalog(unittest.TestCase):
+
+    def setUp(self):
+        types = TitleCatalog.types
+        self._entries = [ (u'Title %d (%d)' % (i, 1950 + i % 60),
+                           types[i % len(types)], u'Title %d' % i,
+                           1950 + i % 60, i * 7 if i % 3 else None) for
+                          i in xrange(3000) ]
+        self._entries.append((u'"Caf\xe9" (1999)', 'tv', u'Caf\xe9', 1999,
+                              123456789012))
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'title.catalog')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _check(self, titles):
+        self.assertEqual(len(titles), len(self._entries))
+        for ident, type, name, year, id in self._entries:
+            self.assertTrue(ident in titles)
+            self.assertEqual(titles[ident], (type, name, year, id))
+        self.assertFalse(u'Not A Title (2001)' in titles)
+        self.assertEqual(titles.get(u'Not A Title (2001)'), None)
+        self.assertRaises(KeyError, titles.__getitem__, u'Not A Title (2001)')
+        # rows come out in the order they went in
+        self.assertEqual(list(titles), self._entries)
+
+    def test_build(self):
+        self._check(TitleCatalog.build(lambda: iter(self._entries)))
+
+    def test_save_load(self):
+        TitleCatalog.build(lambda: iter(self._entries)).save(self._path)
+        self._check(TitleCatalog.load(self._path))
+        self._check(TitleCatalog.load(self._path, mapped=True))
+
+    def test_collisions(self):
+        hash64 = catalog.hash64
+        catalog.hash64 = lambda s: hash64(s) & 0xff
+        try:
+            titles = TitleCatalog.build(lambda: iter(self._entries))
+            self.assertTrue(titles.collisions)
+            self._check(titles)
+            titles.save(self._path)
+            self._check(TitleCatalog.load(self._path, mapped=True))
+        finally:
+            catalog.hash64 = hash64
+
+if __name__ == '__main__':
+    unittest.main()
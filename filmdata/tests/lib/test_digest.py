@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from filmdata.lib.digest import DigestTable, hash64
+
+class TestDigestTable(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'cache', 'actor.digests')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _diff(self, records, path=None):
+        table = DigestTable(path or self._path)
+        return table, list(table.diff([ (k, d, i, (k, i)) for
+                                        k, d, i in records ]))
+
+    def test_diff(self):
+        table, ops = self._diff([ (u'Eastwood, Clint', 'a', 1),
+                                  (u'Freeman, Morgan', 'b', 2),
+                                  (u'Haggis, Paul', 'c', None) ])
+        self.assertEqual(ops, [ ('insert', (u'Eastwood, Clint', 1)),
+                                ('insert', (u'Freeman, Morgan', 2)),
+                                ('insert', (u'Haggis, Paul', None)) ])
+        self.assertTrue(os.path.exists(self._path))
+        self.assertEqual(len(DigestTable(self._path)), 3)
+
+        table, ops = self._diff([ (u'Freeman, Morgan', 'b', 2),
+                                  (u'Eastwood, Clint', 'a2', 1),
+                                  (u'Penn, Sean', 'd', 4) ])
+        # Haggis had no id, there's nothing to delete
+        self.assertEqual(ops, [ ('update', (u'Eastwood, Clint', 1)),
+                                ('insert', (u'Penn, Sean', 4)) ])
+
+        table, ops = self._diff([ (u'Penn, Sean', 'd', 4) ])
+        self.assertEqual(sorted(ops), [ ('delete', 1), ('delete', 2) ])
+        table = DigestTable(self._path)
+        self.assertEqual(len(table), 1)
+        self.assertTrue(table.find(hash64(u'Penn, Sean')) >= 0)
+        self.assertEqual(table.find(hash64(u'Freeman, Morgan')), -1)
+
+    def test_has_id(self):
+        # a person in two role lists has an entry in the table of each
+        directors = os.path.join(self._dir, 'cache', 'director.digests')
+        self._diff([ (u'Eastwood, Clint', 'a', 1),
+                     (u'Freeman, Morgan', 'b', 2) ])
+        self._diff([ (u'Eastwood, Clint', 'c', 1) ], directors)
+
+        actors, ops = self._diff([ (u'Freeman, Morgan', 'b', 2) ])
+        self.assertEqual(ops, [ ('delete', 1) ])
+        self.assertFalse(actors.has_id(1))
+        self.assertTrue(actors.has_id(2))
+        self.assertTrue(DigestTable(directors).has_id(1))
+        self.assertFalse(DigestTable(directors).has_id(2))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import gzip
+import shutil
+import tempfile
+import threading
+import unittest
+from StringIO import StringIO
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from filmdata.lib.download import Download, DownloadError
+
+class _Handler(BaseHTTPRequestHandler):
+    """ Serves the server's payload with Range support, optionally dropping
+        the first connection half way through the body. """
+
+    def do_GET(self):
+        data = self.server.payload
+        start = 0
+        if 'Range' in self.headers:
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+            if start >= len(data):
+                self.send_response(416)
+                if self.server.content_range:
+                    self.send_header('Content-Range', 'bytes */%d' % len(data))
+                self.end_headers()
+                return
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data) - start))
+        if self.server.encoding:
+            self.send_header('Content-Encoding', self.server.encoding)
+        self.end_headers()
+        body = data[start:]
+        if self.server.flaky:
+            self.server.flaky = False
+            body = body[:len(body) / 2]
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestDownload(unittest.TestCase):
+
+    def setUp(self):
+        self._text = ''.join('%d\tsome line of a list\n' % i for
+                             i in xrange(50000))
+        buf = StringIO()
+        gz = gzip.GzipFile(fileobj=buf, mode='wb')
+        gz.write(self._text)
+        gz.close()
+        self._server = HTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.payload = buf.getvalue()
+        self._server.flaky = False
+        self._server.encoding = None
+        self._server.content_range = True
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self._url = 'http://127.0.0.1:%d/ratings.list.gz' % \
+                self._server.server_port
+        self._dir = tempfile.mkdtemp()
+        self._dest = os.path.join(self._dir, 'lists', 'ratings.list')
+
+    def tearDown(self):
+        self._server.shutdown()
+        self._server.server_close()
+        shutil.rmtree(self._dir)
+
+    def _read_dest(self):
+        return open(self._dest, 'rb').read()
+
+    def test_decompress(self):
+        written = Download(self._url, self._dest, decompress=True).run()
+        self.assertEqual(written, len(self._text))
+        self.assertEqual(self._read_dest(), self._text)
+        self.assertFalse(os.path.exists('%s.part' % self._dest))
+
+    def test_raw(self):
+        Download(self._url, self._dest).run()
+        self.assertEqual(self._read_dest(), self._server.payload)
+
+    def test_resume(self):
+        self._server.flaky = True
+        d = Download(self._url, self._dest, decompress=True, chunk_size=1024)
+        d.run()
+        self.assertEqual(self._read_dest(), self._text)
+        self.assertEqual(d.received, len(self._server.payload))
+
+    def test_resume_part_file(self):
+        os.makedirs(os.path.dirname(self._dest))
+        half = len(self._server.payload) / 2
+        open('%s.part' % self._dest, 'wb').write(self._server.payload[:half])
+        Download(self._url, self._dest).run()
+        self.assertEqual(self._read_dest(), self._server.payload)
+
+    def test_resume_complete_part_file(self):
+        # the earlier run got every byte but never renamed the .part file
+        os.makedirs(os.path.dirname(self._dest))
+        part = '%s.part' % self._dest
+        for content_range in (True, False):
+            self._server.content_range = content_range
+            open(part, 'wb').write(self._server.payload)
+            d = Download(self._url, self._dest)
+            self.assertEqual(d.run(), len(self._server.payload))
+            self.assertEqual(self._read_dest(), self._server.payload)
+            self.assertFalse(os.path.exists(part))
+        # a .part file longer than the remote one is still an error
+        open(part, 'wb').write(self._server.payload + 'junk')
+        self._server.content_range = True
+        self.assertRaises(DownloadError, Download(self._url, self._dest).run)
+
+    def test_content_encoding(self):
+        # left up to the response, which isn't gzip encoded
+        Download(self._url, self._dest, decompress=None).run()
+        self.assertEqual(self._read_dest(), self._server.payload)
+        os.remove(self._dest)
+        self._server.encoding = 'gzip'
+        self._server.flaky = True
+        Download(self._url, self._dest, decompress=None).run()
+        self.assertEqual(self._read_dest(), self._text)
+
+    def test_bad_gzip(self):
+        self._server.payload = 'not gzipped at all'
+        self.assertRaises(DownloadError, Download(self._url, self._dest,
+                                                  decompress=True).run)
+
+if __name__ == '__main__':
+    unittest.main()
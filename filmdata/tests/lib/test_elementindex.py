@@ -0,0 +1,89 @@
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from filmdata.lib.elementindex import ElementIndex
+
+class TestElementIndex(unittest.TestCase):
+
+    _re_id = re.compile('<id>([0-9]+)</id>')
+    _re_link = re.compile('<link href="([^"]*)"/>')
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'items.xml')
+        self._index_path = os.path.join(self._dir, 'items.idx')
+        self._elements = []
+        for i in xrange(500):
+            element = '<item>\n<id>%d</id>\n' % ((i * 7919) % 1000)
+            if i % 5:
+                element += '<link href="http://x/%d"/>\n' % i
+            element += '</item>'
+            self._elements.append(element)
+        # an element without an id, another tag starting the same way
+        data = ('<?xml version="1.0"?>\n<items>\n<item><name/></item>\n'
+                '<items_count>500</items_count>\n%s\n</items>\n' %
+                '\n'.join(self._elements))
+        open(self._path, 'wb').write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _check(self, index):
+        self.assertEqual(len(index), len(self._elements))
+        self.assertEqual(index.source_size, os.path.getsize(self._path))
+        for i, element in enumerate(self._elements):
+            id = (i * 7919) % 1000
+            self.assertTrue(id in index)
+            self.assertEqual(index.read(self._path, id), element)
+            offset, length, link = index[id]
+            self.assertEqual(length, len(element))
+            self.assertEqual(link, 'http://x/%d' % i if i % 5 else '')
+        self.assertFalse(1001 in index)
+        self.assertEqual(index.get(1001), None)
+        self.assertEqual(index.read(self._path, 1001), None)
+        self.assertRaises(KeyError, index.__getitem__, 1001)
+        # rows come out in the order of the file
+        self.assertEqual([ r[0] for r in index ],
+                         [ (i * 7919) % 1000 for
+                           i in xrange(len(self._elements)) ])
+
+    def test_elements(self):
+        index = ElementIndex.build(self._path, 'item', self._re_id)
+        self.assertEqual(list(index.elements(self._path)),
+                         [ ((i * 7919) % 1000, e) for
+                           i, e in enumerate(self._elements) ])
+
+    def test_build(self):
+        self._check(ElementIndex.build(self._path, 'item', self._re_id,
+                                       self._re_link))
+
+    def test_save_load(self):
+        ElementIndex.build(self._path, 'item', self._re_id,
+                           self._re_link).save(self._index_path)
+        self._check(ElementIndex.load(self._index_path))
+
+    def test_is_fresh(self):
+        ElementIndex.build(self._path, 'item', self._re_id).save(
+            self._index_path)
+        index = ElementIndex.load(self._index_path)
+        self.assertTrue(index.is_fresh(self._path))
+        # the same size, written again
+        data = open(self._path, 'rb').read()
+        open(self._path, 'wb').write(data.replace('<id>0</id>', '<id>9</id>'))
+        os.utime(self._path, (index.source_mtime + 10,) * 2)
+        self.assertFalse(index.is_fresh(self._path))
+        open(self._path, 'ab').write('\n')
+        os.utime(self._path, (index.source_mtime,) * 2)
+        self.assertFalse(index.is_fresh(self._path))
+
+    def test_empty(self):
+        open(self._path, 'wb').close()
+        index = ElementIndex.build(self._path, 'item', self._re_id)
+        index.save(self._index_path)
+        self.assertEqual(len(ElementIndex.load(self._index_path)), 0)
+
+if __name__ == '__main__':
+    unittest.main()
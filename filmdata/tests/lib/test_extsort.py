@@ -0,0 +1,41 @@
+import random
+import unittest
+from operator import itemgetter
+
+from filmdata.lib.extsort import ExternalSort, external_sort, merge_join
+
+class TestExternalSort(unittest.TestCase):
+
+    def setUp(self):
+        rand = random.Random(42)
+        self._records = [ { 'id' : rand.randrange(500), 'seq' : i,
+                            'name' : u'title %d' % i } for i in xrange(20000) ]
+
+    def test_in_memory(self):
+        result = list(external_sort(self._records, itemgetter('id')))
+        self.assertEqual(result, sorted(self._records, key=itemgetter('id')))
+
+    def test_spill_and_merge(self):
+        sorter = ExternalSort(itemgetter('id'), budget=64 * 1024)
+        sorter.extend(self._records)
+        self.assertTrue(len(sorter.runs) > sorter._fan_in)
+        runs = list(sorter.runs)
+        result = list(sorter)
+        # stable, so records with the same id keep their order
+        self.assertEqual(result, sorted(self._records, key=itemgetter('id')))
+        self.assertEqual(sorter.runs, [])
+        for path in runs:
+            self.assertRaises(IOError, open, path)
+
+    def test_merge_join(self):
+        a = sorted(self._records[:100], key=itemgetter('id'))
+        b = sorted(self._records[50:150], key=itemgetter('id'))
+        groups = list(merge_join([ iter(a), iter(b) ], itemgetter('id')))
+        ids = [ k for k, _ in groups ]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(sum(len(g) for _, g in groups), 200)
+        for k, group in groups:
+            self.assertTrue(all(r['id'] == k for r in group))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from filmdata.lib.frontier import Frontier
+
+class TestFrontier(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'cache', 'person.frontier')
+        self._entries = [ (u'Eastwood, Clint %d' % i, 'http://x/%d' % i) for
+                          i in xrange(25) ]
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_resume(self):
+        frontier = Frontier(self._path)
+        self.assertFalse(frontier.pending())
+        self.assertEqual(frontier.build(iter(self._entries)), 25)
+        seen = []
+        for i, entry in enumerate(frontier):
+            seen.append(entry)
+            if i % 10 == 9:
+                frontier.commit()
+            if i == 13:
+                break  # crash half way through a batch
+
+        frontier = Frontier(self._path)
+        self.assertTrue(frontier.pending())
+        rest = list(frontier)
+        # the uncommitted part of the batch is handed out again
+        self.assertEqual(rest, self._entries[10:])
+        frontier.commit()
+        self.assertFalse(Frontier(self._path).pending())
+
+        frontier.clear()
+        self.assertFalse(os.path.exists(self._path))
+        self.assertFalse(Frontier(self._path).pending())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from array import array
+
+from filmdata.lib.histogram import spread
+
+class TestSpread(unittest.TestCase):
+
+    def test_spread(self):
+        histograms = [
+            array('B', [0, 0, 0, 0, 100, 0, 0, 0, 0, 0]),
+            array('B', [50, 0, 0, 0, 0, 0, 0, 0, 0, 50]),
+            '\x00' * 10,
+            array('B', [5, 5, 5, 5, 15, 25, 25, 15, 5, 5]),
+        ]
+        stats = spread(histograms)
+        self.assertEqual(list(stats['mean'][:2]), [5.0, 5.5])
+        self.assertEqual(list(stats['variance'][:2]), [0.0, 20.25])
+        self.assertEqual(list(stats['p50'][:2]), [5.0, 1.0])
+        self.assertEqual(list(stats['p75'][:2]), [5.0, 10.0])
+        # no votes at all
+        for field in ('mean', 'variance', 'p25', 'p50', 'p75'):
+            self.assertTrue(stats[field][2] != stats[field][2])
+        self.assertAlmostEqual(stats['mean'][3], 665 / 110.0)
+        self.assertEqual(stats['p25'][3], 5.0)
+        self.assertEqual(stats['p50'][3], 6.0)
+
+    def test_values(self):
+        stats = spread([ array('B', [0, 0, 10, 10]) ], values=[25, 50, 75, 100],
+                       percentiles=(10, 90))
+        self.assertEqual(stats['mean'][0], 87.5)
+        self.assertEqual(stats['p10'][0], 75.0)
+        self.assertEqual(stats['p90'][0], 100.0)
+
+    def test_empty(self):
+        self.assertEqual(len(spread([])['variance']), 0)
+
+if __name__ == '__main__':
+    unittest.main()
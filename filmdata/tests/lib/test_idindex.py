@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import filmdata.lib.idindex as idindex
+from filmdata.lib.idindex import IdIndex
+
+class TestIdIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._pairs = [ (u'Title %d (%d)' % (i, 1950 + i % 60), i * 7) for
+                        i in xrange(5000) ]
+        self._pairs.append((u'Caf\xe9 (1999)', 123456789012))
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'title.ids')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _check(self, index):
+        self.assertEqual(len(index), len(self._pairs))
+        for ident, id in self._pairs:
+            self.assertTrue(ident in index)
+            self.assertEqual(index[ident], id)
+        self.assertFalse(u'Not A Title (2001)' in index)
+        self.assertEqual(index.get(u'Not A Title (2001)', -1), -1)
+        self.assertRaises(KeyError, index.__getitem__, u'Not A Title (2001)')
+
+    def test_build(self):
+        self._check(IdIndex.build(lambda: iter(self._pairs)))
+
+    def test_save_load(self):
+        IdIndex.build(lambda: iter(self._pairs)).save(self._path)
+        self._check(IdIndex.load(self._path))
+        self._check(IdIndex.load(self._path, mapped=True))
+
+    def test_collisions(self):
+        # a hash with only 256 values collides all over the place
+        hash64 = idindex.hash64
+        idindex.hash64 = lambda s: hash64(s) & 0xff
+        try:
+            index = IdIndex.build(lambda: iter(self._pairs))
+            self.assertTrue(index.collisions)
+            self._check(index)
+            index.save(self._path)
+            self._check(IdIndex.load(self._path, mapped=True))
+        finally:
+            idindex.hash64 = hash64
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import re
+import gzip
+import zlib
+import shutil
+import tempfile
+import unittest
+
+from filmdata.lib.lines import LineReader, GzipChunks, iter_lines, lines_after
+
+class TestLineReader(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'genres.list')
+        self._lines = [ 'CRC: 0x1234\n', '\n', '8: THE GENRES LIST  \n',
+                        '==================\n', '\n',
+                        'Bird (1988)\t\t\tMusic\n',
+                        'Caf\xe9 (1999)\t\t\tDrama\n',
+                        '\n', '-----------\n', 'footer' ]
+        f = open(self._path, 'wb')
+        f.write(''.join(self._lines))
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_lines(self):
+        self.assertEqual(list(iter_lines(self._path)), self._lines)
+        start = len(''.join(self._lines[:5]))
+        end = len(''.join(self._lines[:7]))
+        self.assertEqual(list(iter_lines(self._path, start, end)),
+                         self._lines[5:7])
+        self.assertEqual(list(iter_lines(self._path, start)),
+                         self._lines[5:])
+        self.assertEqual(list(iter_lines(self._path, start, start)), [])
+        # a range cut mid line ends with the start of the line
+        self.assertEqual(list(iter_lines(self._path, start, end + 4)),
+                         self._lines[5:7] + [ '\n', '---' ])
+        self.assertEqual(list(iter_lines(self._path, end + 1, end + 3)),
+                         [ '--' ])
+
+    def test_offsets(self):
+        reader = LineReader(self._path)
+        try:
+            start = reader.line_after('8: THE GENRES LIST')
+            self.assertEqual(start, len(''.join(self._lines[:3])))
+            self.assertEqual(reader.next_line(start, 2),
+                             len(''.join(self._lines[:5])))
+            self.assertEqual(reader.line_after('NO SUCH LIST'), None)
+            end = reader.search(re.compile('\n-------'), start)
+            self.assertEqual(end, len(''.join(self._lines[:8])) - 1)
+            self.assertEqual(reader.find('Caf\xe9'),
+                             len(''.join(self._lines[:6])))
+            self.assertEqual(reader.next_line(reader.size - 2), reader.size)
+        finally:
+            reader.close()
+
+    def test_empty(self):
+        open(self._path, 'wb').close()
+        reader = LineReader(self._path)
+        self.assertEqual(reader.line_after('8: THE GENRES LIST'), None)
+        self.assertEqual(list(reader.lines()), [])
+        reader.close()
+
+    def test_lines_after(self):
+        self.assertEqual(list(lines_after(self._path, '8: THE GENRES LIST',
+                                          skip=2)), self._lines[5:])
+        self.assertEqual(list(lines_after(self._path,
+                                          re.compile('^=+$', re.M))),
+                         self._lines[4:])
+        self.assertEqual(list(lines_after(self._path, 'NO SUCH LIST',
+                                          required=False)), [])
+        self.assertRaises(ValueError, lines_after, self._path, 'NO SUCH LIST')
+
+class TestGzipLines(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'genres.list.gz')
+        self._lines = [ '8: THE GENRES LIST\n', '==================\n',
+                        '\n' ] + [ 'Title %d (%d)\t\t\tDrama\n' %
+                                   (i, 1950 + i % 60) for i in xrange(5000) ]
+        self._lines[-1] = self._lines[-1].rstrip('\n')
+        # two gzip members, like a concatenated archive
+        f = open(self._path, 'wb')
+        for lines in (self._lines[:1234], self._lines[1234:]):
+            g = gzip.GzipFile(fileobj=f, mode='wb')
+            g.write(''.join(lines))
+            g.close()
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_chunks(self):
+        chunks = list(GzipChunks(self._path, read_size=100, queue_size=2))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks), ''.join(self._lines))
+        for chunk in chunks[:-1]:
+            self.assertTrue(chunk.endswith('\n'))
+
+    def test_lines(self):
+        self.assertEqual(list(iter_lines(self._path)), self._lines)
+        self.assertRaises(ValueError, iter_lines, self._path, 10)
+        self.assertEqual(list(lines_after(self._path, '8: THE GENRES LIST',
+                                          skip=2)), self._lines[3:])
+        self.assertEqual(list(lines_after(self._path, 'NO SUCH LIST',
+                                          required=False)), [])
+        self.assertRaises(ValueError, lines_after, self._path, 'NO SUCH LIST')
+
+    def test_early_exit(self):
+        # the thread stops once the consumer is gone
+        lines = iter(GzipChunks(self._path, read_size=100, queue_size=1))
+        next(lines)
+        lines.close()
+
+    def test_corrupt(self):
+        f = open(self._path, 'wb')
+        f.write('not gzip data\n' * 100)
+        f.close()
+        self.assertRaises(zlib.error, list, iter_lines(self._path))
+
+if __name__ == '__main__':
+    unittest.main()
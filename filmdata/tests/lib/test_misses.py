@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from filmdata.lib.misses import MissCache
+
+class TestMissCache(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'cache', 'person.misses')
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def test_skip(self):
+        misses = MissCache(self._path, retry_after=100)
+        self.assertFalse(misses.skip(u'Eastwood, Clint'))
+        misses.miss(u'Eastwood, Clint', 'no match')
+        now = time.time()
+        self.assertTrue(misses.skip(u'Eastwood, Clint', now))
+        self.assertFalse(misses.skip(u'Eastwood, Clint', now + 101))
+        misses.miss(u'Eastwood, Clint', 'no match')
+        # waits longer after every attempt
+        self.assertTrue(misses.skip(u'Eastwood, Clint', now + 101))
+        self.assertFalse(misses.skip(u'Eastwood, Clint', now + 201))
+
+    def test_persist(self):
+        misses = MissCache(self._path)
+        misses.miss(u'Eastwood, Clint', 'no match')
+        misses.miss(u'Eastwood, Clint', 'redirect')
+        misses.miss(u'Prowse, David', 'no match')
+        misses.hit(u'Prowse, David')
+        misses.close()
+        open(self._path, 'a').write('["Cut sho')
+
+        misses = MissCache(self._path)
+        self.assertEqual(len(misses), 1)
+        miss = misses.misses[u'Eastwood, Clint']
+        self.assertEqual(miss['reason'], 'redirect')
+        self.assertEqual(miss['attempts'], 2)
+        self.assertTrue(misses.skip(u'Eastwood, Clint'))
+        self.assertFalse(misses.skip(u'Prowse, David'))
+        misses.miss(u'Prowse, David', 'no match')
+        misses.close()
+        self.assertEqual(len(MissCache(self._path)), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import cPickle as pickle
+
+from filmdata.lib.record import Record
+
+class Role(Record):
+    __slots__ = ('title_id', 'name', 'billing')
+
+class TestRecord(unittest.TestCase):
+
+    def setUp(self):
+        self._role = Role(title_id=1, billing=None)
+
+    def test_dict_access(self):
+        role = self._role
+        self.assertEqual(role['title_id'], 1)
+        self.assertTrue('billing' in role)
+        self.assertFalse('name' in role)
+        self.assertRaises(KeyError, role.__getitem__, 'name')
+        self.assertEqual(role.get('name', 'x'), 'x')
+        role['name'] = u'Clint'
+        self.assertEqual(sorted(role.keys()), ['billing', 'name', 'title_id'])
+        self.assertEqual(len(role), 3)
+        del role['title_id']
+        self.assertFalse('title_id' in role)
+        self.assertEqual(role.pop('billing'), None)
+        self.assertEqual(role.pop('billing', 5), 5)
+        self.assertRaises(KeyError, role.__setitem__, 'character', 'Walt')
+        self.assertTrue(role)
+        del role['name']
+        self.assertFalse(role)
+
+    def test_update_and_compare(self):
+        role = self._role
+        role.update({ 'name' : u'Clint' }, billing=2)
+        self.assertEqual(role.to_dict(),
+                         { 'title_id' : 1, 'name' : u'Clint', 'billing' : 2 })
+        self.assertEqual(role, role.to_dict())
+        self.assertEqual(role.to_dict(), role)
+        self.assertEqual([ role ], [ role.to_dict() ])
+        self.assertNotEqual(role, Role(title_id=1))
+        self.assertEqual(role.copy(), role)
+
+    def test_pickle(self):
+        del self._role['billing']
+        role = pickle.loads(pickle.dumps(self._role, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(role, { 'title_id' : 1 })
+        self.assertFalse('billing' in role)
+
+if __name__ == '__main__':
+    unittest.main()
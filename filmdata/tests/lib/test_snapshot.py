@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from filmdata.lib.snapshot import Snapshot
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.mkdtemp()
+        self._source = os.path.join(self._dir, 'ratings.list')
+        self._path = os.path.join(self._dir, 'cache', 'rating.snap')
+        self._write('Gran Torino (2008)\nBird (1988)\n')
+        self._builds = 0
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _write(self, data, mtime=None):
+        f = open(self._source, 'w')
+        f.write(data)
+        f.close()
+        if mtime is not None:
+            os.utime(self._source, (mtime, mtime))
+
+    def _parse(self):
+        self._builds += 1
+        for line in open(self._source):
+            yield { 'ident' : line.strip() }
+
+    def _records(self, version=1):
+        snap = Snapshot(self._path, self._source, version=version,
+                        batch_size=1)
+        return list(snap(self._parse))
+
+    def test_hit(self):
+        records = self._records()
+        self.assertEqual(records, [ { 'ident' : 'Gran Torino (2008)' },
+                                    { 'ident' : 'Bird (1988)' } ])
+        self.assertEqual(self._records(), records)
+        self.assertEqual(self._builds, 1)
+        # touched but the same contents, the digest says it's still fresh
+        self._write('Gran Torino (2008)\nBird (1988)\n', mtime=1000000000)
+        self.assertEqual(self._records(), records)
+        self.assertEqual(self._builds, 1)
+
+    def test_invalidate(self):
+        self._write('Bird (1988)\n', mtime=1000000000)
+        self._records()
+        # another size
+        self._write('Gran Torino (2008)\n', mtime=1000000000)
+        self.assertEqual(self._records(), [ { 'ident' :
+                                              'Gran Torino (2008)' } ])
+        self.assertEqual(self._builds, 2)
+        # the same size, another mtime and contents
+        self._write('Dirty Harry (1971)\n', mtime=1000000001)
+        self.assertEqual(self._records(), [ { 'ident' :
+                                              'Dirty Harry (1971)' } ])
+        self.assertEqual(self._builds, 3)
+        # another parser version
+        self._records(version=2)
+        self.assertEqual(self._builds, 4)
+        self._records(version=2)
+        self.assertEqual(self._builds, 4)
+
+    def test_partial(self):
+        self._records()
+        self._write('Bird (1988)\nDirty Harry (1971)\nGran Torino (2008)\n')
+        snap = Snapshot(self._path, self._source, version=1, batch_size=1)
+        records = snap(self._parse)
+        records.next()
+        records.close()
+        # the old snapshot is stale and left alone, the next call parses
+        self.assertFalse(snap.is_fresh())
+        self.assertEqual(len(self._records()), 3)
+        self.assertEqual(self._builds, 3)
+        self.assertTrue(snap.is_fresh())
+
+if __name__ == '__main__':
+    unittest.main()
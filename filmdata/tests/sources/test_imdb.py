@@ -1,3 +1,8 @@
+import os
+import json
+import shutil
+import logging
+import tempfile
 import unittest
 
 import filmdata.tests.sources as mixins
@@ -14,5 +19,475 @@ class TestImdbProduce(mixins.ProduceMixin, unittest.TestCase):
         self._name = 'imdb'
         self.setUpMixin()
 
+class TestImdbIdentParsers(unittest.TestCase):
+
+    _data_dir = os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                             'test_data', 'sources', 'imdb')
+    _odd_idents = (
+        u'Dirty Harry (1971)  [Police Inspector Harry Callahan]  <1>',
+        u'Gran Torino (2008)  (as Clint)  [Walt Kowalski]  <1>',
+        u'Gran Torino (2008)  (uncredited)  [Walt]',
+        u'Gran Torino (2008) [Walt]',
+        u'Gran Torino (2008)   [Walt]  <2>',
+        u'Gran Torino (2008)  [Walt [Jr.]]  <x>',
+        u'Gran Torino (2008)  (as Bob (Jr.))  [Walt]',
+        u'Gran Torino (2008)  (screenplay)  <1,2,1>',
+        u'Gran Torino (2008)  (original story) (as Nick)',
+        u'Bird (1988)   (story)',
+        u'Some Game (2001) (VG)',
+        u'Unknown (????/II) (TV)',
+        u'[]  <1>',
+        u'',
+    )
+
+    def setUp(self):
+        from filmdata.source import imdb
+        self._imdb = imdb
+        self._idents = list(self._odd_idents)
+        for name in ('actors', 'actresses', 'directors'):
+            for line in open(os.path.join(self._data_dir, '%s.list' % name)):
+                line = line.strip().decode('latin_1')
+                self._idents.extend((line, line.rpartition('\t')[2]))
+
+    def _groups(self, regex, ident):
+        match = regex.match(ident)
+        return match.groups() if match else None
+
+    def test_title_ident(self):
+        produce = self._imdb.Produce
+        for ident in self._idents:
+            ident = ident.strip()
+            self.assertEqual(self._groups(produce._re_title_info, ident),
+                             self._groups(self._imdb._re_title_ident, ident))
+
+    def test_character_role(self):
+        regex = self._imdb.Produce._re_character_role
+        for ident in self._idents:
+            self.assertEqual(self._groups(regex, ident),
+                             self._imdb._split_character_role(ident))
+
+    def test_writer_role(self):
+        regex = self._imdb.Produce._re_writer_role
+        for ident in self._idents:
+            self.assertEqual(self._groups(regex, ident),
+                             self._imdb._split_writer_role(ident))
+        # the kind is unicode like the rest of the ident
+        role = self._imdb.Produce._parse_role_ident(
+            u'Bird (1988)  (original screenplay)  <1,2,1>', 'writer')
+        self.assertEqual(role.role, u'original screenplay')
+        self.assertTrue(isinstance(role.role, unicode))
+
+class TestImdbDistribution(unittest.TestCase):
+
+    def test_decode_distribution(self):
+        from filmdata.source.imdb import Produce
+        self.assertEqual(list(Produce._decode_distribution('.0123456*9.')),
+                         [0, 5, 15, 25, 35, 45, 55, 65, 100, 95, 0])
+        self.assertEqual(Produce._decode_distribution('0000012211').itemsize,
+                         1)
+
+class TestImdbHtmlIds(unittest.TestCase):
+
+    _search_dir = os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                               'test_data', 'sources', 'imdb', 'search')
+
+    def test_extract_id_from_html(self):
+        from filmdata.source.imdb import Fetch
+        idents = json.load(open(os.path.join(self._search_dir,
+                                             'idents.json')))
+        for name, (ident, id) in idents.items():
+            html = open(os.path.join(self._search_dir, name)).read()
+            self.assertEqual(Fetch._extract_id_from_html(html, ident), id)
+
+    def test_suffix(self):
+        from filmdata.source.imdb import Fetch
+        html = open(os.path.join(self._search_dir,
+                                 'smith_john_iv.html')).read()
+        candidates = list(Fetch._person_candidates(html))
+        first = candidates[0]
+        self.assertEqual(first[1], u'John Smith')
+        # without a suffix on the ident only a result without one matches
+        plain = [ c[0] for c in candidates if
+                  c[1] == u'John Smith' and c[2] is None ]
+        self.assertEqual(Fetch._extract_id_from_html(html, u'Smith, John'),
+                         plain[0])
+        self.assertEqual(Fetch._extract_id_from_html(html,
+                                                     u'Smith, John (%s)' %
+                                                     first[2].strip('()')),
+                         first[0])
+
+class _Response(object):
+
+    def __init__(self, url, status, location=None, buffer=''):
+        self.effective_url = url
+        self.status = status
+        self.location = location
+        self.buffer = buffer
+
+class TestImdbMisses(unittest.TestCase):
+
+    def setUp(self):
+        from filmdata.source.imdb import Fetch
+        from filmdata.lib.misses import MissCache
+        self._fetch = Fetch
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'title.misses')
+        Fetch._type = 'title'
+        Fetch._misses = MissCache(self._path)
+        logging.disable(logging.ERROR)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        self._fetch._misses.close()
+        self._fetch._misses = None
+        shutil.rmtree(self._dir)
+
+    def _respond(self, ident, status, **kwargs):
+        url = 'http://www.imdb.com/find?q=%s' % ident
+        self._fetch._fetch_id_response(_Response(url, status, **kwargs),
+                                       (ident, url))
+
+    def test_http_errors(self):
+        # failed requests are retried on the next run
+        for status in (404, 429, 500, 503):
+            self._respond('Bird (1988)', status)
+        self.assertEqual(len(self._fetch._misses), 0)
+        self.assertFalse(self._fetch._misses.skip('Bird (1988)'))
+
+    def test_no_match(self):
+        self._respond('Bird (1988)', 200)
+        self._respond(u'Caf\xe9 (1999)', 302,
+                      location='http://www.imdb.com/find?s=all')
+        self.assertEqual(self._fetch._misses.misses['Bird (1988)']['reason'],
+                         'no redirect')
+        self.assertEqual(self._fetch._misses.misses[u'Caf\xe9 (1999)']
+                         ['reason'], 'redirect')
+        self.assertTrue(self._fetch._misses.skip('Bird (1988)'))
+
+class TestImdbPersonShards(unittest.TestCase):
+
+    def setUp(self):
+        from filmdata.source.imdb import Produce
+        from filmdata.bench.fixtures import Fixtures
+        self._produce = Produce
+        self._shard_size = Produce._shard_size
+        self._dir = tempfile.mkdtemp()
+        self._paths = {}
+        for compress in (False, True):
+            fixtures = Fixtures(4, os.path.join(self._dir, str(compress)),
+                                compress=compress)
+            fixtures.write()
+            self._paths[compress] = fixtures.paths()['actor']
+
+    def tearDown(self):
+        self._produce._shard_size = self._shard_size
+        shutil.rmtree(self._dir)
+
+    def test_sharded(self):
+        for path in self._paths.values():
+            blocks = list(self._produce._parse_persons(path, 'actor'))
+            self.assertEqual(len(blocks), 200)
+            # down to one person in each shard
+            for size in (1, 2000, 1024 * 1024):
+                self._produce._shard_size = size
+                self.assertEqual(list(self._produce._parse_persons_sharded(
+                    path, 'actor', 2)), blocks)
+
+class TestImdbJoin(unittest.TestCase):
+
+    _attrs = ('_cache_path', '_title_ident_to_id', '_person_ident_to_id')
+
+    def setUp(self):
+        from filmdata import config
+        from filmdata.source.imdb import Produce
+        from filmdata.bench.fixtures import Fixtures
+        from filmdata.lib.idindex import IdIndex
+        self._produce = Produce
+        self._config = config.imdb
+        self._dir = tempfile.mkdtemp()
+        fixtures = Fixtures(2, self._dir)
+        fixtures.write()
+        self._paths = [ ('%s_path' % name, path) for
+                        name, path in fixtures.paths().items() ]
+        self._saved_paths = [ (k, self._config.get(k)) for
+                              k, _ in self._paths ]
+        self._saved = [ (k, Produce.__dict__.get(k)) for k in self._attrs ]
+        for k, path in self._paths:
+            self._config[k] = path
+        Produce._cache_path = None
+        Produce._title_ident_to_id = IdIndex.load(
+            os.path.join(self._dir, 'title.ids'))
+        Produce._person_ident_to_id = IdIndex.load(
+            os.path.join(self._dir, 'person.ids'))
+
+    def tearDown(self):
+        for k, v in self._saved_paths:
+            self._config[k] = v
+        for k, v in self._saved:
+            if v is None:
+                if k in self._produce.__dict__:
+                    delattr(self._produce, k)
+            else:
+                setattr(self._produce, k, v)
+        shutil.rmtree(self._dir)
+
+    def _titles(self, budget):
+        titles = self._produce.produce_titles(('film', 'tv', 'video'),
+                                              budget=budget)
+        return sorted([ t.to_dict() for t in titles ],
+                      key=lambda t: t['id'])
+
+    def test_budget(self):
+        titles = self._titles(0)
+        self.assertTrue(len(titles) > 100)
+        self.assertTrue([ t for t in titles if 'cast' in t and 'genre' in t ])
+        # small enough for the sorts to spill to disk
+        self.assertEqual(self._titles(64 * 1024), titles)
+
+    def test_workers(self):
+        titles = self._titles(0)
+        workers = self._produce._workers
+        self._produce._workers = 3
+        try:
+            self.assertEqual(self._titles(0), titles)
+        finally:
+            self._produce._workers = workers
+
+class TestImdbPersonDiff(unittest.TestCase):
+
+    _header = ('THE %s LIST\n==============\n\n'
+               'Name\t\t\tTitles\n----\t\t\t------\n')
+    _footer = '\n-----------------------------------------------------\n'
+    _titles = [ u'Bird (1988)', u'Gran Torino (2008)', u'Mystic River (2003)' ]
+    _persons = [ u'Eastwood, Clint', u'Freeman, Morgan', u'Hackman, Gene',
+                 u'Haggis, Paul', u'Penn, Sean' ]
+    _attrs = ('_cache_path', '_title_ident_to_id', '_person_ident_to_id',
+              '_role_types')
+
+    def setUp(self):
+        from filmdata import config
+        from filmdata.source.imdb import Produce
+        from filmdata.lib.idindex import IdIndex
+        self._produce = Produce
+        self._config = config.imdb
+        self._dir = tempfile.mkdtemp()
+        self._saved_paths = [ (k, self._config.get(k)) for
+                              k in ('actor_path', 'director_path') ]
+        self._saved = [ (k, Produce.__dict__.get(k)) for k in self._attrs ]
+        for role_type in ('actor', 'director'):
+            self._config['%s_path' % role_type] = os.path.join(
+                self._dir, '%ss.list' % role_type)
+        Produce._cache_path = os.path.join(self._dir, 'cache')
+        Produce._role_types = frozenset(('actor', 'director'))
+        Produce._title_ident_to_id = IdIndex.build(
+            lambda: ( (t, i + 1) for i, t in enumerate(self._titles) ))
+        Produce._person_ident_to_id = IdIndex.build(
+            lambda: ( (p, i + 1) for i, p in enumerate(self._persons) ))
+
+    def tearDown(self):
+        for k, v in self._saved_paths:
+            self._config[k] = v
+        for k, v in self._saved:
+            if v is None:
+                if k in self._produce.__dict__:
+                    delattr(self._produce, k)
+            else:
+                setattr(self._produce, k, v)
+        shutil.rmtree(self._dir)
+
+    def _write(self, role_type, persons):
+        f = open(self._config['%s_path' % role_type], 'w')
+        f.write(self._header % role_type.upper())
+        for person, titles in persons:
+            f.write('%s\t\t%s\n' % (person, titles[0]))
+            for title in titles[1:]:
+                f.write('\t\t\t%s\n' % title)
+            f.write('\n')
+        f.write(self._footer)
+        f.close()
+
+    def _diff(self, role_type, persons):
+        self._write(role_type, persons)
+        return sorted([ (p['diff'], p['id']) for p in
+                        self._produce.produce_persons(role_type,
+                                                      sans_roles=True,
+                                                      diff=True) ])
+
+    def test_diff(self):
+        # Eastwood (1) is both an actor and a director
+        self.assertEqual(self._diff('actor', [
+            ('Eastwood, Clint', ['Gran Torino (2008)  [Walt]  <1>']),
+            ('Freeman, Morgan', ['Unknown (1999)', 'Bird (1988)']),
+            ('Hackman, Gene', ['Mystic River (2003)  [Dave]']),
+        ]), [ ('insert', 1), ('insert', 2), ('insert', 3) ])
+        self.assertEqual(self._diff('director', [
+            ('Eastwood, Clint', ['Bird (1988)', 'Gran Torino (2008)']),
+            ('Haggis, Paul', ['Mystic River (2003)']),
+        ]), [ ('insert', 1), ('insert', 4) ])
+
+        # still a director, so leaving the actors doesn't delete Eastwood
+        self.assertEqual(self._diff('actor', [
+            ('Freeman, Morgan', ['Unknown (1999)', 'Bird (1988)  [Eddie]']),
+            ('Hackman, Gene', ['Mystic River (2003)  [Dave]']),
+            ('Penn, Sean', ['Mystic River (2003)  [Jimmy]  <1>']),
+        ]), [ ('insert', 5), ('update', 2) ])
+        self.assertEqual(self._diff('director', [
+            ('Eastwood, Clint', ['Bird (1988)', 'Gran Torino (2008)']),
+        ]), [ ('delete', 4) ])
+
+        # gone from both lists now, and Hackman's roles no longer resolve
+        self.assertEqual(self._diff('director', []), [ ('delete', 1) ])
+        self.assertEqual(self._diff('actor', [
+            ('Freeman, Morgan', ['Unknown (1999)', 'Bird (1988)  [Eddie]']),
+            ('Hackman, Gene', ['Unknown (2001)  [Dave]']),
+            ('Penn, Sean', ['Mystic River (2003)  [Jimmy]  <1>']),
+        ]), [ ('delete', 3) ])
+
+    def test_no_cache_path(self):
+        self._produce._cache_path = None
+        self._write('actor', [
+            ('Eastwood, Clint', ['Gran Torino (2008)  [Walt]  <1>']),
+        ])
+        persons = list(self._produce.produce_persons('actor', diff=True))
+        self.assertEqual([ p['id'] for p in persons ], [ 1 ])
+        self.assertFalse('diff' in persons[0])
+
+class TestImdbKnownIds(unittest.TestCase):
+
+    class Sink(object):
+        """ the source data collections of the sink """
+
+        def __init__(self):
+            self.ids = {}
+            self.modified = None
+
+        def get_source_data(self, source, suffix=None):
+            return ( { 'ident' : i, 'id' : id } for
+                     i, id in self.ids.items() )
+
+        def get_source_data_version(self, source, suffix=None):
+            return len(self.ids), self.modified
+
+    def setUp(self):
+        import filmdata
+        from filmdata.source.imdb import ImdbMixin
+        self._filmdata = filmdata
+        self._mixin = ImdbMixin
+        self._sink = filmdata.sink
+        self._cache_path = ImdbMixin._cache_path
+        self._dir = tempfile.mkdtemp()
+        ImdbMixin._cache_path = self._dir
+        filmdata.sink = self.Sink()
+
+    def tearDown(self):
+        self._filmdata.sink = self._sink
+        self._mixin._cache_path = self._cache_path
+        shutil.rmtree(self._dir)
+
+    def _ids(self):
+        index = self._mixin._load_known_ids('title')
+        return dict([ (i, index[i]) for i in self._filmdata.sink.ids ])
+
+    def test_stale(self):
+        import datetime
+        sink = self._filmdata.sink
+        sink.ids[u'Bird (1988)'] = 1
+        self.assertEqual(self._ids(), { u'Bird (1988)' : 1 })
+        self.assertTrue(os.path.exists(os.path.join(self._dir, 'title.ids')))
+
+        # stored by something other than fetch_ids
+        sink.ids[u'Gran Torino (2008)'] = 2
+        self.assertEqual(self._ids(), { u'Bird (1988)' : 1,
+                                        u'Gran Torino (2008)' : 2 })
+        # resolved again, to another id
+        sink.ids[u'Bird (1988)'] = 3
+        sink.modified = datetime.datetime(2011, 2, 17, 16, 0, 0)
+        self.assertEqual(self._ids(), { u'Bird (1988)' : 3,
+                                        u'Gran Torino (2008)' : 2 })
+
+        # unchanged, from the file
+        sink.get_source_data = None
+        self.assertEqual(self._ids(), { u'Bird (1988)' : 3,
+                                        u'Gran Torino (2008)' : 2 })
+
+class TestImdbListFormat(unittest.TestCase):
+
+    _lines = [ 'CRC: 0x1234\n', '\n', 'CERTIFICATES LIST\n',
+               '=================\n', '\n',
+               'Bird (1988)\t\t\tUSA:R\t(certificate #1)\n',
+               'Bird (1988)\t\t\tFinland:K-16\n',
+               'Bird (1988)\t\t\tnonsense\n',
+               '"Caf\xe9" (1999)\t\t\t\tUK:PG  \n',
+               '\n', '-------------------\n', 'footer\n' ]
+
+    def setUp(self):
+        from filmdata.source.imdb import Produce, ListFormat
+        self._produce = Produce
+        self._format = ListFormat
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'certificates.list')
+        f = open(self._path, 'wb')
+        f.write(''.join(self._lines))
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self._dir)
+
+    def _parse(self, *args, **kwargs):
+        format = self._format(*args, **kwargs)
+        return [ t.to_dict() for t in
+                 self._produce._parse_title_list(self._path, format) ]
+
+    def test_certificates(self):
+        titles = self._parse('certificate', 'CERTIFICATES LIST', skip=1,
+                             convert=self._produce._list_formats[
+                                 'certificate'].convert)
+        self.assertEqual(titles, [
+            { 'ident' : u'Bird (1988)', 'type' : 'film', 'certificate' : [
+                { 'country' : u'USA', 'rating' : u'R',
+                  'note' : u'certificate #1' },
+                { 'country' : u'Finland', 'rating' : u'K-16', 'note' : None },
+            ] },
+            { 'ident' : u'"Caf\xe9" (1999)', 'type' : 'tv', 'certificate' : [
+                { 'country' : u'UK', 'rating' : u'PG', 'note' : None },
+            ] },
+        ])
+
+    def test_values(self):
+        titles = self._parse('country', 'CERTIFICATES LIST', skip=1)
+        self.assertEqual([ t['country'] for t in titles ],
+                         [ [u'USA:R', u'Finland:K-16', u'nonsense'],
+                           [u'UK:PG'] ])
+        # one title for each line
+        titles = self._parse('country', 'CERTIFICATES LIST', multi=False)
+        self.assertEqual([ (t['ident'], t['country']) for t in titles ],
+                         [ (u'Bird (1988)', u'USA:R'),
+                           (u'Bird (1988)', u'Finland:K-16'),
+                           (u'Bird (1988)', u'nonsense'),
+                           (u'"Caf\xe9" (1999)', u'UK:PG') ])
+        self.assertRaises(ValueError, self._parse, 'country', 'NO SUCH LIST')
+
+    def test_last_title(self):
+        # the list ends on a title's last line, with no blank line or footer
+        f = open(self._path, 'wb')
+        f.write('8: THE GENRES LIST\n==================\n\n'
+                'Bird (1988)\t\t\tMusic\n'
+                'Caf\xe9 (1999)\t\t\tDrama\n'
+                'Caf\xe9 (1999)\t\t\tComedy')
+        f.close()
+        titles = self._parse('genre', '8: THE GENRES LIST', skip=2)
+        self.assertEqual([ (t['ident'], t['genre']) for t in titles ],
+                         [ (u'Bird (1988)', [u'Music']),
+                           (u'Caf\xe9 (1999)', [u'Drama', u'Comedy']) ])
+        titles = self._parse('genre', '8: THE GENRES LIST', skip=2,
+                             multi=False)
+        self.assertEqual(titles[-1]['genre'], u'Comedy')
+
+    def test_producer_role(self):
+        role = self._produce._parse_role_ident(
+            u'Bird (1988)  (executive producer)', 'producer')
+        self.assertEqual((role.title_ident, role.role),
+                         (u'Bird (1988)', u'executive producer'))
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,14 @@
+import os
+import gzip
+import shutil
+import urlparse
+import logging
+import tempfile
+import threading
 import unittest
+import xml.etree.cElementTree as etree
+from StringIO import StringIO
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
 
 import filmdata.tests.sources as mixins
 
@@ -14,5 +24,210 @@ class TestNetflixProduce(mixins.ProduceMixin, unittest.TestCase):
         self._name = 'netflix'
         self.setUpMixin()
 
+class TestNetflixCatalog(unittest.TestCase):
+
+    _mixin_attrs = ('_titles_file_path', '_titles_index_path',
+                    '_title_index', '_cache_path')
+
+    def setUp(self):
+        from filmdata.source.netflix import Produce, NetflixMixin
+        from filmdata.bench.netflix_fixtures import Catalog
+        self._produce = Produce
+        self._mixin = NetflixMixin
+        self._shard_size = Produce._shard_size
+        self._saved = [ getattr(NetflixMixin, k) for k in self._mixin_attrs ]
+        self._dir = tempfile.mkdtemp()
+        self._path = os.path.join(self._dir, 'titles.xml')
+        Catalog(1, self._path).write()
+        NetflixMixin._titles_file_path = self._path
+        NetflixMixin._titles_index_path = os.path.join(self._dir, 'titles.idx')
+        NetflixMixin._cache_path = os.path.join(self._dir, 'cache')
+        self._votes = {}
+        Produce._load_votes = classmethod(lambda cls: self._votes)
+        logging.disable(logging.WARNING)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        self._produce._shard_size = self._shard_size
+        del self._produce._load_votes
+        for k, v in zip(self._mixin_attrs, self._saved):
+            setattr(self._mixin, k, v)
+        shutil.rmtree(self._dir)
+
+    def test_sharded(self):
+        titles = list(self._produce._parse_titles(self._path))
+        self.assertTrue(len(titles) > 50)
+        # down to one title in each shard
+        for size in (1, 20000, 1024 * 1024):
+            self._produce._shard_size = size
+            self.assertEqual(list(self._produce._parse_titles_sharded(
+                self._path, 2)), titles)
+
+    def test_title_index(self):
+        from filmdata.source.netflix import Fetch
+        titles = list(self._produce._parse_titles(self._path))
+        for title in titles:
+            self.assertEqual(self._produce.get_title(title['id']), title)
+        self.assertEqual(self._produce.get_title(12345), None)
+        self.assertTrue(os.path.exists(self._mixin._titles_index_path))
+        urls = dict(Fetch._get_title_urls())
+        self.assertTrue(len(urls) > len(titles))
+        for title in titles:
+            self.assertEqual(urls[title['id']].decode('utf-8'),
+                             title['href'].replace('//www.', '//movies.'))
+
+        # replaced by a catalog of the same size, its first title moved last
+        data = open(self._path).read()
+        start = data.index('<catalog_title>')
+        end = data.index('</catalog_title>') + len('</catalog_title>\n')
+        footer = data.index('</catalog_titles>')
+        open(self._path, 'w').write(data[:start] + data[end:footer] +
+                                    data[start:end] + data[footer:])
+        mtime = os.path.getmtime(self._path) + 10
+        os.utime(self._path, (mtime, mtime))
+        for title in titles:
+            self.assertEqual(self._produce.get_title(title['id']), title)
+
+    def _diff(self):
+        return [ (t.pop('diff'), t) for
+                 t in self._produce.produce_titles(None, diff=True) ]
+
+    def test_diff(self):
+        titles = list(self._produce.produce_titles(None))
+        self.assertEqual(self._diff(), [ ('insert', t) for t in titles ])
+        self.assertEqual(self._diff(), [])
+
+        # one title changes, another is gone and a third gets votes
+        changed, gone, voted = [ t['id'] for t in titles[3:6] ]
+        data = open(self._path).read()
+        start = data.index('/movies/%d</id>' % gone)
+        start = data.rindex('<catalog_title>', 0, start)
+        end = data.index('</catalog_title>', start) + len('</catalog_title>')
+        data = data[:start] + data[end:]
+        link = 'Movie/%s/%d"' % (titles[3]['href'].split('/')[-2], changed)
+        data = data.replace(link.encode('utf-8'),
+                            link.replace('Movie/', 'Movie/New_').encode(
+                                'utf-8'))
+        open(self._path, 'wb').write(data)
+        self._votes[voted] = 12
+        diff = self._diff()
+        self.assertEqual([ (op, t['id']) for op, t in diff ],
+                         [ ('update', changed), ('update', voted),
+                           ('delete', gone) ])
+        self.assertTrue('/Movie/New_' in diff[0][1]['href'])
+        self.assertEqual(diff[1][1]['rating']['count'], 12)
+
+        # a title which loses its year isn't a title anymore
+        yearless = titles[6]['id']
+        start = data.index('/movies/%d</id>' % yearless)
+        year = data.index('<release_year>', start)
+        end = data.index('</release_year>', year) + len('</release_year>')
+        open(self._path, 'wb').write(data[:year] + data[end:])
+        self.assertEqual(self._diff(), [ ('delete', { 'id' : yearless }) ])
+
+    def test_diff_without_cache(self):
+        self._mixin._cache_path = None
+        titles = list(self._produce.produce_titles(None))
+        self.assertEqual(list(self._produce.produce_titles(None, diff=True)),
+                         titles)
+
+    def test_extractors(self):
+        from filmdata.source.netflix import CatalogTitle
+        from filmdata.bench.netflix_catalog import PathCatalogTitle
+        count = 0
+        for event, elem in etree.iterparse(self._path):
+            if elem.tag != 'catalog_title':
+                continue
+            match = self._produce._re_film_test.match(elem.find('id').text)
+            if match:
+                id = int(match.group(1))
+                self.assertEqual(CatalogTitle(elem, id, 3).get_title(),
+                                 PathCatalogTitle(elem, id, 3).get_title())
+                count += 1
+        self.assertTrue(count > 50)
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    """ Stands in for the catalog api, serves the gzip encoded catalog with
+        Range support and drops the first connection half way through. """
+
+    def do_GET(self):
+        query = urlparse.parse_qs(urlparse.urlparse(self.path).query)
+        self.server.requests.append((query, self.headers.get('Range')))
+        data = self.server.payload
+        start = 0
+        if 'Range' in self.headers:
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data) - start))
+        self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        body = data[start:]
+        if len(self.server.requests) == 1:
+            body = body[:len(body) / 2]
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestNetflixCatalogDownload(unittest.TestCase):
+
+    def setUp(self):
+        from filmdata.source.netflix import Fetch, NetflixMixin
+        self._fetch = Fetch
+        self._mixin = NetflixMixin
+        self._text = ''.join('<catalog_title><id>http://api.netflix.com/'
+                             'catalog/titles/movies/%d</id></catalog_title>\n'
+                             % i for i in xrange(20000))
+        buf = StringIO()
+        gz = gzip.GzipFile(fileobj=buf, mode='wb')
+        gz.write(self._text)
+        gz.close()
+        self._server = HTTPServer(('127.0.0.1', 0), _ApiHandler)
+        self._server.payload = buf.getvalue()
+        self._server.requests = []
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self._dir = tempfile.mkdtemp()
+        self._saved = dict([ (k, Fetch.__dict__.get(k)) for k in
+                             ('_titles_url', '_titles_file_path',
+                              '_titles_index_path', '_consumer_key',
+                              '_consumer_secret') ])
+        self._title_index = NetflixMixin._title_index
+        Fetch._titles_url = 'http://127.0.0.1:%d/catalog/titles/index' % \
+                self._server.server_port
+        Fetch._titles_file_path = os.path.join(self._dir, 'titles.xml')
+        Fetch._titles_index_path = os.path.join(self._dir, 'titles.idx')
+        Fetch._consumer_key, Fetch._consumer_secret = 'key', 'secret'
+
+    def tearDown(self):
+        for k, v in self._saved.items():
+            if v is None:
+                if k in self._fetch.__dict__:
+                    delattr(self._fetch, k)
+            else:
+                setattr(self._fetch, k, v)
+        self._mixin._title_index = self._title_index
+        self._server.shutdown()
+        self._server.server_close()
+        shutil.rmtree(self._dir)
+
+    def test_download(self):
+        self._fetch._download_title_catalog()
+        self.assertEqual(open(self._fetch._titles_file_path).read(),
+                         self._text)
+        # indexed along with the download
+        self.assertEqual(len(self._fetch._load_title_index()), 20000)
+        # resumed once, with a request signed again
+        (first, first_range), (second, second_range) = self._server.requests
+        self.assertEqual((first_range, second_range),
+                         (None, 'bytes=%d-' % (len(self._server.payload) / 2)))
+        for query in (first, second):
+            self.assertEqual(query['oauth_consumer_key'], ['key'])
+            self.assertTrue(query['oauth_signature'])
+        self.assertNotEqual(first['oauth_nonce'], second['oauth_nonce'])
+
 if __name__ == '__main__':
     unittest.main()
@@ -152,14 +152,24 @@ def main():
         for name in options.imports.split(','):
             source = filmdata.source.manager.load(name)
             if options.op_title:
+                kwargs = {}
+                if name == 'netflix':
+                    # only the netflix catalog is diffed so far
+                    kwargs['diff'] = not options.all
                 filmdata.sink.consume_source_titles(
-                    source.Produce.produce_titles(active_title_types),
+                    source.Produce.produce_titles(active_title_types,
+                                                  **kwargs),
                     source.Produce.name)
             elif options.op_person:
+                kwargs = {}
+                if name == 'imdb':
+                    # only the imdb role lists are diffed so far
+                    kwargs['diff'] = not options.all
                 for role_type in active_role_types:
                     filmdata.sink.consume_source_persons(
                         source.Produce.produce_persons(role_type,
-                                                       sans_roles=True),
+                                                       sans_roles=True,
+                                                       **kwargs),
                         source.Produce.name)
 
 if __name__ == '__main__':